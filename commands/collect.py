@@ -6,23 +6,55 @@ from shutil import rmtree
 import logging
 import json
 import time
+import random
+import queue
+import functools
+import contextlib
+import concurrent.futures
 import boto3
 import yaml
 import pyjq
 import urllib.parse
 from botocore.exceptions import ClientError, EndpointConnectionError, NoCredentialsError
 from shared.common import get_account, custom_serializer
-from botocore.config import Config
+from shared.scheduler import CallScheduler, CallGroup
+from shared.job_poller import JobPoller
+from shared.page_writer import PageWriter, write_atomically
+from shared import json_backend
+from shared.manifest import Manifest
+from shared.rate_limit import RateLimiter, is_throttling_error
+from shared.client_pool import ClientPool
+from shared.circuit_breaker import CircuitBreakers, CircuitOpenError
+from shared.organization import (
+    DEFAULT_ROLE_NAME,
+    DEFAULT_SESSION_DURATION,
+    get_account_session,
+    get_organization_accounts,
+)
 
 __description__ = "Run AWS API calls to collect data from the account"
 
-MAX_RETRIES = 3
+# Times to retry a call that is still throttled after botocore's own retries
+MAX_THROTTLE_RETRIES = 3
+
+# Suffixes allowed on the TTL of a runner
+TTL_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
 
 
 def snakecase(s):
     return s.replace("-", "_")
 
 
+def parse_ttl(ttl):
+    """Returns the seconds of a TTL such as 3600, 30m, 1h or 7d"""
+    try:
+        if isinstance(ttl, str) and ttl[-1:] in TTL_UNITS:
+            return float(ttl[:-1]) * TTL_UNITS[ttl[-1]]
+        return float(ttl)
+    except ValueError:
+        raise Exception("Invalid TTL in collect_commands.yaml: {}".format(ttl))
+
+
 def get_identifier_from_parameter(parameter):
     if isinstance(parameter, list):
         identifier = parameter[0]
@@ -37,10 +69,9 @@ def get_filename_from_parameter(parameter):
         if len(parameter) > 1:
             filename = parameter[1]
         elif isinstance(parameter[0], list):
-            # For elbv2:describe-tags we need ResourceArns as a list like `[Arn]`
+            # For a parameter that must be a list like `[Arn]`, without using a Batch config,
             # the yaml file specifies `[[.LoadBalancerArn]]` because just doing
             # `[.LoadBalancerArn]` presents other issues, so this extracts out the inner, inner value.
-            # Similar issue for elb:describe-tags
             filename = parameter[0][0]
     else:
         filename = parameter
@@ -56,21 +87,82 @@ def make_directory(path):
         pass
 
 
-def call_function(outputfile, handler, method_to_call, parameters, check, summary):
+def get_batches(identifiers, max_size):
+    """Split identifiers into lists of at most max_size"""
+    return [identifiers[i : i + max_size] for i in range(0, len(identifiers), max_size)]
+
+
+def split_batch_response(data, batch, identifiers):
+    """
+    Given the response to a call made for a batch of identifiers, return a dict of each
+    identifier to the response that would have been returned for it alone.
+
+    batch is the runner's Batch config, where ResponseKey is the list in the response with an
+    element per resource, and ResponseIdentifier is the key of each element naming its resource.
+    Other lists in the response, such as `failures`, are split by looking for the identifier in
+    the values of their elements.
+    """
+    responses = {}
+    for identifier in identifiers:
+        response = {}
+        for key, value in data.items():
+            if key == batch["ResponseKey"]:
+                response[key] = [
+                    item
+                    for item in value
+                    if item.get(batch["ResponseIdentifier"]) == identifier
+                ]
+            elif isinstance(value, list):
+                response[key] = [
+                    item
+                    for item in value
+                    if isinstance(item, dict) and identifier in item.values()
+                ]
+            else:
+                response[key] = value
+        responses[identifier] = response
+    return responses
+
+
+def is_collected(manifest, outputfile):
+    """Whether the call for this output file has already been made"""
+    if manifest is None:
+        return os.path.isfile(outputfile)
+    return manifest.is_collected(outputfile)
+
+
+def discard_data(data):
+    """Drop the pages of a response that won't be written"""
+    if isinstance(data, PageWriter):
+        data.abort()
+
+
+def call_function(
+    outputfile,
+    handler,
+    method_to_call,
+    parameters,
+    poll,
+    summary,
+    batch=None,
+    manifest=None,
+):
     """
     Calls the AWS API function and downloads the data
 
-    check: Value to check and repeat the call if it fails
+    poll: For calls that return the status of an asynchronous job, the runner's Poll config.
+      While the job is still running nothing is written, and False is returned so the
+      JobPoller calls again later.
     summary: Keeps tracks of failures
+    batch: When the call is for a batch of resources, the runner's Batch config. The response
+      is then split into a file per resource in the outputfile directory.
+    manifest: Records the outcome of the call
     """
-    # TODO: Decorate this with rate limiters from
-    # https://github.com/Netflix-Skunkworks/cloudaux/blob/master/cloudaux/aws/decorators.py
-
     data = None
-    if os.path.isfile(outputfile):
+    if batch is None and is_collected(manifest, outputfile):
         # Data already collected, so skip
         print("  Response already collected at {}".format(outputfile), flush=True)
-        return
+        return True
 
     call_summary = {
         "service": handler.meta.service_model.service_name,
@@ -78,38 +170,69 @@ def call_function(outputfile, handler, method_to_call, parameters, check, summar
         "parameters": parameters,
     }
 
-    print("  Making call for {}".format(outputfile), flush=True)
+    if batch is None:
+        print("  Making call for {}".format(outputfile), flush=True)
+    else:
+        print(
+            "  Making call for {} resources in {}".format(
+                len(parameters[batch["Parameter"]]), outputfile
+            ),
+            flush=True,
+        )
     try:
-        for retries in range(MAX_RETRIES):
-            if handler.can_paginate(method_to_call):
-                paginator = handler.get_paginator(method_to_call)
-                page_iterator = paginator.paginate(**parameters)
-
-                for response in page_iterator:
-                    if not data:
-                        data = response
-                    else:
-                        print("  ...paginating", flush=True)
-                        for k in data:
-                            if isinstance(data[k], list):
-                                data[k].extend(response[k])
-            else:
-                function = getattr(handler, method_to_call)
-                data = function(**parameters)
-
-            if check is not None:
-                if data[check[0]["Name"]] == check[0]["Value"]:
-                    continue
-                if retries == MAX_RETRIES - 1:
-                    raise Exception(
-                        "Check value {} never set as {} in response".format(
-                            check["Name"], check["Value"]
-                        )
-                    )
-                print("  Sleeping and retrying")
-                time.sleep(3)
-            else:
+        for throttle_retries in range(MAX_THROTTLE_RETRIES + 1):
+            try:
+                if handler.can_paginate(method_to_call):
+                    paginator = handler.get_paginator(method_to_call)
+                    page_iterator = paginator.paginate(**parameters)
+
+                    for response in page_iterator:
+                        if data is None and batch is None:
+                            # Stream the pages to the file, rather than merging them in memory
+                            data = PageWriter(outputfile, default=custom_serializer)
+                        elif data is None:
+                            data = response
+                            continue
+                        else:
+                            print("  ...paginating", flush=True)
+
+                        if isinstance(data, PageWriter):
+                            data.add_page(response)
+                        else:
+                            for k in data:
+                                if isinstance(data[k], list):
+                                    data[k].extend(response[k])
+                else:
+                    function = getattr(handler, method_to_call)
+                    data = function(**parameters)
+
+                if poll is not None and data.get(poll.get("Name")) in poll.get(
+                    "PendingValues", []
+                ):
+                    print("  Job still in progress for {}".format(outputfile))
+                    discard_data(data)
+                    return False
                 break
+            except ClientError as e:
+                error_code = e.response.get("Error", {}).get("Code", "")
+                if poll is not None and error_code in poll.get("PendingErrors", []):
+                    print("  Job still in progress for {}".format(outputfile))
+                    discard_data(data)
+                    return False
+                if (
+                    not is_throttling_error(error_code)
+                    or throttle_retries == MAX_THROTTLE_RETRIES
+                ):
+                    raise
+                # Botocore has already used up its retries, and the rate limiter, when used,
+                # has slowed down requests to this service, so back off before trying again.
+                discard_data(data)
+                data = None
+                delay = 2**throttle_retries + random.random()
+                print(
+                    "  Throttled, retrying in {:.1f} seconds".format(delay), flush=True
+                )
+                time.sleep(delay)
 
     except ClientError as e:
         if "NoSuchBucketPolicy" in str(e):
@@ -131,10 +254,13 @@ def call_function(outputfile, handler, method_to_call, parameters, check, summar
             print("  - No password policy set")
         elif (
             "AccessDeniedException" in str(e)
-            and call_summary["service"] == "organizations"
-            and call_summary["action"] == "list_accounts"
+            and (call_summary["service"], call_summary["action"]) in TOLERATED_DENIALS
         ):
-            print("  - Denied, which likely means this is not the organization root")
+            print(
+                "  - {}".format(
+                    TOLERATED_DENIALS[(call_summary["service"], call_summary["action"])]
+                )
+            )
         elif (
             "RepositoryPolicyNotFoundException" in str(e)
             and call_summary["service"] == "ecr"
@@ -153,30 +279,6 @@ def call_function(outputfile, handler, method_to_call, parameters, check, summar
             and call_summary["action"] == "get_vault_access_policy"
         ):
             print("  - No policy exists")
-        elif (
-            "AccessDeniedException" in str(e)
-            and call_summary["service"] == "kms"
-            and call_summary["action"] == "list_key_policies"
-        ):
-            print("  - Denied, which should mean this KMS has restricted access")
-        elif (
-            "AccessDeniedException" in str(e)
-            and call_summary["service"] == "kms"
-            and call_summary["action"] == "list_grants"
-        ):
-            print("  - Denied, which should mean this KMS has restricted access")
-        elif (
-            "AccessDeniedException" in str(e)
-            and call_summary["service"] == "kms"
-            and call_summary["action"] == "get_key_policy"
-        ):
-            print("  - Denied, which should mean this KMS has restricted access")
-        elif (
-            "AccessDeniedException" in str(e)
-            and call_summary["service"] == "kms"
-            and call_summary["action"] == "get_key_rotation_status"
-        ):
-            print("  - Denied, which should mean this KMS has restricted access")
         elif (
             "InvalidAccessException" in str(e)
             and call_summary["service"] == "securityhub"
@@ -191,6 +293,11 @@ def call_function(outputfile, handler, method_to_call, parameters, check, summar
     except EndpointConnectionError as e:
         print("EndpointConnectionError: {}".format(e), flush=True)
         call_summary["exception"] = e
+    except CircuitOpenError as e:
+        # Reported once for the action by the circuit breaker, rather than for each call
+        print("  Skipped, as {}".format(e), flush=True)
+        call_summary["exception"] = e
+        call_summary["skipped"] = True
     except Exception as e:
         print("Exception: {}".format(e), flush=True)
         call_summary["exception"] = e
@@ -201,28 +308,682 @@ def call_function(outputfile, handler, method_to_call, parameters, check, summar
         data.pop("Marker", None)
         data.pop("IsTruncated", None)
 
-    if data is not None:
-        with open(outputfile, "w+") as f:
-            f.write(
-                json.dumps(data, indent=4, sort_keys=True, default=custom_serializer)
+    # Details of each file written
+    written = {}
+    if isinstance(data, PageWriter):
+        written[outputfile] = data.commit()
+    elif data is not None and batch is not None:
+        identifiers = parameters[batch["Parameter"]]
+        for identifier, resource_data in split_batch_response(
+            data, batch, identifiers
+        ).items():
+            resource_file = "{}/{}".format(
+                outputfile, urllib.parse.quote_plus(identifier)
             )
+            written[resource_file] = write_atomically(
+                resource_file,
+                json_backend.dumps(resource_data, default=custom_serializer),
+            )
+    elif data is not None:
+        written[outputfile] = write_atomically(
+            outputfile,
+            json_backend.dumps(data, default=custom_serializer),
+        )
 
-    summary.append(call_summary)
+    if manifest is not None:
+        status = "failed" if "exception" in call_summary else "ok"
+        if batch is None:
+            calls = [(outputfile, parameters)]
+        else:
+            # Record each resource, so it can be retried on its own
+            calls = []
+            for identifier in parameters[batch["Parameter"]]:
+                resource_parameters = dict(parameters)
+                resource_parameters[batch["Parameter"]] = [identifier]
+                calls.append(
+                    (
+                        "{}/{}".format(outputfile, urllib.parse.quote_plus(identifier)),
+                        resource_parameters,
+                    )
+                )
+        for call_file, call_parameters in calls:
+            manifest.record(
+                call_file,
+                call_summary["service"],
+                method_to_call,
+                call_parameters,
+                status,
+                written.get(call_file),
+                poll,
+                batch,
+            )
 
+    if not call_summary.get("skipped", False):
+        summary.append(call_summary)
+    return True
+
+
+# Calls denied with AccessDeniedException for some resources or accounts, which are
+# expected rather than failures, with the reason printed for them
+KMS_DENIED = "Denied, which should mean this KMS has restricted access"
+TOLERATED_DENIALS = {
+    ("organizations", "list_accounts"): (
+        "Denied, which likely means this is not the organization root"
+    ),
+    ("kms", "list_key_policies"): KMS_DENIED,
+    ("kms", "list_grants"): KMS_DENIED,
+    ("kms", "get_key_policy"): KMS_DENIED,
+    ("kms", "get_key_rotation_status"): KMS_DENIED,
+}
+
+# Services that will only be queried in the default region
+# TODO: Identify these from boto
+UNIVERSAL_SERVICES = [
+    "account",
+    "sts",
+    "iam",
+    "route53",
+    "route53domains",
+    "s3",
+    "s3control",
+    "cloudfront",
+    "organizations",
+]
+
+
+def submit_call(
+    scheduler,
+    region_name,
+    runner,
+    outputfile,
+    handler,
+    method_to_call,
+    parameters,
+    summary,
+    batch=None,
+    manifest=None,
+):
+    """
+    Queue a call_function call, which is polled until its job finishes when the runner
+    has a Poll config
+    """
+    poll = runner.get("Poll", None)
+    if poll is None:
+        scheduler.submit(
+            region_name,
+            runner["Service"],
+            call_function,
+            outputfile,
+            handler,
+            method_to_call,
+            parameters,
+            None,
+            summary,
+            batch,
+            manifest,
+        )
+        return
 
-def collect(arguments):
-    logging.getLogger("botocore").setLevel(logging.WARN)
-    account_dir = "./{}".format(arguments.account_name)
+    max_wait = poll.get("MaxWait", None)
+
+    def on_timeout():
+        service = handler.meta.service_model.service_name
+        summary.append(
+            {
+                "service": service,
+                "action": method_to_call,
+                "parameters": parameters,
+                "exception": "Job did not finish within the maximum wait",
+            }
+        )
+        if manifest is not None:
+            manifest.record(
+                outputfile, service, method_to_call, parameters, "failed", poll=poll
+            )
 
-    summary = []
+    scheduler.submit_job(
+        region_name,
+        runner["Service"],
+        call_function,
+        outputfile,
+        handler,
+        method_to_call,
+        parameters,
+        poll,
+        summary,
+        batch,
+        manifest,
+        on_timeout=on_timeout,
+        max_wait=max_wait,
+    )
 
-    if arguments.clean and os.path.exists("account-data/{}".format(account_dir)):
-        rmtree("account-data/{}".format(account_dir))
 
-    make_directory("account-data")
-    make_directory("account-data/{}".format(account_dir))
+def collect_runner_in_region(
+    clients, account_dir, region_name, runner, scheduler, summary, manifest=None
+):
+    """
+    Queue the calls for one entry of collect_commands.yaml in a single region
+    """
+    dynamic_parameter = None
+    parameters = {}
+    handler = clients.client(runner["Service"], region_name)
+
+    filepath = "account-data/{}/{}/{}-{}".format(
+        account_dir, region_name, runner["Service"], runner["Request"]
+    )
+
+    method_to_call = snakecase(runner["Request"])
+
+    # Identify any parameters
+    if runner.get("Parameters", False):
+        for parameter in runner["Parameters"]:
+            parameters[parameter["Name"]] = parameter["Value"]
+
+            # Look for any dynamic values (ones that jq parse a file)
+            if "|" in parameter["Value"]:
+                dynamic_parameter = parameter["Name"]
+
+    if runner.get("Custom_collection", False):
+        # The data to collect for this function is too complicated for my existing code,
+        # so I have to write custom code.
+        if runner["Service"] == "ecs" and runner["Request"] == "describe-tasks":
+            action_path = filepath
+            make_directory(action_path)
+
+            # Read the ecs-list-clusters.json file
+            list_clusters_file = "account-data/{}/{}/{}".format(
+                account_dir, region_name, "ecs-list-clusters.json"
+            )
+
+            if os.path.isfile(list_clusters_file):
+                with open(list_clusters_file, "r") as f:
+                    list_clusters = json.load(f)
+
+                    # For each cluster, read the `ecs list-tasks`
+                    for clusterArn in list_clusters["clusterArns"]:
+                        cluster_path = (
+                            action_path + "/" + urllib.parse.quote_plus(clusterArn)
+                        )
+                        make_directory(cluster_path)
+
+                        list_tasks_file = "account-data/{}/{}/{}/{}".format(
+                            account_dir,
+                            region_name,
+                            "ecs-list-tasks",
+                            urllib.parse.quote_plus(clusterArn),
+                        )
+
+                        with open(list_tasks_file, "r") as f2:
+                            list_tasks = json.load(f2)
+
+                            if runner.get("Batch", False):
+                                # Describe the tasks not yet collected in batches
+                                task_arns = [
+                                    taskArn
+                                    for taskArn in list_tasks["taskArns"]
+                                    if not is_collected(
+                                        manifest,
+                                        cluster_path
+                                        + "/"
+                                        + urllib.parse.quote_plus(taskArn),
+                                    )
+                                ]
+                                for tasks in get_batches(
+                                    task_arns, runner["Batch"]["MaxSize"]
+                                ):
+                                    submit_call(
+                                        scheduler,
+                                        region_name,
+                                        runner,
+                                        cluster_path,
+                                        handler,
+                                        method_to_call,
+                                        {"cluster": clusterArn, "tasks": tasks},
+                                        summary,
+                                        runner["Batch"],
+                                        manifest=manifest,
+                                    )
+                                continue
+
+                            # For each task, call `ecs describe-tasks` using the `cluster` and `task` as arguments
+                            for taskArn in list_tasks["taskArns"]:
+                                outputfile = (
+                                    action_path
+                                    + "/"
+                                    + urllib.parse.quote_plus(clusterArn)
+                                    + "/"
+                                    + urllib.parse.quote_plus(taskArn)
+                                )
+
+                                call_parameters = {}
+                                call_parameters["cluster"] = clusterArn
+                                call_parameters["tasks"] = [taskArn]
+
+                                submit_call(
+                                    scheduler,
+                                    region_name,
+                                    runner,
+                                    outputfile,
+                                    handler,
+                                    method_to_call,
+                                    call_parameters,
+                                    summary,
+                                    manifest=manifest,
+                                )
+        elif (
+            runner["Service"] == "route53"
+            and runner["Request"] == "list-hosted-zones-by-vpc"
+        ):
+            action_path = filepath
+            make_directory(action_path)
+
+            # Read the regions file
+            regions_file = "account-data/{}/{}".format(
+                account_dir, "describe-regions.json"
+            )
+            with open(regions_file, "r") as f:
+                describe_regions = json.load(f)
+
+                # For each region
+                for collect_region in describe_regions["Regions"]:
+                    cluster_path = (
+                        action_path
+                        + "/"
+                        + urllib.parse.quote_plus(collect_region["RegionName"])
+                    )
+                    make_directory(cluster_path)
+
+                    # Read the VPC file
+                    describe_vpcs_file = "account-data/{}/{}/{}".format(
+                        account_dir,
+                        collect_region["RegionName"],
+                        "ec2-describe-vpcs.json",
+                    )
+
+                    if os.path.isfile(describe_vpcs_file):
+                        with open(describe_vpcs_file, "r") as f2:
+                            describe_vpcs = json.load(f2)
+
+                            for vpc in describe_vpcs["Vpcs"]:
+                                outputfile = (
+                                    action_path
+                                    + "/"
+                                    + urllib.parse.quote_plus(
+                                        collect_region["RegionName"]
+                                    )
+                                    + "/"
+                                    + urllib.parse.quote_plus(vpc["VpcId"])
+                                )
+
+                                call_parameters = {}
+                                call_parameters["VPCRegion"] = collect_region[
+                                    "RegionName"
+                                ]
+                                call_parameters["VPCId"] = vpc["VpcId"]
+                                submit_call(
+                                    scheduler,
+                                    region_name,
+                                    runner,
+                                    outputfile,
+                                    handler,
+                                    method_to_call,
+                                    call_parameters,
+                                    summary,
+                                    manifest=manifest,
+                                )
+
+    elif dynamic_parameter is not None:
+        # Set up directory for the dynamic value
+        make_directory(filepath)
+
+        # The dynamic parameter must always be the first value
+        parameter_file = parameters[dynamic_parameter].split("|")[0]
+        parameter_file = "account-data/{}/{}/{}".format(
+            account_dir, region_name, parameter_file
+        )
+
+        # Get array if a globbing pattern is used (ex. "*.json")
+        parameter_files = glob.glob(parameter_file)
+
+        # Runners with a Batch config pass many identifiers in a single call
+        batch = runner.get("Batch", None)
+        batch_identifiers = []
+
+        for parameter_file in parameter_files:
+            if not os.path.isfile(parameter_file):
+                # The file where parameters are obtained from does not exist
+                # Need to manually add the failure to our list of calls made as this failure
+                # occurs before the call is attempted.
+                call_summary = {
+                    "service": handler.meta.service_model.service_name,
+                    "action": method_to_call,
+                    "parameters": parameters,
+                    "exception": "Parameter file does not exist: {}".format(
+                        parameter_file
+                    ),
+                }
+                summary.append(call_summary)
+                print(
+                    "  The file where parameters are obtained from does not exist: {}".format(
+                        parameter_file
+                    ),
+                    flush=True,
+                )
+                continue
+
+            with open(parameter_file, "r") as f:
+                parameter_values = json.load(f)
+                pyjq_parse_string = "|".join(
+                    parameters[dynamic_parameter].split("|")[1:]
+                )
+                for parameter in pyjq.all(pyjq_parse_string, parameter_values):
+                    filename = get_filename_from_parameter(parameter)
+                    identifier = get_identifier_from_parameter(parameter)
+
+                    if batch is not None:
+                        # The calls are made below, for batches of the identifiers not yet collected
+                        if identifier not in batch_identifiers and not is_collected(
+                            manifest, "{}/{}".format(filepath, filename)
+                        ):
+                            batch_identifiers.append(identifier)
+                        continue
+
+                    call_parameters = dict(parameters)
+                    call_parameters[dynamic_parameter] = identifier
+
+                    outputfile = "{}/{}".format(filepath, filename)
+
+                    submit_call(
+                        scheduler,
+                        region_name,
+                        runner,
+                        outputfile,
+                        handler,
+                        method_to_call,
+                        call_parameters,
+                        summary,
+                        manifest=manifest,
+                    )
+
+        if batch is not None:
+            for identifiers in get_batches(batch_identifiers, batch["MaxSize"]):
+                call_parameters = dict(parameters)
+                call_parameters[dynamic_parameter] = identifiers
+                submit_call(
+                    scheduler,
+                    region_name,
+                    runner,
+                    filepath,
+                    handler,
+                    method_to_call,
+                    call_parameters,
+                    summary,
+                    batch,
+                    manifest=manifest,
+                )
+    else:
+        filepath = filepath + ".json"
+        submit_call(
+            scheduler,
+            region_name,
+            runner,
+            filepath,
+            handler,
+            method_to_call,
+            parameters,
+            summary,
+            manifest=manifest,
+        )
+
+
+def get_runner_name(runner):
+    """Name used for the files of a runner, ex. iam-get-account-authorization-details"""
+    return "{}-{}".format(runner["Service"], runner["Request"])
+
+
+def get_runner_dependency_names(runner):
+    """
+    Returns the names of the runners whose output this runner reads, which come from the
+    file names in its dynamic parameters, and from any names listed in DependsOn.
+    """
+    names = []
+    for parameter in runner.get("Parameters", []):
+        value = parameter["Value"]
+        if not isinstance(value, str) or "|" not in value:
+            continue
+        # Ex. "iam-get-account-authorization-details.json|..." or "elbv2-describe-target-groups/*|..."
+        parameter_file = value.split("|")[0].split("/")[0]
+        if parameter_file.endswith(".json"):
+            parameter_file = parameter_file[: -len(".json")]
+        names.append(parameter_file)
+    names.extend(runner.get("DependsOn", []))
+    return names
+
+
+def build_collect_plan(collect_commands):
+    """
+    Returns a list, in the same order as collect_commands, of the sets of indexes of the
+    runners that each runner depends on.
+    """
+    indexes_by_name = {}
+    for index, runner in enumerate(collect_commands):
+        indexes_by_name.setdefault(get_runner_name(runner), []).append(index)
+
+    plan = []
+    for index, runner in enumerate(collect_commands):
+        dependencies = set()
+        for name in get_runner_dependency_names(runner):
+            # Files that no runner creates, such as describe-regions.json, are ignored
+            dependencies.update(indexes_by_name.get(name, []))
+        dependencies.discard(index)
+        plan.append(dependencies)
+
+    # Ensure the graph can be run
+    get_runner_depths(plan)
+    return plan
+
+
+def get_runner_depths(plan):
+    """Returns the length of the longest chain of dependencies that ends at each runner"""
+    depths = {}
+    visiting = set()
+
+    def depth(index):
+        if index in depths:
+            return depths[index]
+        if index in visiting:
+            raise Exception(
+                "Cycle found in collect_commands.yaml dependencies at entry {}".format(
+                    index
+                )
+            )
+        visiting.add(index)
+        depths[index] = 1 + max([depth(d) for d in plan[index]], default=0)
+        visiting.remove(index)
+        return depths[index]
+
+    return [depth(index) for index in range(len(plan))]
+
+
+def print_collect_plan(collect_commands):
+    plan = build_collect_plan(collect_commands)
+    depths = get_runner_depths(plan)
+
+    print("Collection plan for {} runners".format(len(collect_commands)))
+    for index, runner in enumerate(collect_commands):
+        dependencies = ", ".join(
+            sorted(set(get_runner_name(collect_commands[d]) for d in plan[index]))
+        )
+        print(
+            "  {:>3} (depth {}) {}{}".format(
+                index,
+                depths[index],
+                get_runner_name(runner),
+                " <- {}".format(dependencies) if dependencies else "",
+            )
+        )
+
+    # Walk back from the deepest runner to find the critical path
+    index = depths.index(max(depths, default=0)) if depths else None
+    critical_path = []
+    while index is not None:
+        critical_path.insert(0, get_runner_name(collect_commands[index]))
+        index = max(plan[index], key=lambda d: depths[d], default=None)
+    print("Critical path: {}".format(" -> ".join(critical_path)))
+
+
+def collect_runners(
+    clients,
+    account_dir,
+    region_list,
+    default_region,
+    collect_commands,
+    scheduler,
+    summary,
+    manifest=None,
+):
+    """
+    Collects every runner in every region it applies to. Each (runner, region) unit is
+    started as soon as the units it depends on are done, so unrelated services don't
+    wait behind slow ones.
+    """
+    plan = build_collect_plan(collect_commands)
+
+    # Identify the regions each runner is called in
+    units_by_runner = []
+    for runner in collect_commands:
+        runner_units = []
+        for region in region_list["Regions"]:
+            # Only call universal services in default region
+            if runner["Service"] in UNIVERSAL_SERVICES:
+                if region["RegionName"] != default_region:
+                    continue
+            elif region["RegionName"] not in clients.get_available_regions(
+                runner["Service"]
+            ):
+                print(
+                    "  Skipping region {}, as {} does not exist there".format(
+                        region["RegionName"], runner["Service"]
+                    )
+                )
+                continue
+            runner_units.append(region["RegionName"])
+        units_by_runner.append(runner_units)
+
+    # Order units by their position in collect_commands.yaml, then by region
+    unit_order = {}
+    for index, runner_units in enumerate(units_by_runner):
+        for region_index, region_name in enumerate(runner_units):
+            unit_order[(index, region_name)] = (index, region_index)
+
+    waiting_on = {}
+    dependents = {}
+    for unit in unit_order:
+        index, region_name = unit
+        waiting_on[unit] = set()
+        for dependency in plan[index]:
+            dependency_regions = units_by_runner[dependency]
+            # A universal runner is only called once, so it needs the data from every region.
+            # Otherwise the data is read from the same region, when the dependency runs there.
+            if (
+                collect_commands[index]["Service"] not in UNIVERSAL_SERVICES
+                and region_name in dependency_regions
+            ):
+                dependency_regions = [region_name]
+            for dependency_region in dependency_regions:
+                waiting_on[unit].add((dependency, dependency_region))
+                dependents.setdefault((dependency, dependency_region), []).append(unit)
+
+    finished = queue.Queue()
+    ready = [unit for unit in unit_order if not waiting_on[unit]]
+    started_runners = set()
+    remaining = len(unit_order)
+
+    # Polls the asynchronous jobs of runners with a Poll config, such as IAM access reports
+    poller = JobPoller(scheduler)
+    try:
+        while remaining > 0:
+            if ready:
+                ready.sort(key=lambda u: unit_order[u])
+                # When running serially, start one unit at a time so the units run in the
+                # order of collect_commands.yaml
+                if scheduler.is_concurrent:
+                    to_start, ready = ready, []
+                else:
+                    to_start, ready = ready[:1], ready[1:]
+
+                for unit in to_start:
+                    index, region_name = unit
+                    runner = collect_commands[index]
+                    if index not in started_runners:
+                        started_runners.add(index)
+                        print(
+                            "* Getting {}:{} info".format(
+                                runner["Service"], runner["Request"]
+                            ),
+                            flush=True,
+                        )
+                    group = CallGroup(
+                        scheduler, functools.partial(finished.put, unit), poller
+                    )
+                    try:
+                        collect_runner_in_region(
+                            clients,
+                            account_dir,
+                            region_name,
+                            runner,
+                            group,
+                            summary,
+                            manifest,
+                        )
+                    finally:
+                        group.close()
+
+            # Wait for a unit to finish unless there is more that can be started right away
+            while remaining > 0:
+                try:
+                    unit = finished.get(block=not ready and scheduler.is_concurrent)
+                except queue.Empty:
+                    if ready:
+                        break
+                    # When running serially, the units left are waiting on jobs, which
+                    # are polled together in this thread
+                    poller.poll_next()
+                    continue
+                remaining -= 1
+                for dependent in dependents.get(unit, []):
+                    waiting_on[dependent].discard(unit)
+                    if not waiting_on[dependent]:
+                        ready.append(dependent)
+                if not scheduler.is_concurrent:
+                    break
+
+        poller.wait()
+        scheduler.wait()
+    finally:
+        poller.shutdown()
+
+
+def mark_failed_calls(manifest):
+    """
+    Mark the calls the manifest records as failed, or whose file is missing or
+    incomplete, to be made again. collect_runners makes them, along with the calls that
+    were never made, such as those of a run that crashed or whose parameter file was
+    missing, as it only skips the calls recorded as successful.
+    """
+    retries = manifest.get_retries()
+    for key in retries:
+        manifest.invalidate(key)
+    print(
+        "* Retrying {} calls, along with those that were never made".format(
+            len(retries)
+        ),
+        flush=True,
+    )
 
-    # Identify the default region used by global services such as IAM
+
+def get_default_region():
+    """Identify the default region used by global services such as IAM"""
     default_region = os.environ.get("AWS_REGION", "us-east-1")
     if "gov-" in default_region:
         default_region = "us-gov-west-1"
@@ -230,6 +991,129 @@ def collect(arguments):
         default_region = "cn-north-1"
     else:
         default_region = "us-east-1"
+    return default_region
+
+
+def get_session(arguments, default_region):
+    session_data = {"region_name": default_region}
+
+    if arguments.profile_name:
+        session_data["profile_name"] = arguments.profile_name
+
+    return boto3.Session(**session_data)
+
+
+def collect_organization_account(arguments, account):
+    """
+    Collect an account of the organization, in a process of the pool. The output of the
+    collection is written to account-data/<account>/collect.log.
+    Returns None when the account was collected without errors, else a description of
+    what went wrong.
+    """
+    account_dir = "account-data/{}".format(account["name"])
+    if arguments.clean and os.path.exists(account_dir):
+        rmtree(account_dir)
+    make_directory("account-data")
+    make_directory(account_dir)
+
+    account_arguments = argparse.Namespace(**vars(arguments))
+    account_arguments.account_name = account["name"]
+    account_arguments.clean = False
+
+    with open("{}/collect.log".format(account_dir), "w") as log:
+        with contextlib.redirect_stdout(log):
+            try:
+                session = get_account_session(
+                    get_session(arguments, get_default_region()),
+                    account["id"],
+                    arguments.org_role,
+                    duration_seconds=arguments.org_session_duration,
+                )
+                collect(account_arguments, session)
+            except SystemExit as e:
+                if e.code:
+                    return "collect exited with {}".format(e.code)
+            except Exception as e:
+                print("Exception: {}".format(e), flush=True)
+                return str(e)
+    return None
+
+
+def collect_organization(arguments):
+    """
+    Collect every active account of the organization, assuming a role into each. The
+    accounts are collected in a pool of processes, --max-accounts at a time.
+    """
+    session = get_session(arguments, get_default_region())
+    try:
+        accounts = get_organization_accounts(session, active_only=True)
+    except NoCredentialsError:
+        print("ERROR: No AWS credentials configured.", flush=True)
+        exit(-1)
+    except ClientError as e:
+        print(
+            "ERROR: Unable to list the accounts of the organization, which must be done from its management account: {}".format(
+                e
+            ),
+            flush=True,
+        )
+        exit(-1)
+    print(
+        "* Collecting {} accounts of the organization, {} at a time".format(
+            len(accounts), arguments.max_accounts
+        ),
+        flush=True,
+    )
+
+    failures = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=arguments.max_accounts
+    ) as executor:
+        futures = {
+            executor.submit(collect_organization_account, arguments, account): account
+            for account in accounts
+        }
+        for future in concurrent.futures.as_completed(futures):
+            account = futures[future]
+            try:
+                error = future.result()
+            except Exception as e:
+                error = str(e)
+            if error is None:
+                print("  Collected {} ({})".format(account["name"], account["id"]))
+            else:
+                failures.append(account)
+                print(
+                    "  Failed to collect {} ({}): {}, see account-data/{}/collect.log".format(
+                        account["name"], account["id"], error, account["name"]
+                    ),
+                    flush=True,
+                )
+
+    print("--------------------------------------------------------------------")
+    print(
+        "Summary: {} accounts collected. {} with errors".format(
+            len(accounts), len(failures)
+        )
+    )
+    if len(failures) > 0:
+        # Ensure errors can be detected
+        exit(-1)
+
+
+def collect(arguments, session=None):
+    logging.getLogger("botocore").setLevel(logging.WARN)
+    account_dir = "./{}".format(arguments.account_name)
+
+    summary = []
+
+    if arguments.clean and os.path.exists("account-data/{}".format(account_dir)):
+        rmtree("account-data/{}".format(account_dir))
+
+    make_directory("account-data")
+    make_directory("account-data/{}".format(account_dir))
+
+    default_region = get_default_region()
 
     regions_filter = None
     if len(arguments.regions_filter) > 0:
@@ -238,14 +1122,27 @@ def collect(arguments):
         if default_region not in regions_filter:
             regions_filter.append(default_region)
 
-    session_data = {"region_name": default_region}
-
-    if arguments.profile_name:
-        session_data["profile_name"] = arguments.profile_name
-
-    session = boto3.Session(**session_data)
+    if session is None:
+        session = get_session(arguments, default_region)
+
+    rate_limiter = None
+    if arguments.rate_limit > 0:
+        rate_limiter = RateLimiter(arguments.rate_limit, arguments.account_rate_limit)
+    circuit_breakers = None
+    if arguments.max_denied > 0:
+        circuit_breakers = CircuitBreakers(arguments.max_denied, TOLERATED_DENIALS)
+    clients = ClientPool(
+        session,
+        {
+            "retries": {"max_attempts": arguments.max_attempts},
+            # Allow every concurrent call to a service in a region to have a connection
+            "max_pool_connections": max(10, arguments.max_calls_per_service),
+        },
+        rate_limiter,
+        circuit_breakers,
+    )
 
-    sts = session.client("sts")
+    sts = clients.client("sts", default_region)
     try:
         sts.get_caller_identity()
     except ClientError as e:
@@ -265,7 +1162,7 @@ def collect(arguments):
             exit(-1)
 
     # Ensure we can make iam calls
-    iam = session.client("iam")
+    iam = clients.client("iam", default_region)
     try:
         iam.get_user(UserName="test")
     except ClientError as e:
@@ -287,7 +1184,7 @@ def collect(arguments):
         exit(-1)
 
     print("* Getting region names", flush=True)
-    ec2 = session.client("ec2")
+    ec2 = clients.client("ec2", default_region)
     region_list = ec2.describe_regions()
 
     if regions_filter is not None:
@@ -307,251 +1204,57 @@ def collect(arguments):
             )
         )
 
-    # Services that will only be queried in the default_
-    # TODO: Identify these from boto
-    universal_services = [
-        "account",
-        "sts",
-        "iam",
-        "route53",
-        "route53domains",
-        "s3",
-        "s3control",
-        "cloudfront",
-        "organizations",
-    ]
-
-    with open("collect_commands.yaml", "r") as f:
-        collect_commands = yaml.safe_load(f)
-
-    for runner in collect_commands:
-        print(
-            "* Getting {}:{} info".format(runner["Service"], runner["Request"]),
-            flush=True,
+    manifest = Manifest("account-data/{}".format(account_dir))
+    scheduler = CallScheduler(
+        arguments.workers,
+        arguments.max_calls_per_region,
+        arguments.max_calls_per_service,
+    )
+    try:
+        with open("collect_commands.yaml", "r") as f:
+            collect_commands = yaml.safe_load(f)
+
+        if arguments.retry_failed:
+            mark_failed_calls(manifest)
+        elif arguments.incremental:
+            # Only collect again the output that is older than its runner's TTL
+            manifest.ttls = {
+                get_runner_name(runner): parse_ttl(runner["TTL"])
+                for runner in collect_commands
+                if "TTL" in runner
+            }
+
+        collect_runners(
+            clients,
+            account_dir,
+            region_list,
+            default_region,
+            collect_commands,
+            scheduler,
+            summary,
+            manifest,
         )
-
-        parameters = {}
-        for region in region_list["Regions"]:
-            dynamic_parameter = None
-            # Only call universal services in default region
-            if runner["Service"] in universal_services:
-                if region["RegionName"] != default_region:
-                    continue
-            elif region["RegionName"] not in session.get_available_regions(
-                runner["Service"]
-            ):
-                print(
-                    "  Skipping region {}, as {} does not exist there".format(
-                        region["RegionName"], runner["Service"]
-                    )
-                )
-                continue
-            handler = session.client(
-                runner["Service"],
-                region_name=region["RegionName"],
-                config=Config(retries={"max_attempts": arguments.max_attempts}),
-            )
-
-            filepath = "account-data/{}/{}/{}-{}".format(
-                account_dir, region["RegionName"], runner["Service"], runner["Request"]
-            )
-
-            method_to_call = snakecase(runner["Request"])
-
-            # Identify any parameters
-            if runner.get("Parameters", False):
-                for parameter in runner["Parameters"]:
-                    parameters[parameter["Name"]] = parameter["Value"]
-
-                    # Look for any dynamic values (ones that jq parse a file)
-                    if "|" in parameter["Value"]:
-                        dynamic_parameter = parameter["Name"]
-
-            if runner.get("Custom_collection", False):
-                # The data to collect for this function is too complicated for my existing code,
-                # so I have to write custom code.
-                if runner["Service"] == "ecs" and runner["Request"] == "describe-tasks":
-                    action_path = filepath
-                    make_directory(action_path)
-
-                    # Read the ecs-list-clusters.json file
-                    list_clusters_file = "account-data/{}/{}/{}".format(
-                        account_dir, region["RegionName"], "ecs-list-clusters.json"
-                    )
-
-                    if os.path.isfile(list_clusters_file):
-                        with open(list_clusters_file, "r") as f:
-                            list_clusters = json.load(f)
-
-                            # For each cluster, read the `ecs list-tasks`
-                            for clusterArn in list_clusters["clusterArns"]:
-                                cluster_path = (
-                                    action_path
-                                    + "/"
-                                    + urllib.parse.quote_plus(clusterArn)
-                                )
-                                make_directory(cluster_path)
-
-                                list_tasks_file = "account-data/{}/{}/{}/{}".format(
-                                    account_dir,
-                                    region["RegionName"],
-                                    "ecs-list-tasks",
-                                    urllib.parse.quote_plus(clusterArn),
-                                )
-
-                                with open(list_tasks_file, "r") as f2:
-                                    list_tasks = json.load(f2)
-
-                                    # For each task, call `ecs describe-tasks` using the `cluster` and `task` as arguments
-                                    for taskArn in list_tasks["taskArns"]:
-                                        outputfile = (
-                                            action_path
-                                            + "/"
-                                            + urllib.parse.quote_plus(clusterArn)
-                                            + "/"
-                                            + urllib.parse.quote_plus(taskArn)
-                                        )
-
-                                        call_parameters = {}
-                                        call_parameters["cluster"] = clusterArn
-                                        call_parameters["tasks"] = [taskArn]
-
-                                        call_function(
-                                            outputfile,
-                                            handler,
-                                            method_to_call,
-                                            call_parameters,
-                                            runner.get("Check", None),
-                                            summary,
-                                        )
-                elif (
-                    runner["Service"] == "route53"
-                    and runner["Request"] == "list-hosted-zones-by-vpc"
-                ):
-                    action_path = filepath
-                    make_directory(action_path)
-
-                    # Read the regions file
-                    regions_file = "account-data/{}/{}".format(
-                        account_dir, "describe-regions.json"
-                    )
-                    with open(regions_file, "r") as f:
-                        describe_regions = json.load(f)
-
-                        # For each region
-                        for collect_region in describe_regions["Regions"]:
-                            cluster_path = (
-                                action_path
-                                + "/"
-                                + urllib.parse.quote_plus(collect_region["RegionName"])
-                            )
-                            make_directory(cluster_path)
-
-                            # Read the VPC file
-                            describe_vpcs_file = "account-data/{}/{}/{}".format(
-                                account_dir,
-                                collect_region["RegionName"],
-                                "ec2-describe-vpcs.json",
-                            )
-
-                            if os.path.isfile(describe_vpcs_file):
-                                with open(describe_vpcs_file, "r") as f2:
-                                    describe_vpcs = json.load(f2)
-
-                                    for vpc in describe_vpcs["Vpcs"]:
-                                        outputfile = (
-                                            action_path
-                                            + "/"
-                                            + urllib.parse.quote_plus(
-                                                collect_region["RegionName"]
-                                            )
-                                            + "/"
-                                            + urllib.parse.quote_plus(vpc["VpcId"])
-                                        )
-
-                                        call_parameters = {}
-                                        call_parameters["VPCRegion"] = collect_region[
-                                            "RegionName"
-                                        ]
-                                        call_parameters["VPCId"] = vpc["VpcId"]
-                                        call_function(
-                                            outputfile,
-                                            handler,
-                                            method_to_call,
-                                            call_parameters,
-                                            runner.get("Check", None),
-                                            summary,
-                                        )
-
-            elif dynamic_parameter is not None:
-                # Set up directory for the dynamic value
-                make_directory(filepath)
-
-                # The dynamic parameter must always be the first value
-                parameter_file = parameters[dynamic_parameter].split("|")[0]
-                parameter_file = "account-data/{}/{}/{}".format(
-                    account_dir, region["RegionName"], parameter_file
-                )
-
-                # Get array if a globbing pattern is used (ex. "*.json")
-                parameter_files = glob.glob(parameter_file)
-
-                for parameter_file in parameter_files:
-                    if not os.path.isfile(parameter_file):
-                        # The file where parameters are obtained from does not exist
-                        # Need to manually add the failure to our list of calls made as this failure
-                        # occurs before the call is attempted.
-                        call_summary = {
-                            "service": handler.meta.service_model.service_name,
-                            "action": method_to_call,
-                            "parameters": parameters,
-                            "exception": "Parameter file does not exist: {}".format(
-                                parameter_file
-                            ),
-                        }
-                        summary.append(call_summary)
-                        print(
-                            "  The file where parameters are obtained from does not exist: {}".format(
-                                parameter_file
-                            ),
-                            flush=True,
-                        )
-                        continue
-
-                    with open(parameter_file, "r") as f:
-                        parameter_values = json.load(f)
-                        pyjq_parse_string = "|".join(
-                            parameters[dynamic_parameter].split("|")[1:]
-                        )
-                        for parameter in pyjq.all(pyjq_parse_string, parameter_values):
-                            filename = get_filename_from_parameter(parameter)
-                            identifier = get_identifier_from_parameter(parameter)
-                            call_parameters = dict(parameters)
-                            call_parameters[dynamic_parameter] = identifier
-
-                            outputfile = "{}/{}".format(filepath, filename)
-
-                            call_function(
-                                outputfile,
-                                handler,
-                                method_to_call,
-                                call_parameters,
-                                runner.get("Check", None),
-                                summary,
-                            )
-            else:
-                filepath = filepath + ".json"
-                call_function(
-                    filepath,
-                    handler,
-                    method_to_call,
-                    parameters,
-                    runner.get("Check", None),
-                    summary,
-                )
+    finally:
+        scheduler.shutdown()
+        manifest.save()
 
     # Print summary
     print("--------------------------------------------------------------------")
+    clients.print_report()
+    if rate_limiter is not None:
+        rate_limiter.print_report()
+    if circuit_breakers is not None:
+        for stopped in circuit_breakers.get_summaries():
+            print(
+                "Skipped {} calls to {}.{} in {} after {} in a row were denied with {}".format(
+                    stopped["skipped"],
+                    stopped["service"],
+                    stopped["action"],
+                    stopped["region"],
+                    circuit_breakers.threshold,
+                    stopped["error_code"],
+                )
+            )
     failures = []
     for call_summary in summary:
         if "exception" in call_summary:
@@ -569,6 +1272,7 @@ def collect(arguments):
                     call_summary["exception"],
                 )
             )
+        print("Run collect again with --retry-failed to retry only these calls")
         # Ensure errors can be detected
         exit(-1)
 
@@ -613,9 +1317,115 @@ def run(arguments):
         dest="regions_filter",
         default="",
     )
+    parser.add_argument(
+        "--workers",
+        help="Number of API calls to make concurrently (default 1)",
+        required=False,
+        type=int,
+        dest="workers",
+        default=1,
+    )
+    parser.add_argument(
+        "--max-calls-per-region",
+        help="When using --workers, limit the concurrent calls made to a single region (default 16)",
+        required=False,
+        type=int,
+        dest="max_calls_per_region",
+        default=16,
+    )
+    parser.add_argument(
+        "--max-calls-per-service",
+        help="When using --workers, limit the concurrent calls made to a single service in a region (default 4)",
+        required=False,
+        type=int,
+        dest="max_calls_per_service",
+        default=4,
+    )
+    parser.add_argument(
+        "--rate-limit",
+        help="Starting requests per second for each service in a region, which adapts to throttling (default 0, which disables this)",
+        required=False,
+        type=float,
+        dest="rate_limit",
+        default=0,
+    )
+    parser.add_argument(
+        "--max-denied",
+        help="Stop making the calls for an action in a region after this many in a row are denied with the same error (default 0, which disables this)",
+        required=False,
+        type=int,
+        dest="max_denied",
+        default=0,
+    )
+    parser.add_argument(
+        "--retry-failed",
+        help="Only make the calls that the account's manifest.json records as failed, or whose files are missing or incomplete, and those that were never made",
+        action="store_true",
+        dest="retry_failed",
+    )
+    parser.add_argument(
+        "--incremental",
+        help="Collect again the responses older than the TTL of their entry in collect_commands.yaml, and those of entries without a TTL",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--account-rate-limit",
+        help="Maximum requests per second to the account across every service and region, with --rate-limit (default 0, unlimited)",
+        required=False,
+        type=float,
+        dest="account_rate_limit",
+        default=0,
+    )
+    parser.add_argument(
+        "--org",
+        help="Collect every active account of the AWS Organization, each into account-data/<account name>/",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--org-role",
+        help="Role to assume in each account of the organization (default {})".format(
+            DEFAULT_ROLE_NAME
+        ),
+        required=False,
+        type=str,
+        dest="org_role",
+        default=DEFAULT_ROLE_NAME,
+    )
+    parser.add_argument(
+        "--org-session-duration",
+        help="With --org, the seconds each assumed role session lasts before it is renewed (default {})".format(
+            DEFAULT_SESSION_DURATION
+        ),
+        required=False,
+        type=int,
+        dest="org_session_duration",
+        default=DEFAULT_SESSION_DURATION,
+    )
+    parser.add_argument(
+        "--max-accounts",
+        help="With --org, the number of accounts to collect at once, each in its own process (default 4)",
+        required=False,
+        type=int,
+        dest="max_accounts",
+        default=4,
+    )
+    parser.add_argument(
+        "--plan",
+        help="Print the order the collect_commands.yaml runners will be collected in, based on their dependencies, and exit",
+        action="store_true",
+    )
 
     args = parser.parse_args(arguments)
 
+    if args.plan:
+        with open("collect_commands.yaml", "r") as f:
+            print_collect_plan(yaml.safe_load(f))
+        return
+
+    if args.org:
+        collect_organization(args)
+        return
+
     if not args.account_name:
         try:
             config = json.load(open(args.config))
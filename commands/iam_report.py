@@ -94,7 +94,13 @@ def get_access_advisor(region, principal_stats, json_account_auth_details, args)
         json_last_access_details = get_parameter_file(
             region, "iam", "get-service-last-accessed-details", job_id
         )
-        stats["last_access"] = json_last_access_details
+        # The loaded data is shared and read-only, so the services are copied to add
+        # the days since their last use
+        stats["last_access"] = dict(json_last_access_details)
+        stats["last_access"]["ServicesLastAccessed"] = [
+            dict(service)
+            for service in json_last_access_details["ServicesLastAccessed"]
+        ]
 
         stats["is_inactive"] = True
 
@@ -102,7 +108,7 @@ def get_access_advisor(region, principal_stats, json_account_auth_details, args)
             json_last_access_details["JobCompletionDate"][0:10], "%Y-%m-%d"
         )
 
-        for service in json_last_access_details["ServicesLastAccessed"]:
+        for service in stats["last_access"]["ServicesLastAccessed"]:
             if "LastAuthenticated" in service:
                 last_access_date = datetime.datetime.strptime(
                     service["LastAuthenticated"][0:10], "%Y-%m-%d"
@@ -551,7 +557,7 @@ def iam_report(accounts, config, args):
             )
 
         # Show inline policies
-        policies = stats["auth"].get("UserPolicyList", [])
+        policies = list(stats["auth"].get("UserPolicyList", []))
         policies.extend(stats["auth"].get("RolePolicyList", []))
         p["inline_policies"] = []
         for policy in policies:
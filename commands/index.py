@@ -0,0 +1,44 @@
+from __future__ import print_function
+import argparse
+import os
+
+from shared.common import parse_arguments
+from shared.store import Store, DEFAULT_PATH
+
+__description__ = "Index the collected data into a SQLite database"
+
+
+def index(accounts, database):
+    store = Store(database)
+    try:
+        for account in accounts:
+            account_path = os.path.join("account-data", account["name"])
+            if not os.path.isdir(account_path):
+                print("INFO: Skipping account {}, no data".format(account["name"]))
+                continue
+            counts = store.index_account(account["name"], account_path)
+            print(
+                "{}: {} files indexed with {} resources, {} unchanged, {} removed, {} skipped as they aren't JSON".format(
+                    account["name"],
+                    counts["indexed"],
+                    counts["resources"],
+                    counts["unchanged"],
+                    counts["removed"],
+                    counts["skipped"],
+                ),
+                flush=True,
+            )
+    finally:
+        store.close()
+
+
+def run(arguments):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--database",
+        help="SQLite database to create or update",
+        default=DEFAULT_PATH,
+        type=str,
+    )
+    args, accounts, _ = parse_arguments(arguments, parser)
+    index(accounts, args.database)
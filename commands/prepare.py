@@ -24,15 +24,25 @@ USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
 import json
-import operator
-import itertools
+import time
 import argparse
-import pyjq
+import concurrent.futures
+from shared import jq
 import copy
 import urllib.parse
-from netaddr import IPNetwork, IPAddress
-from shared.common import get_account, get_regions, is_external_cidr
-from shared.query import query_aws, get_parameter_file
+from shared.cidr import CidrTrie, IpIndex, is_cidr_nested
+from shared.common import (
+    get_account,
+    get_regions,
+    get_filter_values,
+    is_external_cidr,
+)
+from shared.query import (
+    query_aws,
+    get_parameter_file,
+    get_account_file,
+    get_cache_stats,
+)
 from shared.nodes import (
     Account,
     Region,
@@ -50,6 +60,7 @@ from shared.nodes import (
     ElasticSearch,
     Cidr,
     Connection,
+    Placement,
 )
 
 __description__ = "Generate network connection information file"
@@ -64,23 +75,23 @@ def log(msg):
 
 
 def get_vpcs(region, outputfilter):
+    # The values are passed as variables, so the expression is the same for any filter
     vpc_filter = ""
+    variables = {}
     if "vpc-ids" in outputfilter:
-        vpc_filter += " | select (.VpcId | contains({}))".format(
-            outputfilter["vpc-ids"]
-        )
+        vpc_filter += " | select (.VpcId | contains($vpc_ids[]))"
+        variables["vpc_ids"] = get_filter_values(outputfilter["vpc-ids"])
     if "vpc-names" in outputfilter:
-        vpc_filter += ' | select(.Tags != null) | select (.Tags[] | (.Key == "Name") and (.Value | contains({})))'.format(
-            outputfilter["vpc-names"]
-        )
+        vpc_filter += ' | select(.Tags != null) | select (.Tags[] | (.Key == "Name") and (.Value | contains($vpc_names[])))'
+        variables["vpc_names"] = get_filter_values(outputfilter["vpc-names"])
     vpcs = query_aws(region.account, "ec2-describe-vpcs", region)
-    return pyjq.all(".Vpcs[]?{}".format(vpc_filter), vpcs)
+    return jq.all(".Vpcs[]?{}".format(vpc_filter), vpcs, variables=variables)
 
 
 def get_azs(vpc):
     azs = query_aws(vpc.account, "ec2-describe-availability-zones", vpc.region)
     resource_filter = ".AvailabilityZones[]"
-    return pyjq.all(resource_filter, azs)
+    return jq.all(resource_filter, azs)
 
 
 def get_vpc_peerings(region):
@@ -88,28 +99,24 @@ def get_vpc_peerings(region):
         region.account, "ec2-describe-vpc-peering-connections", region
     )
     resource_filter = ".VpcPeeringConnections[]?"
-    return pyjq.all(resource_filter, vpc_peerings)
+    return jq.all(resource_filter, vpc_peerings)
 
 
 def get_subnets(az):
-    subnets = query_aws(az.account, "ec2-describe-subnets", az.region)
-    resource_filter = (
-        '.Subnets[] | select(.VpcId == "{}") | select(.AvailabilityZone == "{}")'
-    )
-    return pyjq.all(resource_filter.format(az.vpc.local_id, az.local_id), subnets)
+    return az.region.index.get_zone_subnets(az.vpc.local_id, az.local_id)
 
 
 def get_ec2s(region):
     instances = query_aws(region.account, "ec2-describe-instances", region.region)
     resource_filter = '.Reservations[]?.Instances[] | select(.State.Name == "running")'
-    return pyjq.all(resource_filter, instances)
+    return jq.all(resource_filter, instances)
 
 
 def get_elbs(region):
     load_balancers = query_aws(
         region.account, "elb-describe-load-balancers", region.region
     )
-    return pyjq.all(".LoadBalancerDescriptions[]?", load_balancers)
+    return jq.all(".LoadBalancerDescriptions[]?", load_balancers)
 
 
 def get_elbv2s(region):
@@ -117,17 +124,17 @@ def get_elbv2s(region):
     load_balancers = query_aws(
         region.account, "elbv2-describe-load-balancers", region.region
     )
-    return pyjq.all(".LoadBalancers[]?", load_balancers)
+    return jq.all(".LoadBalancers[]?", load_balancers)
 
 
 def get_vpc_endpoints(region):
     endpoints = query_aws(region.account, "ec2-describe-vpc-endpoints", region.region)
-    return pyjq.all(".VpcEndpoints[]?", endpoints)
+    return jq.all(".VpcEndpoints[]?", endpoints)
 
 
 def get_rds_instances(region):
     instances = query_aws(region.account, "rds-describe-db-instances", region.region)
-    return pyjq.all(".DBInstances[]?", instances)
+    return jq.all(".DBInstances[]?", instances)
 
 
 def get_ecs_tasks(region):
@@ -136,33 +143,35 @@ def get_ecs_tasks(region):
     for clusterArn in clusters.get("clusterArns", []):
         tasks_json = get_parameter_file(region, "ecs", "list-tasks", clusterArn)
         for taskArn in tasks_json["taskArns"]:
-            task_path = "account-data/{}/{}/{}/{}/{}".format(
+            task = get_account_file(
                 region.account.name,
-                region.region.name,
-                "ecs-describe-tasks",
-                urllib.parse.quote_plus(clusterArn),
-                urllib.parse.quote_plus(taskArn),
+                "{}/{}/{}/{}".format(
+                    region.region.name,
+                    "ecs-describe-tasks",
+                    urllib.parse.quote_plus(clusterArn),
+                    urllib.parse.quote_plus(taskArn),
+                ),
             )
-            task = json.load(open(task_path))
             for task in task["tasks"]:
-                tasks.append(task)
+                # Copied, as the nodes add their IPs to it
+                tasks.append(copy.deepcopy(task))
     return tasks
 
 
 def get_lambda_functions(region):
     functions = query_aws(region.account, "lambda-list-functions", region.region)
-    return pyjq.all(".Functions[]?|select(.VpcConfig!=null)", functions)
+    return jq.all(".Functions[]?|select(.VpcConfig!=null)", functions)
 
 
 def get_redshift(region):
     clusters = query_aws(region.account, "redshift-describe-clusters", region.region)
-    return pyjq.all(".Clusters[]?", clusters)
+    return jq.all(".Clusters[]?", clusters)
 
 
 def get_elasticsearch(region):
     es_domains = []
     domain_json = query_aws(region.account, "es-list-domain-names", region.region)
-    domains = pyjq.all(".DomainNames[]?", domain_json)
+    domains = jq.all(".DomainNames[]?", domain_json)
     for domain in domains:
         es = get_parameter_file(
             region, "es", "describe-elasticsearch-domain", domain["DomainName"]
@@ -173,10 +182,7 @@ def get_elasticsearch(region):
 
 
 def get_sgs(vpc):
-    sgs = query_aws(vpc.account, "ec2-describe-security-groups", vpc.region)
-    return pyjq.all(
-        '.SecurityGroups[]? | select(.VpcId == "{}")'.format(vpc.local_id), sgs
-    )
+    return vpc.region.index.get_vpc_security_groups(vpc.local_id)
 
 
 def get_external_cidrs(account, config):
@@ -188,8 +194,8 @@ def get_external_cidrs(account, config):
 
             # Get external IPs
             for sg in sgs:
-                cidrs = pyjq.all(".IpPermissions[].IpRanges[].CidrIp", sg)
-                for cidr in cidrs:
+                rules = region.index.get_security_group_rules(sg["GroupId"])
+                for cidr, _ in rules["ip_ranges"]:
                     unique_cidrs[cidr] = 1
 
     # Remove private CIDR ranges
@@ -204,31 +210,108 @@ def get_cidr_name(cidr, config):
     return config["cidrs"].get(cidr, {}).get("name", None)
 
 
-def add_connection(connections, source, target, reason):
-    reasons = connections.get(Connection(source, target), [])
-    reasons.append(reason)
-    connections[Connection(source, target)] = reasons
+def get_connections_input(vpc):
+    """
+    Returns what find_connections needs to find the connections of a VPC, as lists, dicts
+    and strings that are quick to send to another process: the leaves of the VPC and its
+    peers, the security groups of the leaves of the VPC and the rules of those groups.
+    Leaves and security groups are given by their position in the lists of leaf nodes and
+    security groups also returned, to get the nodes back from the connections found.
+    """
+    leaf_nodes = []
+    leaves = []
+    positions = {}
+
+    def get_positions(source_vpc):
+        source_positions = []
+        for leaf in source_vpc.leaves:
+            if id(leaf) not in positions:
+                positions[id(leaf)] = len(leaf_nodes)
+                leaf_nodes.append(leaf)
+                leaves.append(
+                    {
+                        "arn": leaf.arn,
+                        "ips": leaf.ips,
+                        "node_type": leaf.node_type,
+                        "has_unrestricted_ingress": leaf.has_unrestricted_ingress,
+                        "can_egress": leaf.can_egress,
+                    }
+                )
+            source_positions.append(positions[id(leaf)])
+        return source_positions
+
+    vpc_leaves = get_positions(vpc)
+
+    # Get mapping of security group names to the leaves that have that security group
+    sg_to_instance_mapping = {}
+    for position in vpc_leaves:
+        for sg in leaf_nodes[position].security_groups:
+            sg_to_instance_mapping.setdefault(sg, {})[position] = True
+    for instances in sg_to_instance_mapping.values():
+        for position in instances:
+            leaves[position]["is_public"] = leaf_nodes[position].is_public
+
+    sgs = get_sgs(vpc)
+    connections_input = {
+        "leaves": leaves,
+        "vpc": (vpc.cidr, vpc_leaves),
+        "peers": [(peer.cidr, get_positions(peer)) for peer in vpc.peers],
+        "security_groups": {
+            sg: list(instances) for sg, instances in sg_to_instance_mapping.items()
+        },
+        "rules": [],
+    }
+    for sg in sgs:
+        rules = vpc.region.index.get_security_group_rules(sg["GroupId"])
+        connections_input["rules"].append(
+            (
+                sg["GroupId"],
+                [cidr for cidr, _ in rules["ip_ranges"]],
+                rules["ingress_groups"],
+            )
+        )
+    return connections_input, leaf_nodes, sgs
 
 
-def get_connections(cidrs, vpc, outputfilter):
+def find_connections(connections_input, outputfilter):
     """
     For a VPC, for each instance, find all of the other instances that can connect to it,
     including those in peered VPCs.
     Note I do not consider subnet ACLs, routing tables, or some other network concepts.
+
+    Takes the input from get_connections_input, and can be run in another process.
+    Returns the connections as a list of (source, target, reasons), where the source is
+    the position of a leaf or an external CIDR, the target the position of a leaf and
+    the reasons the positions of security groups, or None for Gateway endpoints; along
+    with the list of external CIDRs that were used.
     """
+    leaves = connections_input["leaves"]
+    vpc_leaves = connections_input["vpc"][1]
+    source_vpcs = connections_input["peers"] + [connections_input["vpc"]]
+    sg_to_instance_mapping = connections_input["security_groups"]
+
+    # Reasons by source and target ARN, as nodes with the same ARN have one connection
     connections = {}
+    used_cidrs = set()
 
-    # Get mapping of security group names to nodes that have that security group
-    sg_to_instance_mapping = {}
-    for instance in vpc.leaves:
-        for sg in instance.security_groups:
-            sg_to_instance_mapping.setdefault(sg, {})[instance] = True
+    def add_connection(source, target, reason):
+        if isinstance(source, int):
+            key = (leaves[source]["arn"], leaves[target]["arn"])
+        else:
+            key = (source, leaves[target]["arn"])
+        connection = connections.get(key)
+        if connection is None:
+            connection = connections[key] = (source, target, [])
+        connection[2].append(reason)
+
+    # IPs of the leaves of this VPC and its peers, built when a CIDR is first checked
+    ip_indexes = {}
 
     # For each security group, find all the instances that are allowed to connect to instances
     # within that group.
-    for sg in get_sgs(vpc):
+    for sg, (group_id, cidrs, ingress_sgs) in enumerate(connections_input["rules"]):
         # Get the CIDRs that are allowed to connect
-        for cidr in pyjq.all(".IpPermissions[].IpRanges[].CidrIp", sg):
+        for cidr in cidrs:
             if not is_external_cidr(cidr):
                 # This is a private IP, ex. 10.0.0.0/16
 
@@ -237,119 +320,154 @@ def get_connections(cidrs, vpc, outputfilter):
                     continue
 
                 # Find all instances in this VPC and peered VPCs that are in this CIDR
-                for sourceVpc in itertools.chain(vpc.peers, (vpc,)):
+                for source_vpc, (source_vpc_cidr, source_leaves) in enumerate(
+                    source_vpcs
+                ):
 
                     # Ensure it is possible for instances in this VPC to be in the CIDR
-                    if not (
-                        IPNetwork(sourceVpc.cidr) in IPNetwork(cidr)
-                        or IPNetwork(cidr) in IPNetwork(sourceVpc.cidr)
-                    ):
+                    if not is_cidr_nested(source_vpc_cidr, cidr):
                         # The CIDR from the security group does not overlap with the CIDR of the VPC,
                         # so skip it
                         continue
 
-                    # For each instance, check if one of its IPs is within the CIDR
-                    for sourceInstance in sourceVpc.leaves:
-                        for ip in sourceInstance.ips:
-                            if IPAddress(ip) in IPNetwork(cidr):
-                                # Instance found that can connect to instances in the SG
-                                # So connect this instance (sourceInstance) to every instance
-                                # in the SG.
-                                for targetInstance in sg_to_instance_mapping.get(
-                                    sg["GroupId"], {}
-                                ):
-                                    add_connection(
-                                        connections, sourceInstance, targetInstance, sg
-                                    )
+                    if source_vpc not in ip_indexes:
+                        ip_indexes[source_vpc] = IpIndex(
+                            source_leaves, lambda leaf: leaves[leaf]["ips"]
+                        )
+
+                    # For each instance with an IP within the CIDR, once for each such IP
+                    for sourceInstance in ip_indexes[source_vpc].find(cidr):
+                        # Instance found that can connect to instances in the SG
+                        # So connect this instance (sourceInstance) to every instance
+                        # in the SG.
+                        for targetInstance in sg_to_instance_mapping.get(group_id, []):
+                            add_connection(sourceInstance, targetInstance, sg)
 
             else:
                 # This is an external IP (ie. not in a private range).
-                for instance in sg_to_instance_mapping.get(sg["GroupId"], {}):
+                for instance in sg_to_instance_mapping.get(group_id, []):
                     # Ensure it has a public IP, as resources with only private IPs can't be reached
-                    if instance.is_public:
-                        cidrs[cidr].is_used = True
-                        add_connection(connections, cidrs[cidr], instance, sg)
+                    if leaves[instance]["is_public"]:
+                        used_cidrs.add(cidr)
+                        add_connection(cidr, instance, sg)
                     else:
                         if cidr == "0.0.0.0/0":
                             # Resource is not public, but allows anything to access it,
                             # so mark set all the resources in the VPC as allowing access to it.
-                            for source_instance in vpc.leaves:
-                                add_connection(
-                                    connections, source_instance, instance, sg
-                                )
+                            for source_instance in vpc_leaves:
+                                add_connection(source_instance, instance, sg)
 
         if outputfilter.get("internal_edges", True):
             # Connect allowed in Security Groups
-            for ingress_sg in pyjq.all(
-                ".IpPermissions[].UserIdGroupPairs[].GroupId", sg
-            ):
+            for ingress_sg in ingress_sgs:
                 # We have an SG and a list of SG's it allows in
-                for target in sg_to_instance_mapping.get(sg["GroupId"], {}):
+                for target in sg_to_instance_mapping.get(group_id, []):
                     # We have an instance and a list of SG's it allows in
-                    for source in sg_to_instance_mapping.get(ingress_sg, {}):
+                    for source in sg_to_instance_mapping.get(ingress_sg, []):
                         if (
                             not outputfilter.get("inter_rds_edges", True)
-                            and (
-                                source.node_type == "rds"
-                                or source.node_type == "rds_rr"
-                            )
-                            and (
-                                target.node_type == "rds"
-                                or target.node_type == "rds_rr"
-                            )
+                            and leaves[source]["node_type"] in ("rds", "rds_rr")
+                            and leaves[target]["node_type"] in ("rds", "rds_rr")
                         ):
                             continue
-                        add_connection(connections, source, target, sg)
+                        add_connection(source, target, sg)
 
     # Connect everything to the Gateway endpoints
-    for targetResource in vpc.leaves:
-        if targetResource.has_unrestricted_ingress:
-            for sourceVpc in itertools.chain(vpc.peers, (vpc,)):
-                for sourceResource in sourceVpc.leaves:
-                    add_connection(connections, sourceResource, targetResource, [])
+    for targetResource in vpc_leaves:
+        if leaves[targetResource]["has_unrestricted_ingress"]:
+            for _, source_leaves in source_vpcs:
+                for sourceResource in source_leaves:
+                    add_connection(sourceResource, targetResource, None)
 
     # Remove connections for source nodes that cannot initiate traffic (ex. VPC endpoints)
-    for connection in list(connections):
-        if not connection.source.can_egress:
-            del connections[connection]
+    found = [
+        connection
+        for connection in connections.values()
+        if not isinstance(connection[0], int) or leaves[connection[0]]["can_egress"]
+    ]
+    return found, sorted(used_cidrs)
+
 
+def get_found_connections(cidrs, found_connections, leaf_nodes, sgs):
+    """
+    Returns the connections found by find_connections, by Connection, with the nodes and
+    security groups they refer to, and marks the external CIDRs used
+    """
+    found, used_cidrs = found_connections
+    for cidr in used_cidrs:
+        cidrs[cidr].is_used = True
+
+    connections = {}
+    for source, target, reasons in found:
+        if isinstance(source, int):
+            source = leaf_nodes[source]
+        else:
+            source = cidrs[source]
+        connections[Connection(source, leaf_nodes[target])] = [
+            [] if reason is None else sgs[reason] for reason in reasons
+        ]
     return connections
 
 
-def add_node_to_subnets(region, node, nodes):
+def get_connections(cidrs, vpc, outputfilter):
+    """
+    For a VPC, for each instance, find all of the other instances that can connect to it,
+    including those in peered VPCs.
+    """
+    connections_input, leaf_nodes, sgs = get_connections_input(vpc)
+    return get_found_connections(
+        cidrs, find_connections(connections_input, outputfilter), leaf_nodes, sgs
+    )
+
+
+def get_subnets_by_id(region):
+    """
+    Returns the subnet nodes of the region by id, as lists of (position, subnet), the
+    position being the order of the subnet in the tree
+    """
+    subnets_by_id = {}
+    position = 0
+    for vpc in region.children:
+        for az in vpc.children:
+            for subnet in az.children:
+                subnets_by_id.setdefault(subnet.local_id, []).append((position, subnet))
+                position += 1
+    return subnets_by_id
+
+
+def add_node_to_subnets(region, node, nodes, subnets_by_id):
     """
     Given a node, find all the subnets it thinks it belongs to,
-    and duplicate it and add it a child of those subnets
+    and add a placement of it as a child of each of those subnets
     """
 
     # Remove node from dictionary
     del nodes[node.arn]
 
-    # Add a new node (potentially the same one) back to the dictionary
-    for vpc in region.children:
-        if (
-            len(node.subnets) == 0
-            and node._parent
-            and vpc.local_id == node._parent.local_id
-        ):
-            # VPC Gateway Endpoints (S3 and DynamoDB) reside in a VPC, not a subnet
-            # So set the relationship between the VPC and the node
-            nodes[node.arn] = node
-            vpc.addChild(node)
-            break
+    node_subnets = node.subnets
+    if len(node_subnets) == 0:
+        if node._parent:
+            vpc = region.get_child(node._parent.local_id)
+            if vpc is not None:
+                # VPC Gateway Endpoints (S3 and DynamoDB) reside in a VPC, not a subnet
+                # So set the relationship between the VPC and the node
+                nodes[node.arn] = node
+                vpc.addChild(node)
+        return
 
-        for az in vpc.children:
-            for subnet in az.children:
-                for node_subnet in node.subnets:
-                    if node_subnet == subnet.local_id:
-                        # Copy the node
-                        subnet_node = copy.copy(node)
-                        # Set the subnet name on the copy, and potentially a new arn
-                        subnet_node.set_subnet(subnet)
+    subnets = []
+    for node_subnet in node_subnets:
+        subnets.extend(subnets_by_id.get(node_subnet, []))
+    subnets.sort(key=lambda subnet: subnet[0])
 
-                        # Add to the set
-                        nodes[subnet_node.arn] = subnet_node
-                        subnet.addChild(subnet_node)
+    # Add the node back to the dictionary for each subnet it is placed in, which
+    # can change its arn
+    for _, subnet in subnets:
+        subnet_node = Placement(node, subnet)
+
+        # Add to the set
+        nodes[subnet_node.arn] = subnet_node
+        subnet.addChild(subnet_node)
 
 
 def get_resource_nodes(region, outputfilter):
@@ -408,8 +526,66 @@ def get_resource_nodes(region, outputfilter):
     return nodes
 
 
+class Timings(object):
+    """Time spent in each phase of build_data_structure, summed over the regions"""
+
+    def __init__(self):
+        self._phases = {}
+        self._start = time.perf_counter()
+
+    def lap(self, phase):
+        """Adds the time since the previous lap to the phase"""
+        now = time.perf_counter()
+        self._phases[phase] = self._phases.get(phase, 0) + now - self._start
+        self._start = now
+
+    def log(self):
+        for phase, seconds in self._phases.items():
+            log("- {}: {:.3f}s".format(phase, seconds))
+
+
+def prune_region(region, outputfilter):
+    """
+    Returns the cytoscape data of the region and of the VPCs, AZs, subnets and leaves
+    below it, and removes the VPCs, AZs and subnets without leaves, in a single walk of
+    the tree, as the nodes keep the count of their leaves
+    """
+    cytoscape_json = []
+    if not region.has_leaves:
+        return cytoscape_json
+    cytoscape_json.append(region.cytoscape_data())
+
+    for vpc in list(region.children):
+        if not vpc.has_leaves:
+            region.removeChild(vpc)
+            continue
+        cytoscape_json.append(vpc.cytoscape_data())
+
+        for vpc_child in list(vpc.children):
+            if not vpc_child.has_leaves:
+                vpc.removeChild(vpc_child)
+                continue
+            if outputfilter.get("azs", False):
+                cytoscape_json.append(vpc_child.cytoscape_data())
+            elif vpc_child.node_type != "az":
+                # Add VPC children that are not AZs, such as Gateway endpoints
+                cytoscape_json.append(vpc_child.cytoscape_data())
+
+            for subnet in list(vpc_child.children):
+                if not subnet.has_leaves:
+                    vpc_child.removeChild(subnet)
+                    continue
+                cytoscape_json.append(subnet.cytoscape_data())
+
+                # The children of subnets are all leaves
+                for leaf in subnet.children:
+                    cytoscape_json.append(leaf.cytoscape_data(subnet.arn))
+    return cytoscape_json
+
+
 def build_data_structure(account_data, config, outputfilter):
     cytoscape_json = []
+    timings = Timings()
 
     if outputfilter.get("mute", False):
         global MUTE
@@ -445,30 +621,34 @@ def build_data_structure(account_data, config, outputfilter):
                 vpc.addChild(az)
             region.addChild(vpc)
         account.addChild(region)
+        timings.lap("Building the tree")
 
         # In each region, iterate through all the resource types
         nodes = get_resource_nodes(region, outputfilter)
+        timings.lap("Building the resource nodes")
 
         # Filter out nodes based on tags
         if len(outputfilter.get("tags", [])) > 0:
+            # Ex. --tags Env=Prod --tags Team=Dev,Name=Bastion
+            tag_sets = [
+                [c.split("=") for c in tag_set.split(",")]
+                for tag_set in outputfilter.get("tags", [])
+            ]
             for node_id in list(nodes):
                 has_match = False
                 node = nodes[node_id]
+                # The values of the tags of the node by key, to look up each condition
+                tags = {}
+                for tag in node.tags or []:
+                    tags[tag.get("Key", "")] = tag.get("Value", "")
                 # For each node, look to see if its tags match one of the tag sets
-                # Ex. --tags Env=Prod --tags Team=Dev,Name=Bastion
-                for tag_set in outputfilter.get("tags", []):
-                    conditions = [c.split("=") for c in tag_set.split(",")]
+                for conditions in tag_sets:
                     condition_matches = 0
                     # For a tag set, see if all conditions match, ex. [["Team","Dev"],["Name","Bastion"]]
                     for pair in conditions:
                         # Given ["Team","Dev"], see if it matches one of the tags in the node
-                        if node.tags:
-                            for tag in node.tags:
-                                if (
-                                    tag.get("Key", "") == pair[0]
-                                    and tag.get("Value", "") == pair[1]
-                                ):
-                                    condition_matches += 1
+                        if pair[0] in tags and tags[pair[0]] == pair[1]:
+                            condition_matches += 1
                     # We have a match if all of the conditions matched
                     if condition_matches == len(conditions):
                         has_match = True
@@ -476,52 +656,19 @@ def build_data_structure(account_data, config, outputfilter):
                 # If there were no matches, remove the node
                 if not has_match:
                     del nodes[node_id]
+            timings.lap("Filtering by tags")
 
         # Add the nodes to their respective subnets
+        subnets_by_id = get_subnets_by_id(region)
         for node_arn in list(nodes):
             node = nodes[node_arn]
-            add_node_to_subnets(region, node, nodes)
+            add_node_to_subnets(region, node, nodes, subnets_by_id)
+        timings.lap("Adding the nodes to their subnets")
 
         # From the root of the tree (the account), add in the children if there are leaves
-        # If not, mark the item for removal
-        if region.has_leaves:
-            cytoscape_json.append(region.cytoscape_data())
-
-            region_children_to_remove = set()
-            for vpc in region.children:
-                if vpc.has_leaves:
-                    cytoscape_json.append(vpc.cytoscape_data())
-
-                    vpc_children_to_remove = set()
-                    for vpc_child in vpc.children:
-                        if vpc_child.has_leaves:
-                            if outputfilter.get("azs", False):
-                                cytoscape_json.append(vpc_child.cytoscape_data())
-                            elif vpc_child.node_type != "az":
-                                # Add VPC children that are not AZs, such as Gateway endpoints
-                                cytoscape_json.append(vpc_child.cytoscape_data())
-
-                            az_children_to_remove = set()
-                            for subnet in vpc_child.children:
-                                if subnet.has_leaves:
-                                    cytoscape_json.append(subnet.cytoscape_data())
-
-                                    for leaf in subnet.leaves:
-                                        cytoscape_json.append(
-                                            leaf.cytoscape_data(subnet.arn)
-                                        )
-                                else:
-                                    az_children_to_remove.add(subnet)
-                            for subnet in az_children_to_remove:
-                                vpc_child.removeChild(subnet)
-                        else:
-                            vpc_children_to_remove.add(vpc_child)
-                    for az in vpc_children_to_remove:
-                        vpc.removeChild(az)
-                else:
-                    region_children_to_remove.add(vpc)
-            for vpc in region_children_to_remove:
-                region.removeChild(vpc)
+        # If not, remove them
+        cytoscape_json.extend(prune_region(region, outputfilter))
+        timings.lap("Pruning the tree")
 
         log("- {} nodes built in region {}".format(len(nodes), region.local_id))
 
@@ -542,21 +689,47 @@ def build_data_structure(account_data, config, outputfilter):
             if accepter and requester:
                 accepter.addPeer(requester)
                 requester.addPeer(accepter)
+    timings.lap("Finding the VPC peerings")
 
     # Get external cidr nodes
     cidrs = {}
     for cidr in get_external_cidrs(account, config):
         cidrs[cidr.arn] = cidr
+    timings.lap("Finding the external CIDRs")
 
     # Find connections between nodes
     # Only looking at Security Groups currently, which are a VPC level construct
+    vpcs_input = [
+        get_connections_input(vpc)
+        for region in account.children
+        for vpc in region.children
+    ]
+    connections_inputs = [connections_input for connections_input, _, _ in vpcs_input]
+    workers = outputfilter.get("workers", 1)
+    if workers > 1:
+        # The VPCs are independent, so find their connections in separate processes,
+        # then merge them in the order of the VPCs as when done one after the other
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            vpcs_found = list(
+                executor.map(
+                    find_connections,
+                    connections_inputs,
+                    [outputfilter] * len(connections_inputs),
+                )
+            )
+    else:
+        vpcs_found = [
+            find_connections(connections_input, outputfilter)
+            for connections_input in connections_inputs
+        ]
+
     connections = {}
-    for region in account.children:
-        for vpc in region.children:
-            for c, reasons in get_connections(cidrs, vpc, outputfilter).items():
-                r = connections.get(c, [])
-                r.extend(reasons)
-                connections[c] = r
+    for (_, leaf_nodes, sgs), found in zip(vpcs_input, vpcs_found):
+        for c, reasons in get_found_connections(cidrs, found, leaf_nodes, sgs).items():
+            r = connections.get(c, [])
+            r.extend(reasons)
+            connections[c] = r
+    timings.lap("Finding the connections")
 
     #
     # Collapse CIDRs
@@ -567,23 +740,21 @@ def build_data_structure(account_data, config, outputfilter):
     for cidr_string in cidrs:
         current_cidrs.append(cidr_string)
 
+    named_cidrs = CidrTrie(config["cidrs"])
+
+    # Connections from CIDRs, by CIDR, in the order of connections
+    connections_by_cidr = {}
+    for c in connections:
+        if c.source.node_type == "ip":
+            connections_by_cidr.setdefault(c.source.arn, []).append(c)
+
     # Iterate through them
     for cidr_string in current_cidrs:
-        # Find CIDRs in the config that our CIDR falls inside
-        # It may fall inside multiple ranges
-        matching_known_cidrs = {}
-        for named_cidr in config["cidrs"]:
-            if IPNetwork(cidr_string) in IPNetwork(named_cidr):
-                # Match found
-                matching_known_cidrs[named_cidr] = IPNetwork(named_cidr).size
-
-        if len(matching_known_cidrs) > 0:
-            # A match was found. Find the smallest matching range.
-            sorted_matches = sorted(
-                matching_known_cidrs.items(), key=operator.itemgetter(1)
-            )
-            # Get first item to get (CIDR,size); and first item of that to get just the CIDR
-            smallest_matched_cidr_string = sorted_matches[0][0]
+        # Find the smallest of the CIDRs in the config that our CIDR falls inside,
+        # as it may fall inside multiple ranges
+        smallest_matched_cidr_string = named_cidrs.find_smallest(cidr_string)
+
+        if smallest_matched_cidr_string is not None:
             smallest_matched_cidr_name = config["cidrs"][smallest_matched_cidr_string][
                 "name"
             ]
@@ -606,17 +777,19 @@ def build_data_structure(account_data, config, outputfilter):
                 new_source = cidrs[smallest_matched_cidr_string]
                 new_source.is_used = True
 
-                # Find all the connections to the old node
-                connections_to_remove = []
-                for c in connections:
-                    if c.source.node_type == "ip" and c.source.arn == cidr_string:
-                        connections_to_remove.append(c)
-
-                # Create new connections to the new node
-                for c in connections_to_remove:
-                    r = connections[c]
-                    del connections[c]
-                    connections[Connection(new_source, c._target)] = r
+                # Replace the connections to the old node with connections to the new node
+                for c in connections_by_cidr.pop(cidr_string, []):
+                    r = connections.pop(c)
+                    new_connection = Connection(new_source, c._target)
+                    if (
+                        new_source.node_type == "ip"
+                        and new_connection not in connections
+                    ):
+                        connections_by_cidr.setdefault(new_source.arn, []).append(
+                            new_connection
+                        )
+                    connections[new_connection] = r
+    timings.lap("Collapsing the CIDRs")
 
     # Add external cidr nodes
     used_cidrs = 0
@@ -636,6 +809,19 @@ def build_data_structure(account_data, config, outputfilter):
         c._json = reasons
         cytoscape_json.append(c.cytoscape_data())
     log("- {} connections built".format(len(connections)))
+    timings.lap("Adding the CIDRs and connections")
+    if outputfilter.get("timings", False):
+        timings.log()
+        cache_stats = get_cache_stats()
+        log(
+            "- Cache of account-data: {} hits, {} misses, {} evictions, {} files of {:.1f} MB kept".format(
+                cache_stats["hits"],
+                cache_stats["misses"],
+                cache_stats["evictions"],
+                cache_stats["files"],
+                cache_stats["bytes"] / 1024 / 1024,
+            )
+        )
 
     # Check if we have a lot of data, and if so, show a warning
     # Numbers chosen here are arbitrary
@@ -792,6 +978,17 @@ def run(arguments):
         dest="node_data",
         action="store_false",
     )
+    parser.add_argument(
+        "--workers",
+        help="Number of processes to find the connections of VPCs with (default 1)",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--timings",
+        help="Print the time taken by each step of building the diagram, and the use of the cache of account-data",
+        action="store_true",
+    )
     parser.set_defaults(internal_edges=True)
     parser.set_defaults(inter_rds_edges=False)
     parser.set_defaults(read_replicas=True)
@@ -825,6 +1022,8 @@ def run(arguments):
     outputfilter["collapse_by_tag"] = args.collapse_by_tag
     outputfilter["collapse_asgs"] = args.collapse_asgs
     outputfilter["node_data"] = args.node_data
+    outputfilter["workers"] = args.workers
+    outputfilter["timings"] = args.timings
 
     # Read accounts file
     try:
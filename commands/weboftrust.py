@@ -1,5 +1,4 @@
 import argparse
-from os import path, listdir
 import json
 import yaml
 import pyjq
@@ -12,6 +11,7 @@ from shared.common import (
     get_regions,
     get_account_by_id,
 )
+from shared.query import get_account_file, has_account_file, list_account_files
 
 __description__ = "Create Web Of Trust diagram for accounts"
 
@@ -356,16 +356,14 @@ def get_iam_trusts(account, nodes, connections, connections_to_get):
 
 
 def get_s3_trusts(account, nodes, connections):
-    policy_dir = "./account-data/{}/us-east-1/s3-get-bucket-policy/".format(
-        account.name
-    )
-    for s3_policy_file in [
-        f
-        for f in listdir(policy_dir)
-        if path.isfile(path.join(policy_dir, f))
-        and path.getsize(path.join(policy_dir, f)) > 4
-    ]:
-        s3_policy = json.load(open(path.join(policy_dir, s3_policy_file)))
+    policy_dir = "us-east-1/s3-get-bucket-policy"
+    for s3_policy_file in list_account_files(account.name, policy_dir):
+        # Files of 4 bytes or fewer, such as {}, have no policy
+        s3_policy = get_account_file(
+            account.name, "{}/{}".format(policy_dir, s3_policy_file), min_size=5
+        )
+        if s3_policy is None:
+            continue
         s3_policy = json.loads(s3_policy["Policy"])
         s3_bucket_name = urllib.parse.unquote_plus(s3_policy_file)
         for s in s3_policy["Statement"]:
@@ -451,10 +449,8 @@ def weboftrust(args, accounts, config):
     connections = {}
     for account in accounts:
         # Check if the account data exists
-        if not path.exists(
-            "./account-data/{}/us-east-1/iam-get-account-authorization-details.json".format(
-                account["name"]
-            )
+        if not has_account_file(
+            account["name"], "us-east-1/iam-get-account-authorization-details.json"
         ):
             print("INFO: Skipping account {}".format(account["name"]))
             continue
@@ -7,22 +7,22 @@ import re
 import pkgutil
 import importlib
 import inspect
+from itertools import compress
 
 from logging import CRITICAL
 from logging import getLogger
 from policyuniverse.policy import Policy
 
 from netaddr import IPNetwork
+from shared.cidr import classify_cidrs, is_cidr_nested
 from shared.common import (
     make_list,
     get_regions,
-    is_unblockable_cidr,
-    is_external_cidr,
     Finding,
     get_collection_date,
     days_between,
 )
-from shared.query import query_aws, get_parameter_file
+from shared.query import query_aws, get_parameter_file, get_account_file
 from shared.nodes import Account, Region, get_name
 from shared.iam_audit import find_admins_in_account
 
@@ -563,8 +563,10 @@ def audit_route53(findings, region):
             vpc_json,
         )
         for vpc in vpcs:
-            hosted_zone_file = f"account-data/{region.account.name}/{region.name}/route53-list-hosted-zones-by-vpc/{region_name}/{vpc}"
-            hosted_zones_json = json.load(open(hosted_zone_file))
+            hosted_zones_json = get_account_file(
+                region.account.name,
+                f"{region.name}/route53-list-hosted-zones-by-vpc/{region_name}/{vpc}",
+            )
             hosted_zones = pyjq.all(".HostedZoneSummaries[]?", hosted_zones_json)
             for hosted_zone in hosted_zones:
                 if hosted_zone.get("Owner", {}).get("OwningAccount", "") != "":
@@ -895,17 +897,29 @@ def audit_sg(findings, region):
     # TODO Check if an SG restricts IPv4 and then opens IPv6 or vice versa.
 
     cidrs = {}
-    sg_json = query_aws(region.account, "ec2-describe-security-groups", region)
-    sgs = pyjq.all(".SecurityGroups[]?", sg_json)
+    sgs = region.index.get_security_groups()
+
+    # Classify every CIDR of the region at once
+    sg_cidrs = set()
     for sg in sgs:
-        cidr_and_name_list = pyjq.all(
-            ".IpPermissions[]?.IpRanges[]|[.CidrIp,.Description]", sg
-        )
+        for cidr, _ in region.index.get_security_group_rules(sg["GroupId"])[
+            "ip_ranges"
+        ]:
+            sg_cidrs.add(cidr)
+    sg_cidrs = sorted(sg_cidrs - set([None]))
+    classification = classify_cidrs(sg_cidrs)
+    external_cidrs = set(compress(sg_cidrs, classification["public"]))
+    unblockable_cidrs = set(compress(sg_cidrs, classification["unblockable"]))
+
+    for sg in sgs:
+        cidr_and_name_list = region.index.get_security_group_rules(sg["GroupId"])[
+            "ip_ranges"
+        ]
         for cidr, name in cidr_and_name_list:
-            if not is_external_cidr(cidr):
+            if cidr not in external_cidrs:
                 continue
 
-            if is_unblockable_cidr(cidr):
+            if cidr in unblockable_cidrs:
                 findings.add(
                     Finding(
                         region,
@@ -940,9 +954,7 @@ def audit_sg(findings, region):
                     continue
                 cidr = ip_ranges["CidrIp"]
                 for cidr_seen in cidrs_seen:
-                    if IPNetwork(cidr_seen) in IPNetwork(cidr) or IPNetwork(
-                        cidr
-                    ) in IPNetwork(cidr_seen):
+                    if is_cidr_nested(cidr_seen, cidr):
                         findings.add(
                             Finding(
                                 region,
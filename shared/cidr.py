@@ -0,0 +1,203 @@
+"""
+IP addresses and CIDRs as integers, to compare them without building netaddr objects for
+each comparison.
+"""
+import bisect
+import functools
+import re
+
+from netaddr import IPAddress, IPNetwork
+
+PRIVATE_CIDRS = ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"]
+
+RESERVED_CIDRS = [
+    "169.254.0.0/16",  # link local
+    "127.0.0.0/8",  # loopback
+    "192.0.2.0/24",  # Test network from RFC 5737
+    "198.51.100.0/24",  # Test network
+    "203.0.113.0/24",  # Test network
+    "224.0.0.0/4",  # class D multicast
+    "240.0.0.0/5",  # class E reserved
+    "248.0.0.0/5",  # reserved
+    "255.255.255.255/32",  # broadcast
+]
+
+# IPv4 addresses and CIDRs written as AWS returns them, which are parsed without netaddr
+_IPV4_CIDR = re.compile(
+    r"^(0|[1-9][0-9]{0,2})\.(0|[1-9][0-9]{0,2})\.(0|[1-9][0-9]{0,2})\.(0|[1-9][0-9]{0,2})(?:/(0|[1-9][0-9]?))?$"
+)
+
+
+@functools.lru_cache(maxsize=65536)
+def get_cidr_range(cidr):
+    """
+    Returns the IP version of the CIDR, or IP, and its first and last addresses as
+    integers
+    """
+    match = _IPV4_CIDR.match(cidr)
+    if match is not None:
+        octets = [int(octet) for octet in match.groups()[:4]]
+        prefix = int(match.group(5) or 32)
+        if max(octets) <= 255 and prefix <= 32:
+            value = (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+            host_mask = (1 << (32 - prefix)) - 1
+            return 4, value & ~host_mask, value | host_mask
+    network = IPNetwork(cidr)
+    return network.version, network.first, network.last
+
+
+_PRIVATE_RANGES = [get_cidr_range(cidr) for cidr in PRIVATE_CIDRS]
+_RESERVED_RANGES = [get_cidr_range(cidr) for cidr in RESERVED_CIDRS]
+
+
+def _is_in_ranges(cidr, ranges):
+    version, first, last = get_cidr_range(cidr)
+    for range_version, range_first, range_last in ranges:
+        if version == range_version and range_first <= first and last <= range_last:
+            return True
+    return False
+
+
+def is_private_cidr(cidr):
+    """Returns True if the CIDR, or IP, is within a private range, such as 10.0.0.0/8"""
+    return _is_in_ranges(cidr, _PRIVATE_RANGES)
+
+
+def is_reserved_cidr(cidr):
+    """
+    Returns True if the CIDR, or IP, is within a reserved range, such as 127.0.0.0/8,
+    which security groups have no need to allow
+    """
+    return _is_in_ranges(cidr, _RESERVED_RANGES)
+
+
+def classify_cidrs(cidrs):
+    """
+    Returns numpy arrays of booleans telling for each of the CIDRs, or IPs, whether it is
+    "public", "private" or "unblockable", being in a reserved range, computed for all of
+    them at once
+    """
+    import numpy
+
+    ranges = [get_cidr_range(cidr) for cidr in cidrs]
+    ipv4 = numpy.array([version == 4 for version, _, _ in ranges], dtype=bool)
+    # IPv6 addresses don't fit in 64 bits, and are in none of the ranges
+    first = numpy.array(
+        [first if version == 4 else 0 for version, first, _ in ranges],
+        dtype=numpy.uint64,
+    )
+    last = numpy.array(
+        [last if version == 4 else 0 for version, _, last in ranges],
+        dtype=numpy.uint64,
+    )
+
+    def in_ranges(ranges):
+        mask = numpy.zeros(len(cidrs), dtype=bool)
+        for _, range_first, range_last in ranges:
+            mask |= (first >= range_first) & (last <= range_last)
+        return mask & ipv4
+
+    private = in_ranges(_PRIVATE_RANGES)
+    return {
+        "public": ~private,
+        "private": private,
+        "unblockable": in_ranges(_RESERVED_RANGES),
+    }
+
+
+def is_cidr_nested(cidr, other_cidr):
+    """Returns True if either CIDR contains the other, as netaddr's `in` does"""
+    version, first, last = get_cidr_range(cidr)
+    other_version, other_first, other_last = get_cidr_range(other_cidr)
+    if version != other_version:
+        return False
+    return (first <= other_first and other_last <= last) or (
+        other_first <= first and last <= other_last
+    )
+
+
+class IpIndex(object):
+    """
+    The IPs of items, such as the leaves of a VPC, sorted so the items with an IP in a
+    CIDR are found by binary search rather than by comparing each IP
+    """
+
+    def __init__(self, items, get_ips):
+        addresses = {}
+        position = 0
+        for item in items:
+            for ip in get_ips(item):
+                address = IPAddress(ip)
+                addresses.setdefault(address.version, []).append(
+                    (address.value, position, item)
+                )
+                position += 1
+
+        # For each IP version, the sorted IPs and the (position, item) of each
+        self._addresses = {}
+        for version, version_addresses in addresses.items():
+            version_addresses.sort(key=lambda address: address[:2])
+            self._addresses[version] = (
+                [value for value, _, _ in version_addresses],
+                [(position, item) for _, position, item in version_addresses],
+            )
+
+    def find(self, cidr):
+        """
+        Returns the items with an IP in the CIDR, once for each of those IPs, in the
+        order of the items and of their IPs
+        """
+        version, first, last = get_cidr_range(cidr)
+        if version not in self._addresses:
+            return []
+        values, items = self._addresses[version]
+        start = bisect.bisect_left(values, first)
+        end = bisect.bisect_right(values, last, start)
+        return [item for _, item in sorted(items[start:end], key=lambda item: item[0])]
+
+
+class CidrTrie(object):
+    """
+    Binary trie of CIDRs by the bits of their prefix, to find the smallest of them
+    containing a CIDR by walking the bits of its prefix
+    """
+
+    def __init__(self, cidrs=()):
+        # For each IP version, the root node, each node being [zero, one, cidr]
+        self._roots = {}
+        for cidr in cidrs:
+            self.add(cidr)
+
+    @staticmethod
+    def _get_prefix(cidr):
+        version, first, last = get_cidr_range(cidr)
+        width = 32 if version == 4 else 128
+        return version, first, width, width - (last - first).bit_length()
+
+    def add(self, cidr):
+        version, first, width, prefix_length = self._get_prefix(cidr)
+        node = self._roots.setdefault(version, [None, None, None])
+        for depth in range(prefix_length):
+            bit = (first >> (width - 1 - depth)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        # Of CIDRs written differently for the same range, such as 10.0.0.1/8 and
+        # 10.0.0.0/8, the first one added is kept
+        if node[2] is None:
+            node[2] = cidr
+
+    def find_smallest(self, cidr):
+        """Returns the smallest CIDR containing this CIDR, or None"""
+        version, first, width, prefix_length = self._get_prefix(cidr)
+        node = self._roots.get(version)
+        match = None
+        depth = 0
+        while node is not None:
+            if node[2] is not None:
+                match = node[2]
+            if depth == prefix_length:
+                break
+            node = node[(first >> (width - 1 - depth)) & 1]
+            depth += 1
+        return match
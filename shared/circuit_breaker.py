@@ -0,0 +1,110 @@
+import collections
+import threading
+
+from botocore import xform_name
+
+# Error codes AWS services use when the caller lacks permission for the action
+ACCESS_DENIED_ERROR_CODES = set(
+    [
+        "AccessDenied",
+        "AccessDeniedException",
+        "AuthorizationError",
+        "AuthorizationErrorException",
+        "UnauthorizedOperation",
+        "UnauthorizedAccess",
+        "UnauthorizedException",
+    ]
+)
+
+
+def is_access_denied_error(error_code):
+    return error_code in ACCESS_DENIED_ERROR_CODES
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call whose action keeps being denied"""
+
+
+class CircuitBreakers(object):
+    """
+    Stops making calls for a (service, action, region) once `threshold` calls in a row
+    have been denied with the same error code, as the rest of the calls fanned out for
+    that action will almost certainly be denied too. Actions are named in snake case, as
+    collect names them.
+
+    Denials of the (service, action) in `tolerated_denials` are expected for some of the
+    resources, such as KMS keys with restricted access, so they are not counted.
+    """
+
+    def __init__(self, threshold, tolerated_denials=()):
+        self.threshold = threshold
+        self.tolerated_denials = set(tolerated_denials)
+        self._lock = threading.Lock()
+        # (service, action, region) -> [error code, consecutive errors]
+        self._errors = {}
+        # (service, action, region) -> error code, for the circuits that have tripped
+        self._open = {}
+        self._skipped = collections.Counter()
+
+    def before_call(self, key):
+        with self._lock:
+            if key not in self._open:
+                return
+            self._skipped[key] += 1
+            error_code = self._open[key]
+        raise CircuitOpenError(
+            "{} calls in a row were denied with {}".format(self.threshold, error_code)
+        )
+
+    def after_call(self, key, error_code):
+        if key[:2] in self.tolerated_denials:
+            return
+        with self._lock:
+            if not is_access_denied_error(error_code):
+                self._errors.pop(key, None)
+                return
+            errors = self._errors.get(key)
+            if errors is None or errors[0] != error_code:
+                errors = self._errors[key] = [error_code, 0]
+            errors[1] += 1
+            if errors[1] >= self.threshold:
+                self._open[key] = error_code
+
+    def instrument_client(self, client, service, region):
+        """Hook the botocore client so calls are skipped while their circuit is open"""
+
+        def before_parameter_build(model, **kwargs):
+            self.before_call((service, xform_name(model.name), region))
+
+        def after_call(model, parsed, **kwargs):
+            self.after_call(
+                (service, xform_name(model.name), region),
+                parsed.get("Error", {}).get("Code", ""),
+            )
+
+        # Emitted first for every call, before any handler can provide a response
+        client.meta.events.register("before-parameter-build", before_parameter_build)
+        client.meta.events.register("after-call", after_call)
+
+    def get_summaries(self):
+        """
+        Returns the service, action, region, error code and number of calls skipped of
+        each circuit that tripped. The denied calls that tripped it are failures of their
+        own, so the skipped calls are reported apart from them.
+        """
+        with self._lock:
+            open_circuits = sorted(self._open.items())
+            skipped = dict(self._skipped)
+
+        summaries = []
+        for (service, action, region), error_code in open_circuits:
+            summaries.append(
+                {
+                    "service": service,
+                    "action": action,
+                    "region": region,
+                    "error_code": error_code,
+                    "skipped": skipped.get((service, action, region), 0),
+                }
+            )
+        return summaries
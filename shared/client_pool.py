@@ -0,0 +1,66 @@
+import json
+import threading
+
+from botocore.config import Config
+
+
+class ClientPool(object):
+    """
+    Creates each boto3 client once per session and hands out the same client afterwards,
+    so its connection pool (and TLS sessions) are reused across calls.
+
+    Clients are keyed by (service, region, config). botocore clients are thread-safe once
+    created, but the session that creates them is not, so creation is serialized.
+    """
+
+    def __init__(self, session, config=None, rate_limiter=None, circuit_breakers=None):
+        self.session = session
+        # Keyword arguments for botocore.config.Config used by every client
+        self.config = config or {}
+        self.rate_limiter = rate_limiter
+        self.circuit_breakers = circuit_breakers
+
+        # Instrumentation, to spot regressions that create clients per call
+        self.clients_created = 0
+        self.clients_reused = 0
+
+        self._clients = {}
+        self._available_regions = {}
+        self._lock = threading.Lock()
+
+    def client(self, service, region_name, **config_overrides):
+        config = dict(self.config)
+        config.update(config_overrides)
+        key = (service, region_name, json.dumps(config, sort_keys=True))
+
+        with self._lock:
+            if key in self._clients:
+                self.clients_reused += 1
+                return self._clients[key]
+
+            client = self.session.client(
+                service, region_name=region_name, config=Config(**config)
+            )
+            if self.rate_limiter is not None:
+                self.rate_limiter.instrument_client(client, service, region_name)
+            if self.circuit_breakers is not None:
+                self.circuit_breakers.instrument_client(client, service, region_name)
+            self._clients[key] = client
+            self.clients_created += 1
+            return client
+
+    def get_available_regions(self, service):
+        """Memoized session.get_available_regions, which re-reads the botocore endpoint data"""
+        with self._lock:
+            if service not in self._available_regions:
+                self._available_regions[service] = set(
+                    self.session.get_available_regions(service)
+                )
+            return self._available_regions[service]
+
+    def print_report(self):
+        print(
+            "Clients: {} created, {} reused".format(
+                self.clients_created, self.clients_reused
+            )
+        )
@@ -2,11 +2,11 @@ from __future__ import print_function
 import argparse
 import json
 import datetime
-import pyjq
 import yaml
 import sys
-from netaddr import IPNetwork
 
+from shared import jq
+from shared.cidr import is_private_cidr, is_reserved_cidr
 from shared.nodes import Account, Region
 from shared.query import query_aws, get_parameter_file
 
@@ -125,31 +125,11 @@ def make_list(v):
 
 
 def is_external_cidr(cidr):
-    ipnetwork = IPNetwork(cidr)
-    if (
-        ipnetwork in IPNetwork("10.0.0.0/8")
-        or ipnetwork in IPNetwork("172.16.0.0/12")
-        or ipnetwork in IPNetwork("192.168.0.0/16")
-    ):
-        return False
-    return True
+    return not is_private_cidr(cidr)
 
 
 def is_unblockable_cidr(cidr):
-    ipnetwork = IPNetwork(cidr)
-    if (
-        ipnetwork in IPNetwork("169.254.0.0/16")
-        or ipnetwork in IPNetwork("127.0.0.0/8")  # link local
-        or ipnetwork in IPNetwork("192.0.2.0/24")  # loopback
-        or ipnetwork in IPNetwork("198.51.100.0/24")  # Test network from RFC 5737
-        or ipnetwork in IPNetwork("203.0.113.0/24")  # Test network
-        or ipnetwork in IPNetwork("224.0.0.0/4")  # Test network
-        or ipnetwork in IPNetwork("240.0.0.0/5")  # class D multicast
-        or ipnetwork in IPNetwork("248.0.0.0/5")  # class E reserved
-        or ipnetwork in IPNetwork("255.255.255.255/32")  # reserved  # broadcast
-    ):
-        return True
-    return False
+    return is_reserved_cidr(cidr)
 
 
 def get_regions(account, outputfilter={}):
@@ -158,14 +138,21 @@ def get_regions(account, outputfilter={}):
     if not region_data:
         raise InvalidAccountData("region data not found for {}".format(account.name))
 
-    region_filter = ""
     if "regions" in outputfilter:
-        region_filter = "| select(.RegionName | contains({}))".format(
-            outputfilter["regions"]
+        return jq.all(
+            ".Regions[] | select(.RegionName | contains($regions[]))",
+            region_data,
+            variables={"regions": get_filter_values(outputfilter["regions"])},
         )
+    return jq.all(".Regions[]", region_data)
 
-    regions = pyjq.all(".Regions[]{}".format(region_filter), region_data)
-    return regions
+
+def get_filter_values(value):
+    """
+    Returns the values of a filter of the outputfilter, which are given as quoted strings
+    joined by commas, such as '"us-east-1","us-west-2"'
+    """
+    return json.loads("[{}]".format(value))
 
 
 def get_account(account_name, config=None, config_filename="config.json.demo"):
@@ -295,7 +282,7 @@ def get_account_stats(account, all_resources=False):
             # S3 buckets require special code to identify their location
             if resource["name"] == "S3 buckets":
                 if region.name == "us-east-1":
-                    buckets = pyjq.all(
+                    buckets = jq.all(
                         ".Buckets[].Name",
                         query_aws(region.account, "s3-list-buckets", region),
                     )
@@ -318,7 +305,7 @@ def get_account_stats(account, all_resources=False):
             else:
                 # Normal path
                 stats[resource["name"]][region.name] = sum(
-                    pyjq.all(
+                    jq.all(
                         resource["query"],
                         query_aws(region.account, resource["source"], region),
                     )
@@ -1,5 +1,4 @@
-import pyjq
-
+from shared import jq
 from shared.common import query_aws, get_regions, get_parameter_file
 from shared.nodes import Account, Region
 from commands.prepare import get_resource_nodes
@@ -18,12 +17,10 @@ def find_unused_security_groups(region):
 
     defined_sg_set = {}
 
-    for sg in pyjq.all(".SecurityGroups[]?", defined_sgs):
+    for sg in jq.all(".SecurityGroups[]?", defined_sgs):
         defined_sg_set[sg["GroupId"]] = sg
 
-    for used_sg in pyjq.all(
-        ".NetworkInterfaces[]?.Groups[].GroupId", network_interfaces
-    ):
+    for used_sg in jq.all(".NetworkInterfaces[]?.Groups[].GroupId", network_interfaces):
         used_sgs.add(used_sg)
 
     # Get the data from the `prepare` command
@@ -57,7 +54,7 @@ def find_unused_security_groups(region):
 def find_unused_volumes(region):
     unused_volumes = []
     volumes = query_aws(region.account, "ec2-describe-volumes", region)
-    for volume in pyjq.all('.Volumes[]?|select(.State=="available")', volumes):
+    for volume in jq.all('.Volumes[]?|select(.State=="available")', volumes):
         unused_volumes.append({"id": volume["VolumeId"]})
 
     return unused_volumes
@@ -66,7 +63,7 @@ def find_unused_volumes(region):
 def find_unused_elastic_ips(region):
     unused_ips = []
     ips = query_aws(region.account, "ec2-describe-addresses", region)
-    for ip in pyjq.all(".Addresses[]? | select(.AssociationId == null)", ips):
+    for ip in jq.all(".Addresses[]? | select(.AssociationId == null)", ips):
         unused_ips.append(
             {"id": ip.get("AllocationId", "Un-allocated IP"), "ip": ip["PublicIp"]}
         )
@@ -79,7 +76,7 @@ def find_unused_network_interfaces(region):
     network_interfaces = query_aws(
         region.account, "ec2-describe-network-interfaces", region
     )
-    for network_interface in pyjq.all(
+    for network_interface in jq.all(
         '.NetworkInterfaces[]?|select(.Status=="available")', network_interfaces
     ):
         unused_network_interfaces.append(
@@ -94,7 +91,7 @@ def find_unused_elastic_load_balancers(region):
     elastic_load_balancers = query_aws(
         region.account, "elb-describe-load-balancers", region
     )
-    for elastic_load_balancer in pyjq.all(
+    for elastic_load_balancer in jq.all(
         ".LoadBalancerDescriptions[]? | select(.Instances == [])",
         elastic_load_balancers,
     ):
@@ -108,9 +105,7 @@ def find_unused_elastic_load_balancers(region):
     elastic_load_balancers_v2 = query_aws(
         region.account, "elbv2-describe-load-balancers", region
     )
-    for elastic_load_balancer in pyjq.all(
-        ".LoadBalancers[]?", elastic_load_balancers_v2
-    ):
+    for elastic_load_balancer in jq.all(".LoadBalancers[]?", elastic_load_balancers_v2):
         target_groups = get_parameter_file(
             region,
             "elbv2",
@@ -123,14 +118,14 @@ def find_unused_elastic_load_balancers(region):
                 "Type": elastic_load_balancer["Type"],
             }
         )
-        for target_group in pyjq.all(".TargetGroups[]?", target_groups):
+        for target_group in jq.all(".TargetGroups[]?", target_groups):
             target_healths = get_parameter_file(
                 region,
                 "elbv2",
                 "describe-target-health",
                 target_group["TargetGroupArn"],
             )
-            instances = pyjq.one(".TargetHealthDescriptions? | length", target_healths)
+            instances = jq.one(".TargetHealthDescriptions? | length", target_healths)
             if instances > 0:
                 unused_elastic_load_balancers.pop()
                 break
@@ -0,0 +1,152 @@
+import heapq
+import random
+import threading
+import time
+
+
+class PollJob(object):
+    def __init__(self, region, service, poll, on_done, on_timeout, max_wait):
+        self.region = region
+        self.service = service
+        self.poll = poll
+        self.on_done = on_done
+        self.on_timeout = on_timeout
+        self.max_wait = max_wait
+        self.attempts = 0
+        self.started = time.time()
+
+
+class JobPoller(object):
+    """
+    Polls asynchronous AWS jobs, such as IAM access reports, until they have finished.
+
+    Each poll is run through the CallScheduler, so polls share its concurrency limits with
+    every other call. A job that is still running is polled again after an exponential
+    backoff with jitter, so a whole set of jobs is polled together instead of each one
+    sleeping in turn. With a single worker there is no polling thread: the calling thread
+    polls the pending jobs in poll_next() and wait().
+    """
+
+    def __init__(self, scheduler, base_delay=1.0, max_delay=20.0, max_wait=600):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Seconds after which a job that is still running is given up on
+        self.max_wait = max_wait
+
+        self.polls = 0
+
+        self._scheduler = scheduler
+        self._condition = threading.Condition()
+        # Heap of (time of next poll, sequence number, job)
+        self._jobs = []
+        self._sequence = 0
+        self._outstanding = 0
+        self._thread = None
+        self._shutdown = False
+
+    def add(self, region, service, poll, on_done, on_timeout=None, max_wait=None):
+        """
+        Poll the job right away, and then until poll() returns True, after which on_done()
+        is called. If the job is still running after max_wait seconds, on_timeout() is
+        called before on_done().
+        """
+        job = PollJob(
+            region,
+            service,
+            poll,
+            on_done,
+            on_timeout,
+            max_wait if max_wait is not None else self.max_wait,
+        )
+        with self._condition:
+            self._outstanding += 1
+        if not self._scheduler.is_concurrent:
+            # Poll right away in this thread, and leave the job with the pending set if
+            # it is still running
+            self._scheduler.submit(job.region, job.service, self._poll, job)
+            return
+
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._schedule(job, 0)
+
+    def get_delay(self, attempts):
+        """Seconds to wait before the next poll of a job that has been polled `attempts` times"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        # Spread out the polls of jobs that were started together
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def poll_next(self):
+        """
+        With a single worker, wait for the pending job that is due first and poll it in
+        this thread. Returns False when there is no job left to poll.
+        """
+        with self._condition:
+            if not self._jobs:
+                return False
+            next_poll, _, job = heapq.heappop(self._jobs)
+        time.sleep(max(0, next_poll - time.time()))
+        self._scheduler.submit(job.region, job.service, self._poll, job)
+        return True
+
+    def wait(self):
+        """Block until every job has finished"""
+        if not self._scheduler.is_concurrent:
+            while self.poll_next():
+                pass
+        with self._condition:
+            while self._outstanding > 0:
+                self._condition.wait()
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _schedule(self, job, delay):
+        with self._condition:
+            self._sequence += 1
+            heapq.heappush(self._jobs, (time.time() + delay, self._sequence, job))
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._shutdown:
+                        return
+                    now = time.time()
+                    if self._jobs and self._jobs[0][0] <= now:
+                        break
+                    self._condition.wait(self._jobs[0][0] - now if self._jobs else None)
+                _, _, job = heapq.heappop(self._jobs)
+
+            # Errors of the poll are raised by the scheduler's wait()
+            self._scheduler.submit(job.region, job.service, self._poll, job)
+
+    def _poll(self, job):
+        is_done = True
+        try:
+            with self._condition:
+                self.polls += 1
+            job.attempts += 1
+            is_done = job.poll()
+            if not is_done and time.time() - job.started >= job.max_wait:
+                is_done = True
+                if job.on_timeout is not None:
+                    job.on_timeout()
+        finally:
+            if is_done:
+                try:
+                    job.on_done()
+                finally:
+                    with self._condition:
+                        self._outstanding -= 1
+                        self._condition.notify_all()
+            else:
+                self._schedule(job, self.get_delay(job.attempts))
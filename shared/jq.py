@@ -0,0 +1,203 @@
+"""
+Runs jq expressions as pyjq does, without compiling them again for each call.
+
+Compiled programs are cached by expression and variables, so values should be passed as
+jq $variables rather than formatted into the expression. Expressions that are only
+paths, such as .NetworkInterfaces[].PrivateIpAddresses[].PrivateIpAddress, optionally
+piped into select() comparing a path to a literal or $variable, are evaluated in Python
+instead, which avoids converting the whole value to and from jq.
+
+The values returned by Python evaluation are those of the input rather than copies, so
+numbers keep their type: jq returns 1 for 1.0 and a float for integers above 2**53.
+When the Python evaluation would raise an error, jq is run instead to raise it.
+"""
+import functools
+import json
+import re
+
+import pyjq
+
+ScriptRuntimeError = pyjq.ScriptRuntimeError
+
+# Compiled programs kept, each being a few KB
+COMPILED_CACHE_SIZE = 1024
+
+_PATH_TOKEN = re.compile(r"\.([A-Za-z_][A-Za-z0-9_]*)|(\[\])|(\?)")
+_COMPARISON = re.compile(
+    r"^(.*?)\s*(==|!=)\s*"
+    r'(\$[A-Za-z_][A-Za-z0-9_]*|"(?:[^"\\]|\\.)*"|null|true|false|-?[0-9]+(?:\.[0-9]+)?)\s*$',
+    re.DOTALL,
+)
+_SELECT = re.compile(r"^select\s*\((.*)\)$", re.DOTALL)
+
+
+class _Unsupported(Exception):
+    """Raised when an expression, or its evaluation, must be left to jq"""
+
+
+@functools.lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _compile(expression, variables_json):
+    return pyjq.compile(expression, json.loads(variables_json))
+
+
+def compile(expression, variables=None):
+    """Returns the compiled jq program, cached by expression and variables"""
+    return _compile(expression, json.dumps(variables or {}, sort_keys=True))
+
+
+def _split_pipes(expression):
+    """Splits the expression on the | that aren't in parentheses or strings"""
+    parts = []
+    depth = 0
+    in_string = False
+    start = 0
+    position = 0
+    while position < len(expression):
+        character = expression[position]
+        if in_string:
+            if character == "\\":
+                position += 1
+            elif character == '"':
+                in_string = False
+        elif character == '"':
+            in_string = True
+        elif character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+        elif character == "|" and depth == 0:
+            parts.append(expression[start:position])
+            start = position + 1
+        position += 1
+    parts.append(expression[start:])
+    return [part.strip() for part in parts]
+
+
+def _parse_path(path):
+    """Returns the steps of a path such as .Tags[]?.Value, as (kind, name, optional)"""
+    if not path.startswith("."):
+        raise _Unsupported()
+    steps = []
+    # A leading . is the value itself, as in .[]
+    position = 1 if path == "." or path.startswith(".[") else 0
+    while position < len(path):
+        match = _PATH_TOKEN.match(path, position)
+        if match is None or match.end() == position:
+            raise _Unsupported()
+        position = match.end()
+        if match.group(3) is not None:
+            if not steps or steps[-1][2]:
+                raise _Unsupported()
+            steps[-1] = (steps[-1][0], steps[-1][1], True)
+        elif match.group(2) is not None:
+            steps.append(("iterate", None, False))
+        elif match.group(1) is not None:
+            steps.append(("field", match.group(1), False))
+    return steps
+
+
+def _parse_literal(text):
+    if text.startswith("$"):
+        return ("variable", text[1:])
+    return ("literal", json.loads(text))
+
+
+@functools.lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _parse(expression):
+    """
+    Returns the steps of the expression for Python evaluation, or None when it must be
+    run by jq
+    """
+    try:
+        steps = []
+        for part in _split_pipes(expression):
+            select = _SELECT.match(part)
+            if select is None:
+                steps.extend(_parse_path(part))
+                continue
+            comparison = _COMPARISON.match(select.group(1).strip())
+            if comparison is None:
+                raise _Unsupported()
+            left = []
+            for path in _split_pipes(comparison.group(1)):
+                left.extend(_parse_path(path))
+            steps.append(
+                (
+                    "select",
+                    (tuple(left), comparison.group(2) == "==")
+                    + _parse_literal(comparison.group(3)),
+                    False,
+                )
+            )
+        return tuple(steps)
+    except (_Unsupported, ValueError):
+        return None
+
+
+def _equals(a, b):
+    """Compares scalars as jq does, where true isn't equal to 1"""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (dict, list)) or isinstance(b, (dict, list)):
+        raise _Unsupported()
+    return a == b
+
+
+def _evaluate(steps, values, variables):
+    for kind, argument, optional in steps:
+        results = []
+        if kind == "field":
+            for value in values:
+                if isinstance(value, dict):
+                    results.append(value.get(argument))
+                elif value is None:
+                    results.append(None)
+                else:
+                    raise _Unsupported()
+        elif kind == "iterate":
+            for value in values:
+                if isinstance(value, list):
+                    results.extend(value)
+                elif isinstance(value, dict):
+                    results.extend(value.values())
+                elif not (value is None and optional):
+                    raise _Unsupported()
+        else:
+            path, equal, operand_kind, operand = argument
+            if operand_kind == "variable":
+                if operand not in variables:
+                    raise _Unsupported()
+                operand = variables[operand]
+            for value in values:
+                for selected in _evaluate(path, [value], variables):
+                    if _equals(selected, operand) == equal:
+                        results.append(value)
+        values = results
+    return values
+
+
+def all(expression, value=None, variables=None):
+    """Returns every output of the expression for the value, as pyjq.all"""
+    steps = _parse(expression)
+    if steps is not None:
+        try:
+            return _evaluate(steps, [value], variables or {})
+        except _Unsupported:
+            pass
+    return compile(expression, variables).all(value)
+
+
+def first(expression, value=None, default=None, variables=None):
+    """Returns the first output of the expression, or default if there is none"""
+    results = all(expression, value, variables)
+    return results[0] if results else default
+
+
+def one(expression, value=None, variables=None):
+    """Returns the only output of the expression, raising IndexError unless there is one"""
+    results = all(expression, value, variables)
+    if not results:
+        raise IndexError("Result of jq is empty")
+    if len(results) > 1:
+        raise IndexError("Result of jq have multiple elements")
+    return results[0]
@@ -0,0 +1,71 @@
+"""
+JSON parsing and serialization of account-data. Files are parsed with orjson when it is
+installed and the json module otherwise, and are always written with the json module, so
+their contents don't depend on which packages are installed.
+
+The backend can be chosen with the CLOUDMAPPER_JSON environment variable, set to
+"orjson" or "json", or with set_backend(). Anything orjson can't parse, such as
+integers over 64 bits, falls back to the json module.
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ["orjson", "json"]
+
+_backend = None
+
+
+def set_backend(name=None):
+    """Select the backend by name, or the fastest available one when name is None"""
+    global _backend
+    if name is None:
+        name = "orjson" if orjson is not None else "json"
+    if name not in BACKENDS:
+        raise ValueError(
+            "Unknown JSON backend {}, expected one of {}".format(
+                name, ", ".join(BACKENDS)
+            )
+        )
+    if name == "orjson" and orjson is None:
+        raise ValueError("The orjson backend requires orjson to be installed")
+    _backend = name
+
+
+def get_backend():
+    return _backend
+
+
+def get_available_backends():
+    return [name for name in BACKENDS if name != "orjson" or orjson is not None]
+
+
+def loads(data):
+    """json.loads, for str or bytes"""
+    if _backend == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Such as NaN, or integers over 64 bits, which the json module accepts
+            pass
+    return json.loads(data)
+
+
+def load(f):
+    """json.load, for files opened in binary or text mode"""
+    return loads(f.read())
+
+
+def dumps(data, default=None):
+    """
+    Returns the text of the files written by collect. orjson isn't used for this, as it
+    indents by 2 spaces, formats floats differently, and writes NaN as null.
+    """
+    return json.dumps(data, indent=4, sort_keys=True, default=default)
+
+
+set_backend(os.environ.get("CLOUDMAPPER_JSON") or None)
@@ -0,0 +1,151 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+from shared.page_writer import write_atomically
+
+
+class Manifest(object):
+    """
+    Record of the calls collect has made for an account, saved to manifest.json in the
+    account's directory.
+
+    Entries are keyed by the path of the call's output file, relative to the account
+    directory, so the region is the first part of the key. Each entry has the service,
+    action and parameters of the call, its status ("ok", "failed", or "stale" when it
+    must be made again), when it was made, and the size and SHA-256 of the file written,
+    if any.
+    """
+
+    # Seconds between saves while calls are being recorded
+    SAVE_INTERVAL = 5
+
+    def __init__(self, account_path, ttls=None):
+        self.account_path = account_path
+        # For incremental collection, runner name -> seconds its output stays fresh for.
+        # Output of runners without a TTL is always collected again. When None, collected
+        # output never expires.
+        self.ttls = ttls
+        self.path = os.path.join(account_path, "manifest.json")
+        self.entries = {}
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+
+        self._lock = threading.Lock()
+        self._last_save = time.time()
+        self._is_dirty = False
+
+    def get_key(self, outputfile):
+        return os.path.relpath(outputfile, self.account_path)
+
+    def get_outputfile(self, key):
+        return os.path.join(self.account_path, key)
+
+    def get_runner_name(self, key):
+        """Ex. iam-get-role for us-east-1/iam-get-role/RoleName"""
+        name = key.split(os.sep)[1]
+        if name.endswith(".json"):
+            name = name[: -len(".json")]
+        return name
+
+    def is_collected(self, outputfile):
+        """
+        Whether the call for this output file has already been made successfully, and
+        hasn't expired. Files from runs that predate the manifest are trusted when they
+        exist, as files are only ever created complete.
+        """
+        key = self.get_key(outputfile)
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            if not os.path.isfile(outputfile):
+                return False
+            if self.ttls is None:
+                return True
+            timestamp = os.path.getmtime(outputfile)
+        elif entry["status"] != "ok":
+            return False
+        elif self.ttls is None:
+            return True
+        else:
+            timestamp = datetime.datetime.fromisoformat(entry["timestamp"]).timestamp()
+
+        return time.time() - timestamp < self.ttls.get(self.get_runner_name(key), 0)
+
+    def record(
+        self,
+        outputfile,
+        service,
+        action,
+        parameters,
+        status,
+        details=None,
+        poll=None,
+        batch=None,
+    ):
+        """
+        Record the outcome of a call
+
+        details: The bytes and sha256 of the file written, when there is one
+        poll, batch: The runner's Poll and Batch configs, needed to make the call again
+        """
+        entry = {
+            "service": service,
+            "action": action,
+            "parameters": parameters,
+            "status": status,
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        if details is not None:
+            entry.update(details)
+        if poll is not None:
+            entry["poll"] = poll
+        if batch is not None:
+            entry["batch"] = batch
+
+        with self._lock:
+            self.entries[self.get_key(outputfile)] = entry
+            self._is_dirty = True
+            should_save = time.time() - self._last_save >= self.SAVE_INTERVAL
+        if should_save:
+            self.save()
+
+    def invalidate(self, key):
+        """Mark a call as needing to be made again, even though its file exists"""
+        with self._lock:
+            self.entries[key]["status"] = "stale"
+            self._is_dirty = True
+
+    def get_retries(self):
+        """
+        Returns the keys of the calls that failed, or whose file is missing or doesn't
+        have the size recorded for it
+        """
+        with self._lock:
+            entries = list(self.entries.items())
+
+        retries = []
+        for key, entry in sorted(entries):
+            if entry["status"] != "ok":
+                retries.append(key)
+            elif "bytes" in entry:
+                outputfile = self.get_outputfile(key)
+                if (
+                    not os.path.isfile(outputfile)
+                    or os.path.getsize(outputfile) != entry["bytes"]
+                ):
+                    retries.append(key)
+        return retries
+
+    def save(self):
+        with self._lock:
+            if not self._is_dirty:
+                return
+            text = json.dumps(self.entries, indent=4, sort_keys=True)
+            self._is_dirty = False
+            self._last_save = time.time()
+            # Write while holding the lock, so an older copy can't replace a newer one
+            write_atomically(self.path, text)
@@ -22,10 +22,11 @@ WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWIS
 USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ---------------------------------------------------------------------------
 """
-import pyjq
+from shared import jq
 from abc import ABCMeta
 from netaddr import IPNetwork, IPAddress
 from six import add_metaclass
+from shared.cidr import is_private_cidr
 from shared.query import query_aws, get_parameter_file
 
 
@@ -44,31 +45,43 @@ def get_name(node, default):
     return node[default]
 
 
+def get_described_tags(tags):
+    """Returns the tags of the resource in the output of describe-tags, such as of elb"""
+    descriptions = tags["TagDescriptions"]
+    if descriptions is None or len(descriptions) == 0:
+        return []
+    return descriptions[0]["Tags"]
+
+
 def is_public_ip(ip):
-    ip = IPAddress(ip)
-    if (
-        ip in IPNetwork("10.0.0.0/8")
-        or ip in IPNetwork("172.16.0.0/12")
-        or ip in IPNetwork("192.168.0.0/16")
-    ):
-        return False
-    return True
+    return not is_private_cidr(ip)
 
 
 @add_metaclass(ABCMeta)
 class Node(object):
-    _arn = ""
-    _local_id = ""  # Ex. InstanceId
-    _name = ""
-    _type = ""
-
-    _parent = None
-    _json_blob = ""
+    # A node is built for every resource, so they use slots rather than a __dict__, and
+    # the subclasses must declare their own attributes in __slots__ too.
+    # Subclasses set _arn, _local_id (ex. InstanceId), _name and _type before calling
+    # Node.__init__
+    __slots__ = (
+        "_arn",
+        "_local_id",
+        "_name",
+        "_type",
+        "_parent",
+        "_json_blob",
+        "_children",
+        # Node this is a child of, which isn't always its parent, as subnets are the
+        # children of AZs but have the VPC as parent when AZs aren't shown
+        "_container",
+        # Number of leaves below the node, updated as children are added and removed
+        "_leaf_count",
+        # List of the leaves, built when first needed after the children changed
+        "_leaves",
+    )
 
     _isLeaf = False
 
-    _children = None
-
     def __key(self):
         return self._arn
 
@@ -76,9 +89,13 @@ class Node(object):
         self._parent = parent
         self._json_blob = json_blob
         self._children = {}
+        self._container = None
+        self._leaf_count = 1 if self._isLeaf else 0
+        self._leaves = None
 
-    def set_subnet(self, subnet):
-        self._subnet = subnet
+    def get_subnet_arn(self, subnet):
+        """Arn of the node when placed in the subnet"""
+        return self._arn
 
     @property
     def arn(self):
@@ -163,36 +180,56 @@ class Node(object):
     def json(self):
         return self._json_blob
 
+    def _update_leaves(self, leaf_count_change):
+        node = self
+        while node is not None:
+            node._leaf_count += leaf_count_change
+            node._leaves = None
+            node = node._container
+
     def addChild(self, child):
+        leaf_count_change = child._leaf_count
+        replaced = self._children.get(child.local_id)
+        if replaced is not None:
+            replaced._container = None
+            leaf_count_change -= replaced._leaf_count
         self._children[child.local_id] = child
+        child._container = self
+        self._update_leaves(leaf_count_change)
 
     @property
     def children(self):
         return self._children.values()
 
+    def get_child(self, local_id):
+        return self._children.get(local_id)
+
     def removeChild(self, child):
-        del self._children[child.local_id]
+        removed = self._children.pop(child.local_id)
+        removed._container = None
+        # Removing a child without leaves changes neither the counts nor the lists above
+        if removed._leaf_count:
+            self._update_leaves(-removed._leaf_count)
 
     @property
     def has_leaves(self):
-        # TODO: This can be optimized
-        if self.isLeaf:
-            return True
-        else:
-            for child in self.children:
-                if child.has_leaves:
-                    return True
-            return False
+        return self._leaf_count > 0
+
+    @property
+    def leaf_count(self):
+        return self._leaf_count
 
     @property
     def leaves(self):
+        """The leaves below the node, which is shared by callers so must not be modified"""
         if self.isLeaf:
             return [self]
-        else:
+        if self._leaves is None:
             leaves = []
-            for child in self.children:
+            for child in self._children.values():
                 leaves.extend(child.leaves)
-            return leaves
+            self._leaves = leaves
+        return self._leaves
 
     def cytoscape_data(self, parent_arn=""):
         response = {
@@ -214,6 +251,8 @@ class Node(object):
 
 
 class Account(Node):
+    __slots__ = ()
+
     def __init__(self, parent, json_blob):
         self._local_id = json_blob["id"]
         self._arn = "arn:aws:::{}:".format(self._local_id)
@@ -222,17 +261,158 @@ class Account(Node):
         super(Account, self).__init__(parent, json_blob)
 
 
+class RegionIndex(object):
+    """
+    Lookups by id of a region's network interfaces, subnets, security groups, Redshift
+    subnet groups and resource tags, each built from the collected file the first time it
+    is needed, so the nodes don't scan the whole file, or read the file again, for each
+    resource
+    """
+
+    def __init__(self, region):
+        self._region = region
+        self._account = region.account
+        self._region_name = region.name
+        self._network_interfaces = None
+        self._subnets = None
+        self._subnets_by_zone = None
+        self._security_groups = None
+        self._security_groups_by_vpc = None
+        self._security_group_rules = None
+        self._redshift_subnet_groups = None
+        self._resource_tags = {}
+
+    def get_network_interface(self, interface_id):
+        if self._network_interfaces is None:
+            interfaces_json = query_aws(
+                self._account, "ec2-describe-network-interfaces", self._region_name
+            )
+            self._network_interfaces = {}
+            for interface in interfaces_json.get("NetworkInterfaces", []):
+                self._network_interfaces[interface["NetworkInterfaceId"]] = interface
+        return self._network_interfaces.get(interface_id)
+
+    def _load_subnets(self):
+        subnets_json = query_aws(
+            self._account, "ec2-describe-subnets", self._region_name
+        )
+        self._subnets = {}
+        self._subnets_by_zone = {}
+        for position, subnet in enumerate(subnets_json.get("Subnets", [])):
+            self._subnets[subnet["SubnetId"]] = (position, subnet)
+            self._subnets_by_zone.setdefault(
+                (subnet["VpcId"], subnet["AvailabilityZone"]), []
+            ).append(subnet)
+
+    def get_subnets(self, subnet_ids):
+        """Returns the subnets with these ids, in the order of the collected file"""
+        if self._subnets is None:
+            self._load_subnets()
+        found = [
+            self._subnets[subnet_id]
+            for subnet_id in set(subnet_ids)
+            if subnet_id in self._subnets
+        ]
+        return [subnet for _, subnet in sorted(found, key=lambda found: found[0])]
+
+    def get_zone_subnets(self, vpc_id, zone_name):
+        """Returns the subnets of the VPC in the availability zone"""
+        if self._subnets is None:
+            self._load_subnets()
+        return self._subnets_by_zone.get((vpc_id, zone_name), [])
+
+    def _load_security_groups(self):
+        security_groups_json = query_aws(
+            self._account, "ec2-describe-security-groups", self._region_name
+        )
+        self._security_groups = jq.all(".SecurityGroups[]?", security_groups_json)
+        self._security_groups_by_vpc = {}
+        self._security_group_rules = {}
+        for security_group in self._security_groups:
+            self._security_groups_by_vpc.setdefault(
+                security_group.get("VpcId"), []
+            ).append(security_group)
+            self._security_group_rules[security_group["GroupId"]] = {
+                "ip_ranges": [
+                    (ip_range.get("CidrIp"), ip_range.get("Description"))
+                    for ip_range in jq.all(
+                        ".IpPermissions[]?.IpRanges[]", security_group
+                    )
+                ],
+                "ingress_groups": jq.all(
+                    ".IpPermissions[]?.UserIdGroupPairs[].GroupId", security_group
+                ),
+            }
+
+    def get_security_groups(self):
+        """Returns the security groups of the region, in the order of the collected file"""
+        if self._security_groups is None:
+            self._load_security_groups()
+        return self._security_groups
+
+    def get_vpc_security_groups(self, vpc_id):
+        """Returns the security groups of the VPC, in the order of the collected file"""
+        if self._security_groups is None:
+            self._load_security_groups()
+        return self._security_groups_by_vpc.get(vpc_id, [])
+
+    def get_security_group_rules(self, group_id):
+        """
+        Returns the ingress rules of the security group, as its "ip_ranges", a list of
+        (CidrIp, Description), and its "ingress_groups", the ids of the groups it allows in
+        """
+        if self._security_groups is None:
+            self._load_security_groups()
+        return self._security_group_rules[group_id]
+
+    def get_redshift_subnet_group(self, vpc_id, name):
+        if self._redshift_subnet_groups is None:
+            subnet_groups_json = query_aws(
+                self._account,
+                "redshift-describe-cluster-subnet-groups",
+                self._region_name,
+            )
+            self._redshift_subnet_groups = {}
+            for subnet_group in subnet_groups_json.get("ClusterSubnetGroups", []):
+                self._redshift_subnet_groups[
+                    (subnet_group["VpcId"], subnet_group["ClusterSubnetGroupName"])
+                ] = subnet_group
+        return self._redshift_subnet_groups.get((vpc_id, name))
+
+    def get_resource_tags(self, service, function, resource, get_tags):
+        """
+        Returns the tags of a resource, got by get_tags from the file collected for it by
+        the function of the service, such as elb describe-tags, or [] if there is none
+        """
+        key = (service, function, resource)
+        tags = self._resource_tags.get(key)
+        if tags is None:
+            tags_json = get_parameter_file(self._region, service, function, resource)
+            tags = [] if tags_json is None else get_tags(tags_json)
+            self._resource_tags[key] = tags
+        return tags
+
+
 class Region(Node):
+    __slots__ = ("_index",)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = RegionIndex(self)
+        return self._index
+
     def __init__(self, parent, json_blob):
         self._local_id = json_blob["RegionName"]
         self._arn = "arn:aws::{}:{}:".format(self.local_id, parent.account.local_id)
         self._name = json_blob["RegionName"]
         self._type = "region"
+        self._index = None
         super(Region, self).__init__(parent, json_blob)
 
 
 class Vpc(Node):
-    _peering_connections = None
+    __slots__ = ("_peering_connections",)
 
     def addPeer(self, vpc):
         self._peering_connections.append(vpc)
@@ -260,6 +440,8 @@ class Vpc(Node):
 
 
 class Az(Node):
+    __slots__ = ()
+
     def __init__(self, parent, json_blob):
         self._local_id = json_blob["ZoneName"]
         self._arn = "arn:aws::{}:{}:vpc/{}/az/{}".format(
@@ -274,6 +456,8 @@ class Az(Node):
 
 
 class Subnet(Node):
+    __slots__ = ()
+
     def __init__(self, parent, json_blob):
         # arn:aws:ec2:region:account-id:subnet/subnet-id
         self._local_id = json_blob["SubnetId"]
@@ -289,13 +473,55 @@ class Subnet(Node):
 
 @add_metaclass(ABCMeta)
 class Leaf(Node):
-    def __init__(self, parent, json_blob):
-        self._isLeaf = True
-        super(Leaf, self).__init__(parent, json_blob)
+    __slots__ = ()
+
+    _isLeaf = True
+
+
+class Placement(object):
+    """
+    A leaf placed in one of its subnets. Resources in several subnets, such as ELBs and
+    RDS instances, have a placement in each of them, which all share the one node rather
+    than copying it. Anything but the arn and the position in the tree is the node's.
+    """
+
+    __slots__ = ("_node", "_subnet", "_arn", "_container", "_leaf_count")
+
+    def __init__(self, node, subnet):
+        self._node = node
+        self._subnet = subnet
+        self._arn = node.get_subnet_arn(subnet)
+        # As for nodes, set by the subnet when the placement is added to it
+        self._container = None
+        self._leaf_count = node.leaf_count
+
+    def __getattr__(self, name):
+        return getattr(self._node, name)
+
+    @property
+    def node(self):
+        return self._node
+
+    @property
+    def arn(self):
+        return self._arn
+
+    @property
+    def subnet(self):
+        return self._subnet
+
+    @property
+    def leaves(self):
+        return [self]
+
+    def cytoscape_data(self, parent_arn=""):
+        response = self._node.cytoscape_data(parent_arn)
+        response["data"]["id"] = self._arn
+        return response
 
 
 class Ec2(Leaf):
-    _ips = None
+    __slots__ = ("_ips",)
 
     @property
     def is_public(self):
@@ -311,12 +537,12 @@ class Ec2(Leaf):
             # connections, we'll assume that each autoscaling instance would have the same connections
             # as others
             self._ips = []
-            private_ips = pyjq.all(
+            private_ips = jq.all(
                 ".NetworkInterfaces[].PrivateIpAddresses[].PrivateIpAddress",
                 self._json_blob,
             )
             self._ips.extend([x for x in private_ips if x is not None])
-            public_ips = pyjq.all(
+            public_ips = jq.all(
                 ".NetworkInterfaces[].PrivateIpAddresses[].Association.PublicIp",
                 self._json_blob,
             )
@@ -325,29 +551,30 @@ class Ec2(Leaf):
 
     @property
     def tags(self):
-        return pyjq.all(".Tags[]", self._json_blob)
+        return jq.all(".Tags[]", self._json_blob)
 
     @property
     def subnets(self):
-        return pyjq.all(".NetworkInterfaces[].SubnetId", self._json_blob)
+        return jq.all(".NetworkInterfaces[].SubnetId", self._json_blob)
 
     @property
     def security_groups(self):
-        return pyjq.all(".SecurityGroups[].GroupId", self._json_blob)
+        return jq.all(".SecurityGroups[].GroupId", self._json_blob)
 
     def __init__(self, parent, json_blob, collapse_by_tag=None, collapse_asgs=True):
         autoscaling_name = []
         if collapse_asgs:
-            autoscaling_name = pyjq.all(
+            autoscaling_name = jq.all(
                 '.Tags[]? | select(.Key == "aws:autoscaling:groupName") | .Value',
                 json_blob,
             )
 
         collapse_by_tag_value = []
         if collapse_by_tag:
-            collapse_by_tag_value = pyjq.all(
-                '.Tags[]? | select(.Key == "{}") | .Value'.format(collapse_by_tag),
+            collapse_by_tag_value = jq.all(
+                ".Tags[]? | select(.Key == $key) | .Value",
                 json_blob,
+                variables={"key": collapse_by_tag},
             )
 
         if autoscaling_name != []:
@@ -364,11 +591,12 @@ class Ec2(Leaf):
             parent.region.name, parent.account.local_id, self._local_id
         )
         self._name = get_name(json_blob, "InstanceId")
+        self._ips = None
         super(Ec2, self).__init__(parent, json_blob)
 
 
 class Elb(Leaf):
-    _subnet = None
+    __slots__ = ()
 
     @property
     def ips(self):
@@ -377,37 +605,30 @@ class Elb(Leaf):
 
     @property
     def tags(self):
-        tags = get_parameter_file(
-            self.region, "elb", "describe-tags", self._json_blob["LoadBalancerName"]
+        return self.region.index.get_resource_tags(
+            "elb",
+            "describe-tags",
+            self._json_blob["LoadBalancerName"],
+            get_described_tags,
         )
-        if tags is None:
-            return []
-        descriptions = tags["TagDescriptions"]
-        if descriptions is None or len(descriptions) == 0:
-            return []
-        return descriptions[0]["Tags"]
 
-    def set_subnet(self, subnet):
-        self._subnet = subnet
-        self._arn = self._arn + "." + subnet.local_id
+    def get_subnet_arn(self, subnet):
+        return self._arn + "." + subnet.local_id
 
     @property
     def subnets(self):
-        if self._subnet:
-            return self._subnet
-        else:
-            return pyjq.all(".Subnets[]", self._json_blob)
+        return jq.all(".Subnets[]", self._json_blob)
 
     @property
     def is_public(self):
-        scheme = pyjq.all(".Scheme", self._json_blob)[0]
+        scheme = jq.all(".Scheme", self._json_blob)[0]
         if scheme == "internet-facing":
             return True
         return False
 
     @property
     def security_groups(self):
-        return pyjq.all(".SecurityGroups[]?", self._json_blob)
+        return jq.all(".SecurityGroups[]?", self._json_blob)
 
     def __init__(self, parent, json_blob):
         self._type = "elb"
@@ -421,7 +642,7 @@ class Elb(Leaf):
 
 
 class Elbv2(Leaf):
-    _subnet = None
+    __slots__ = ()
 
     @property
     def ips(self):
@@ -430,37 +651,30 @@ class Elbv2(Leaf):
 
     @property
     def tags(self):
-        tags = get_parameter_file(
-            self.region, "elbv2", "describe-tags", self._json_blob["LoadBalancerName"]
+        return self.region.index.get_resource_tags(
+            "elbv2",
+            "describe-tags",
+            self._json_blob["LoadBalancerArn"],
+            get_described_tags,
         )
-        if tags is None:
-            return []
-        descriptions = tags["TagDescriptions"]
-        if descriptions is None or len(descriptions) == 0:
-            return []
-        return descriptions[0]["Tags"]
 
-    def set_subnet(self, subnet):
-        self._subnet = subnet
-        self._arn = self._arn + "." + subnet.local_id
+    def get_subnet_arn(self, subnet):
+        return self._arn + "." + subnet.local_id
 
     @property
     def subnets(self):
-        if self._subnet:
-            return self._subnet
-        else:
-            return pyjq.all(".AvailabilityZones[].SubnetId", self._json_blob)
+        return jq.all(".AvailabilityZones[].SubnetId", self._json_blob)
 
     @property
     def is_public(self):
-        scheme = pyjq.all(".Scheme", self._json_blob)[0]
+        scheme = jq.all(".Scheme", self._json_blob)[0]
         if scheme == "internet-facing":
             return True
         return False
 
     @property
     def security_groups(self):
-        return pyjq.all(".SecurityGroups[]?", self._json_blob)
+        return jq.all(".SecurityGroups[]?", self._json_blob)
 
     def __init__(self, parent, json_blob):
         self._type = "elbv2"
@@ -474,7 +688,7 @@ class Elbv2(Leaf):
 
 
 class Rds(Leaf):
-    _subnet = None
+    __slots__ = ()
 
     @property
     def ips(self):
@@ -485,44 +699,35 @@ class Rds(Leaf):
     def can_egress(self):
         return False
 
-    def set_subnet(self, subnet):
-        self._subnet = subnet
-        self._arn = self._arn + "." + subnet.local_id
+    def get_subnet_arn(self, subnet):
+        return self._arn + "." + subnet.local_id
 
     @property
     def subnets(self):
-        if self._subnet:
-            return self._subnet
-        else:
-            return pyjq.all(
-                ".DBSubnetGroup.Subnets[].SubnetIdentifier", self._json_blob
-            )
+        return jq.all(".DBSubnetGroup.Subnets[].SubnetIdentifier", self._json_blob)
 
     @property
     def tags(self):
-        tags = get_parameter_file(
-            self.region,
+        return self.region.index.get_resource_tags(
             "rds",
             "list-tags-for-resource",
             self._json_blob["DBInstanceArn"],
+            lambda tags: tags["TagList"],
         )
-        if tags is None:
-            return []
-        return tags["TagList"]
 
     @property
     def is_public(self):
-        return pyjq.all(".PubliclyAccessible", self._json_blob)[0]
+        return jq.all(".PubliclyAccessible", self._json_blob)[0]
 
     @property
     def security_groups(self):
-        return pyjq.all(".VpcSecurityGroups[].VpcSecurityGroupId", self._json_blob)
+        return jq.all(".VpcSecurityGroups[].VpcSecurityGroupId", self._json_blob)
 
     def __init__(self, parent, json_blob):
         self._type = "rds"
 
         # Check if this is a read-replicable
-        if pyjq.all(".ReadReplicaSourceDBInstanceIdentifier", json_blob) != [None]:
+        if jq.all(".ReadReplicaSourceDBInstanceIdentifier", json_blob) != [None]:
             self._type = "rds_rr"
 
         self._local_id = json_blob["DBInstanceIdentifier"]
@@ -532,9 +737,7 @@ class Rds(Leaf):
 
 
 class VpcEndpoint(Leaf):
-    _subnet = None
-
-    _unrestricted_ingress = False
+    __slots__ = ("_unrestricted_ingress",)
 
     @property
     def can_egress(self):
@@ -552,18 +755,14 @@ class VpcEndpoint(Leaf):
     def tags(self):
         return []
 
-    def set_subnet(self, subnet):
-        self._subnet = subnet
-        self._arn = self._arn + "." + subnet.local_id
+    def get_subnet_arn(self, subnet):
+        return self._arn + "." + subnet.local_id
 
     @property
     def subnets(self):
-        if self._subnet:
-            return self._subnet
-        else:
-            # TODO Has SubnetIds not Subnet names
-            # And in the case of Gateway endpoints, it has only a VPC
-            return pyjq.all(".SubnetIds[]", self._json_blob)
+        # TODO Has SubnetIds not Subnet names
+        # And in the case of Gateway endpoints, it has only a VPC
+        return jq.all(".SubnetIds[]", self._json_blob)
 
     @property
     def is_public(self):
@@ -571,7 +770,7 @@ class VpcEndpoint(Leaf):
 
     @property
     def security_groups(self):
-        return pyjq.all(".Groups[].GroupId", self._json_blob)
+        return jq.all(".Groups[].GroupId", self._json_blob)
 
     def __init__(self, parent, json_blob):
         self._type = "vpc_endpoint"
@@ -582,14 +781,13 @@ class VpcEndpoint(Leaf):
 
         # Need to set the parent, but what was passed in was the region
         assert parent._type == "region"
-        for vpc in parent.children:
-            if vpc.local_id == json_blob["VpcId"]:
-                self._parent = vpc
+        self._parent = parent.get_child(json_blob["VpcId"])
 
         # The ServiceName looks like com.amazonaws.us-east-1.sqs
         # So I want the last section, "sqs"
         self._name = json_blob["ServiceName"][json_blob["ServiceName"].rfind(".") + 1 :]
 
+        self._unrestricted_ingress = False
         if json_blob["VpcEndpointType"] == "Gateway":
             # The Gateway Endpoints don't live in subnets and don't have Security Groups.
             # Access is controlled through their policy, or the S3 bucket policies, or somewhere else.
@@ -618,37 +816,34 @@ class VpcEndpoint(Leaf):
 
 
 class Ecs(Leaf):
+    __slots__ = ()
+
     @property
     def ips(self):
         ips = []
-        for detail in pyjq.all(".attachments[].details[]", self._json_blob):
+        for detail in jq.all(".attachments[].details[]", self._json_blob):
             if detail["name"] == "networkInterfaceId":
-                eni = detail["value"]
-                interfaces_json = query_aws(
-                    self.account, "ec2-describe-network-interfaces", self.region
-                )
-                for interface in interfaces_json["NetworkInterfaces"]:
-                    if interface["NetworkInterfaceId"] == eni:
-
-                        # Get the public IP, if it exists
-                        public_ip = interface.get("Association", {}).get("PublicIp", "")
-                        if public_ip != "":
-                            ips.append(public_ip)
-
-                        # Get the private IP
-                        ips.append(interface["PrivateIpAddress"])
+                interface = self.region.index.get_network_interface(detail["value"])
+                if interface is not None:
+                    # Get the public IP, if it exists
+                    public_ip = interface.get("Association", {}).get("PublicIp", "")
+                    if public_ip != "":
+                        ips.append(public_ip)
+
+                    # Get the private IP
+                    ips.append(interface["PrivateIpAddress"])
         return ips
 
     @property
     def subnets(self):
-        for detail in pyjq.all(".attachments[].details[]", self._json_blob):
+        for detail in jq.all(".attachments[].details[]", self._json_blob):
             if detail["name"] == "subnetId":
                 return [detail["value"]]
         return []
 
     @property
     def tags(self):
-        return pyjq.all(".tags[]", self._json_blob)
+        return jq.all(".tags[]", self._json_blob)
 
     @property
     def is_public(self):
@@ -660,16 +855,12 @@ class Ecs(Leaf):
     @property
     def security_groups(self):
         sgs = []
-        for detail in pyjq.all(".attachments[].details[]", self._json_blob):
+        for detail in jq.all(".attachments[].details[]", self._json_blob):
             if detail["name"] == "networkInterfaceId":
-                eni = detail["value"]
-                interfaces_json = query_aws(
-                    self.account, "ec2-describe-network-interfaces", self.region
-                )
-                for interface in interfaces_json["NetworkInterfaces"]:
-                    if interface["NetworkInterfaceId"] == eni:
-                        for group in interface["Groups"]:
-                            sgs.append(group["GroupId"])
+                interface = self.region.index.get_network_interface(detail["value"])
+                if interface is not None:
+                    for group in interface["Groups"]:
+                        sgs.append(group["GroupId"])
         return sgs
 
     def __init__(self, parent, json_blob):
@@ -685,11 +876,10 @@ class Ecs(Leaf):
 
 
 class Lambda(Leaf):
-    _subnet = None
+    __slots__ = ()
 
-    def set_subnet(self, subnet):
-        self._subnet = subnet
-        self._arn = self._arn + "." + subnet.local_id
+    def get_subnet_arn(self, subnet):
+        return self._arn + "." + subnet.local_id
 
     @property
     def ips(self):
@@ -697,14 +887,11 @@ class Lambda(Leaf):
 
     @property
     def subnets(self):
-        if self._subnet:
-            return self._subnet
-        else:
-            return pyjq.all(".VpcConfig.SubnetIds[]", self._json_blob)
+        return jq.all(".VpcConfig.SubnetIds[]", self._json_blob)
 
     @property
     def tags(self):
-        return pyjq.all(".tags[]?", self._json_blob)
+        return jq.all(".tags[]?", self._json_blob)
 
     @property
     def is_public(self):
@@ -712,7 +899,7 @@ class Lambda(Leaf):
 
     @property
     def security_groups(self):
-        return pyjq.all(".VpcConfig.SecurityGroupIds[]", self._json_blob)
+        return jq.all(".VpcConfig.SecurityGroupIds[]", self._json_blob)
 
     def __init__(self, parent, json_blob):
         self._type = "lambda"
@@ -724,11 +911,10 @@ class Lambda(Leaf):
 
 
 class Redshift(Leaf):
-    _subnet = None
+    __slots__ = ()
 
-    def set_subnet(self, subnet):
-        self._subnet = subnet
-        self._arn = self._arn + "." + subnet.local_id
+    def get_subnet_arn(self, subnet):
+        return self._arn + "." + subnet.local_id
 
     @property
     def ips(self):
@@ -746,49 +932,34 @@ class Redshift(Leaf):
 
     @property
     def subnets(self):
-        if self._subnet:
-            return self._subnet
-        else:
-            # Get the subnets that this cluster can be a part of
-            cluster_subnet_group_name = self._json_blob["ClusterSubnetGroupName"]
-            vpc_id = self._json_blob["VpcId"]
-            subnet_groups_json = query_aws(
-                self.account, "redshift-describe-cluster-subnet-groups", self.region
-            )
-            matched_subnet_group = {}
-            for subnet_group in subnet_groups_json["ClusterSubnetGroups"]:
-                if (
-                    vpc_id == subnet_group["VpcId"]
-                    and cluster_subnet_group_name
-                    == subnet_group["ClusterSubnetGroupName"]
+        # Get the subnets that this cluster can be a part of
+        matched_subnet_group = self.region.index.get_redshift_subnet_group(
+            self._json_blob["VpcId"], self._json_blob["ClusterSubnetGroupName"]
+        )
+        if matched_subnet_group is None:
+            raise Exception("Could not find the subnet group")
+
+        # Get the IDs of those subnets
+        subnet_ids = []
+        for subnet in matched_subnet_group["Subnets"]:
+            subnet_ids.append(subnet["SubnetIdentifier"])
+
+        # Look through the subnets in the regions for ones that match,
+        # then find those subnets that actually have the IPs for the cluster nodes in them
+        subnets_with_cluster_nodes = []
+        for subnet in self.region.index.get_subnets(subnet_ids):
+            # We have a subnet ID that we know the cluster can be part of, now check if there is actually a node there
+            for cluster_node in self._json_blob["ClusterNodes"]:
+                if IPAddress(cluster_node["PrivateIPAddress"]) in IPNetwork(
+                    subnet["CidrBlock"]
                 ):
-                    matched_subnet_group = subnet_group
-            if matched_subnet_group == {}:
-                raise Exception("Could not find the subnet group")
-
-            # Get the IDs of those subnets
-            subnet_ids = []
-            for subnet in matched_subnet_group["Subnets"]:
-                subnet_ids.append(subnet["SubnetIdentifier"])
-
-            # Look through the subnets in the regions for ones that match,
-            # then find those subnets that actually have the IPs for the cluster nodes in them
-            subnets_with_cluster_nodes = []
-            subnets = query_aws(self.account, "ec2-describe-subnets", self.region)
-            for subnet in subnets["Subnets"]:
-                if subnet["SubnetId"] in subnet_ids:
-                    # We have a subnet ID that we know the cluster can be part of, now check if there is actually a node there
-                    for cluster_node in self._json_blob["ClusterNodes"]:
-                        if IPAddress(cluster_node["PrivateIPAddress"]) in IPNetwork(
-                            subnet["CidrBlock"]
-                        ):
-                            subnets_with_cluster_nodes.append(subnet["SubnetId"])
-
-            return subnets_with_cluster_nodes
+                    subnets_with_cluster_nodes.append(subnet["SubnetId"])
+
+        return subnets_with_cluster_nodes
 
     @property
     def tags(self):
-        return pyjq.all(".Tags[]", self._json_blob)
+        return jq.all(".Tags[]", self._json_blob)
 
     @property
     def is_public(self):
@@ -799,7 +970,7 @@ class Redshift(Leaf):
 
     @property
     def security_groups(self):
-        return pyjq.all(".VpcSecurityGroups[].VpcSecurityGroupId", self._json_blob)
+        return jq.all(".VpcSecurityGroups[].VpcSecurityGroupId", self._json_blob)
 
     def __init__(self, parent, json_blob):
         self._type = "redshift"
@@ -807,10 +978,7 @@ class Redshift(Leaf):
         # Set the parent to a VPC
         # Redshift has no subnet
         assert parent._type == "region"
-        self._parent = None
-        for vpc in parent.children:
-            if vpc.local_id == json_blob["VpcId"]:
-                self._parent = vpc
+        self._parent = parent.get_child(json_blob["VpcId"])
         if self._parent is None:
             raise Exception(
                 "Could not find parent for Redshift node, was looking for VPC {}".format(
@@ -825,6 +993,8 @@ class Redshift(Leaf):
 
 
 class ElasticSearch(Leaf):
+    __slots__ = ()
+
     @property
     def ips(self):
         return []
@@ -835,7 +1005,7 @@ class ElasticSearch(Leaf):
 
     @property
     def subnets(self):
-        return pyjq.all(".VPCOptions.SubnetIds[]", self._json_blob)
+        return jq.all(".VPCOptions.SubnetIds[]", self._json_blob)
 
     @property
     def tags(self):
@@ -850,7 +1020,7 @@ class ElasticSearch(Leaf):
 
     @property
     def security_groups(self):
-        return pyjq.all(".VPCOptions.SecurityGroupIds[]", self._json_blob)
+        return jq.all(".VPCOptions.SecurityGroupIds[]", self._json_blob)
 
     def __init__(self, parent, json_blob):
         self._type = "elasticsearch"
@@ -862,6 +1032,8 @@ class ElasticSearch(Leaf):
 
 
 class Cidr(Leaf):
+    __slots__ = ("is_used",)
+
     def ips(self):
         return [self._local_id]
 
@@ -885,9 +1057,7 @@ class Cidr(Leaf):
 
 
 class Connection(object):
-    _source = None
-    _target = None
-    _json = None
+    __slots__ = ("_source", "_target", "_json")
 
     @property
     def source(self):
@@ -1,13 +1,27 @@
 import boto3
+import botocore.session
+from botocore.credentials import DeferredRefreshableCredentials
 
 from utils.strings import slugify
 
 # maximum allowed value, c.f. https://docs.aws.amazon.com/organizations/latest/APIReference/API_ListAccounts.html#API_ListAccounts_RequestSyntax
 MAX_NUM_RESULTS = 20
 
+# Role that AWS Organizations creates in the accounts it creates
+DEFAULT_ROLE_NAME = "OrganizationAccountAccessRole"
 
-def get_organization_accounts():
-    organizations_client = boto3.client("organizations")
+# Default duration of the assumed role sessions, which are renewed as they expire
+DEFAULT_SESSION_DURATION = 3600
+
+
+def get_organization_accounts(session=None, active_only=False):
+    """
+    Returns the accounts of the organization as {"name", "id"}, using the given boto3
+    session, or the default one.
+    """
+    if session is None:
+        session = boto3.Session()
+    organizations_client = session.client("organizations")
     has_more = True
     next_token = None
     accounts = []
@@ -21,9 +35,61 @@ def get_organization_accounts():
             response = organizations_client.list_accounts(MaxResults=MAX_NUM_RESULTS)
 
         for account in response.get("Accounts", []):
+            # Suspended accounts can't be accessed
+            if active_only and account.get("Status", "ACTIVE") != "ACTIVE":
+                continue
             accounts.append({"name": slugify(account["Name"]), "id": account["Id"]})
 
         next_token = response.get("NextToken", None)
         has_more = next_token is not None
 
     return accounts
+
+
+def get_account_session(
+    session,
+    account_id,
+    role_name,
+    session_name="cloudmapper",
+    duration_seconds=DEFAULT_SESSION_DURATION,
+):
+    """
+    Returns a boto3 session for the account, by assuming the role in it for
+    duration_seconds, and again whenever the credentials are about to expire, so
+    collections taking longer than that keep going. The account of the session itself
+    is used as is, as the organization's role usually doesn't exist in the management
+    account.
+    """
+    sts = session.client("sts")
+    if sts.get_caller_identity()["Account"] == account_id:
+        return session
+
+    partition = "aws"
+    if session.region_name and session.region_name.startswith("cn-"):
+        partition = "aws-cn"
+    elif session.region_name and session.region_name.startswith("us-gov-"):
+        partition = "aws-us-gov"
+
+    role_arn = "arn:{}:iam::{}:role/{}".format(partition, account_id, role_name)
+
+    def assume_role():
+        credentials = sts.assume_role(
+            RoleArn=role_arn,
+            RoleSessionName=session_name,
+            DurationSeconds=duration_seconds,
+        )["Credentials"]
+        return {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials["SessionToken"],
+            "expiry_time": credentials["Expiration"].isoformat(),
+        }
+
+    # botocore has no public way to give a session refreshable credentials
+    account_session = botocore.session.Session()
+    account_session._credentials = DeferredRefreshableCredentials(
+        refresh_using=assume_role, method="sts-assume-role"
+    )
+    return boto3.Session(
+        botocore_session=account_session, region_name=session.region_name
+    )
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from shared import json_backend
+
+
+def get_temporary_path(path):
+    """
+    Path a file is written to before being renamed to path. It starts with a dot so a
+    partially written file is never picked up by the globs that read collected data.
+    """
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, ".{}.tmp".format(filename))
+
+
+class HashingWriter(object):
+    """Writes text to a binary file, keeping track of its size and SHA-256"""
+
+    def __init__(self, f):
+        self._f = f
+        self._hash = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self._hash.update(data)
+        self.bytes += len(data)
+        self._f.write(data)
+
+    def get_details(self):
+        return {"bytes": self.bytes, "sha256": self._hash.hexdigest()}
+
+
+def write_atomically(path, text):
+    """
+    Write the file so it either has all of text or, if interrupted, is left as it was.
+    Returns the size and SHA-256 of the file.
+    """
+    temporary_path = get_temporary_path(path)
+    with open(temporary_path, "wb") as f:
+        writer = HashingWriter(f)
+        writer.write(text)
+    os.replace(temporary_path, path)
+    return writer.get_details()
+
+
+class PageWriter(object):
+    """
+    Writes the pages of a paginated response to a file, without keeping them in memory.
+
+    The file has the same contents as json_backend.dumps(data) of the pages merged
+    together, which is the first page with the lists of every later page appended to
+    its lists. The items of each list are spooled to a temporary file as
+    the pages arrive, and are copied into place, followed by an atomic rename, by commit().
+    """
+
+    def __init__(self, path, default=None):
+        self.path = path
+        self.default = default
+        # As json_backend.dumps indents by 4 spaces
+        self.indent = " " * 4
+        # Indentation of the items of a top level list
+        self.item_indent = self.indent * 2
+        self.page_count = 0
+        # Values of the first page that aren't lists
+        self._values = {}
+        # List key -> [spool file, number of items]
+        self._lists = {}
+
+    def add_page(self, page):
+        if self.page_count == 0:
+            for key, value in page.items():
+                if isinstance(value, list):
+                    self._lists[key] = [tempfile.TemporaryFile("w+"), 0]
+                else:
+                    self._values[key] = value
+        self.page_count += 1
+
+        for key, spool in self._lists.items():
+            for item in page.get(key, []):
+                serialized = json_backend.dumps(item, default=self.default).replace(
+                    "\n", "\n" + self.item_indent
+                )
+                spool[0].write(
+                    "{}{}{}".format(
+                        ",\n" if spool[1] else "", self.item_indent, serialized
+                    )
+                )
+                spool[1] += 1
+
+    def get(self, key, default=None):
+        """Value of a key that isn't a list"""
+        return self._values.get(key, default)
+
+    def pop(self, key, default=None):
+        """Remove the key from the output, like dict.pop, except that lists aren't returned"""
+        spool = self._lists.pop(key, None)
+        if spool is not None:
+            spool[0].close()
+        return self._values.pop(key, default)
+
+    def commit(self):
+        """Write the file, and return its size and SHA-256"""
+        temporary_path = get_temporary_path(self.path)
+        keys = sorted(set(self._values) | set(self._lists))
+        with open(temporary_path, "wb") as output:
+            f = HashingWriter(output)
+            f.write("{")
+            for index, key in enumerate(keys):
+                f.write(
+                    "{}\n{}{}: ".format(
+                        "," if index else "", self.indent, json_backend.dumps(key)
+                    )
+                )
+                if key in self._lists:
+                    spool, count = self._lists[key]
+                    if count == 0:
+                        f.write("[]")
+                        continue
+                    f.write("[\n")
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, f)
+                    f.write("\n{}]".format(self.indent))
+                else:
+                    f.write(
+                        json_backend.dumps(
+                            self._values[key], default=self.default
+                        ).replace("\n", "\n" + self.indent)
+                    )
+            f.write("\n}" if keys else "}")
+        os.replace(temporary_path, self.path)
+        self.abort()
+        return f.get_details()
+
+    def abort(self):
+        """Discard the spooled pages"""
+        for spool in self._lists.values():
+            spool[0].close()
+        self._lists = {}
+        self._values = {}
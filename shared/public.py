@@ -1,12 +1,18 @@
 from __future__ import print_function
 import json
 import os
-import pyjq
+from shared import jq
 
 from shared.nodes import Account, Region, is_public_ip
 from commands.prepare import build_data_structure
 from shared.common import get_regions, query_aws
 
+# Port ranges of an IpPermission open to the Internet, for TCP and UDP, and for every protocol
+TCP_UDP_PUBLIC_PORTS = 'select((.IpProtocol=="tcp") or (.IpProtocol=="udp")) | select(.IpRanges[].CidrIp=="0.0.0.0/0") | [.FromPort,.ToPort]'
+ALL_PROTOCOLS_PUBLIC_PORTS = (
+    'select(.IpProtocol=="-1") | select(.IpRanges[].CidrIp=="0.0.0.0/0") | [0,65535]'
+)
+
 
 def regroup_ranges(rgs):
     """
@@ -91,14 +97,14 @@ def get_public_nodes(account, config, use_cache=False):
     warnings = []
 
     # Look at all the edges for ones connected to the public Internet (0.0.0.0/0)
-    for edge in pyjq.all(
+    for edge in jq.all(
         '.[].data|select(.type=="edge")|select(.source=="0.0.0.0/0")', network
     ):
 
         # Find the node at the other end of this edge
         target = {"arn": edge["target"], "account": account["name"]}
-        target_node = pyjq.first(
-            '.[].data|select(.id=="{}")'.format(target["arn"]), network, {}
+        target_node = jq.first(
+            ".[].data|select(.id==$id)", network, {}, variables={"id": target["arn"]}
         )
 
         # Depending on the type of node, identify what the IP or hostname is
@@ -139,9 +145,9 @@ def get_public_nodes(account, config, use_cache=False):
             raise Exception("Unknown type: {}".format(target_node["type"]))
 
         # Check if any protocol is allowed (indicated by IpProtocol == -1)
-        ingress = pyjq.all(".[]", edge.get("node_data", {}))
+        ingress = jq.all(".[]", edge.get("node_data", {}))
 
-        sg_group_allowing_all_protocols = pyjq.first(
+        sg_group_allowing_all_protocols = jq.first(
             '.[]|select(.IpPermissions[]?|.IpProtocol=="-1")|.GroupId', ingress, None
         )
         public_sgs = {}
@@ -161,14 +167,8 @@ def get_public_nodes(account, config, use_cache=False):
         for sg in ingress:
             sg_port_ranges = []
             for ip_permission in sg.get("IpPermissions", []):
-                selection = 'select((.IpProtocol=="tcp") or (.IpProtocol=="udp")) | select(.IpRanges[].CidrIp=="0.0.0.0/0")'
-                sg_port_ranges.extend(
-                    pyjq.all("{}| [.FromPort,.ToPort]".format(selection), ip_permission)
-                )
-                selection = 'select(.IpProtocol=="-1") | select(.IpRanges[].CidrIp=="0.0.0.0/0")'
-                sg_port_ranges.extend(
-                    pyjq.all("{}| [0,65535]".format(selection), ip_permission)
-                )
+                sg_port_ranges.extend(jq.all(TCP_UDP_PUBLIC_PORTS, ip_permission))
+                sg_port_ranges.extend(jq.all(ALL_PROTOCOLS_PUBLIC_PORTS, ip_permission))
             public_sgs[sg["GroupId"]] = {
                 "GroupId": sg["GroupId"],
                 "GroupName": sg["GroupName"],
@@ -184,10 +184,8 @@ def get_public_nodes(account, config, use_cache=False):
             warnings.append(
                 issue_msg.format(
                     json.dumps(
-                        pyjq.all(
-                            '.[]|select((.IpProtocol!="tcp") and (.IpProtocol!="udp"))'.format(
-                                selection
-                            ),
+                        jq.all(
+                            '.[]|select((.IpProtocol!="tcp") and (.IpProtocol!="udp"))',
                             ingress,
                         )
                     ),
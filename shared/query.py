@@ -1,32 +1,286 @@
 import urllib
 import os
+import stat
 import json
+import copy
+import collections
+import threading
+
+from shared import json_backend
+from shared.store import Store
+
+# Total size of the files whose parsed data is kept in memory, which can be set in MB
+# with the CLOUDMAPPER_CACHE_MB environment variable
+CACHE_MAX_BYTES = int(os.environ.get("CLOUDMAPPER_CACHE_MB") or 512) * 1024 * 1024
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError(
+        "Data loaded from account-data is shared by every caller, so copy it before modifying it"
+    )
+
+
+class ReadOnlyDict(dict):
+    """A dict loaded from account-data, which can't be modified as it is cached"""
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class ReadOnlyList(list):
+    """A list loaded from account-data, which can't be modified as it is cached"""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(list(self), memo)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _freeze_list(values):
+    return ReadOnlyList(
+        _freeze_list(value) if type(value) is list else value for value in values
+    )
+
+
+def _freeze_object(pairs):
+    return ReadOnlyDict(
+        (key, _freeze_list(value) if type(value) is list else value)
+        for key, value in pairs
+    )
+
+
+def freeze(data):
+    """Returns the parsed JSON data with ReadOnlyDict and ReadOnlyList in place of dict and list"""
+    data_type = type(data)
+    if data_type is dict:
+        frozen = ReadOnlyDict(data)
+        for key, value in data.items():
+            value_type = type(value)
+            if value_type is dict or value_type is list:
+                dict.__setitem__(frozen, key, freeze(value))
+        return frozen
+    if data_type is list:
+        frozen = ReadOnlyList(data)
+        for index, value in enumerate(data):
+            value_type = type(value)
+            if value_type is dict or value_type is list:
+                list.__setitem__(frozen, index, freeze(value))
+        return frozen
+    return data
+
+
+def load_read_only(f):
+    """json_backend.load, returning ReadOnlyDict and ReadOnlyList in place of dict and list"""
+    return loads_read_only(f.read())
+
+
+def loads_read_only(text):
+    """json_backend.loads, returning ReadOnlyDict and ReadOnlyList in place of dict and list"""
+    if json_backend.get_backend() == "json":
+        # Faster than freezing the data once parsed
+        data = json.loads(text, object_pairs_hook=_freeze_object)
+        if type(data) is list:
+            return _freeze_list(data)
+        return data
+    return freeze(json_backend.loads(text))
+
+
+class FileCache(object):
+    """
+    LRU cache of parsed JSON files, keyed by path. A file is parsed again when its
+    modification time or size changes, whether it is read from disk or from the store.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # path -> (modification time, size, data), from least to most recently used
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, path, mtime_ns, size, read):
+        """Returns the parsed file, calling read() for its contents when not cached"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[:2] == (mtime_ns, size):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        data = loads_read_only(read())
+
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[path] = (mtime_ns, size, data)
+            self._bytes += size
+            # Always keep the file just loaded
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+        return data
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "files": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+
+_cache = FileCache(CACHE_MAX_BYTES)
+
+# Store the collected data is read from, when set by use_store
+_store = None
+
+
+def get_cache_stats():
+    """Hits, misses and evictions of the cache used by query_aws and get_parameter_file"""
+    return _cache.get_stats()
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def use_store(path):
+    """
+    Read the collected data from the database built by the index command, instead of
+    the files of account-data, or from the files again when path is None
+    """
+    global _store
+    if path is not None and not os.path.isfile(path):
+        raise ValueError(
+            "The index {} doesn't exist, create it with the index command".format(path)
+        )
+    _store = Store(path, read_only=True) if path is not None else None
+    _cache.clear()
+
+
+def _read_file(file_name):
+    with open(file_name, "rb") as f:
+        return f.read()
+
+
+def get_account_file(account_name, path, min_size=0):
+    """
+    Returns the data of the file of account-data/<account_name>/, such as
+    us-east-1/ec2-describe-vpcs.json, or None if it doesn't exist or is smaller than
+    min_size. The data is cached and shared by every caller, so it is read-only.
+    """
+    file_name = "account-data/{}/{}".format(account_name, path)
+    if _store is not None:
+        details = _store.get_file_details(account_name, path)
+        if details is None or details[1] < min_size:
+            return None
+        return _cache.load(
+            file_name,
+            details[0],
+            details[1],
+            lambda: _store.read_file(account_name, path),
+        )
+
+    try:
+        file_stat = os.stat(file_name)
+    except OSError:
+        return None
+    if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < min_size:
+        return None
+    return _cache.load(
+        file_name,
+        file_stat.st_mtime_ns,
+        file_stat.st_size,
+        lambda: _read_file(file_name),
+    )
+
+
+def has_account_file(account_name, path):
+    if _store is not None:
+        return _store.get_file_details(account_name, path) is not None
+    return os.path.isfile("account-data/{}/{}".format(account_name, path))
+
+
+def list_account_files(account_name, directory):
+    """Returns the names of the files in a directory of account-data/<account_name>/"""
+    if _store is not None:
+        return _store.list_files(account_name, directory)
+    directory = "account-data/{}/{}".format(account_name, directory)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(directory)
+        if not name.startswith(".") and os.path.isfile(os.path.join(directory, name))
+    )
 
 
 def query_aws(account, query, region=None):
+    """
+    Returns the collected data, which is cached and shared by every caller, so it is
+    read-only.
+    """
     if not region:
-        file_name = "account-data/{}/{}.json".format(account.name, query)
+        path = "{}.json".format(query)
     else:
         if not isinstance(region, str):
             region = region.name
-        file_name = "account-data/{}/{}/{}.json".format(account.name, region, query)
-    if os.path.isfile(file_name):
-        return json.load(open(file_name))
-    else:
+        path = "{}/{}.json".format(region, query)
+    data = get_account_file(account.name, path)
+    if data is None and not has_account_file(account.name, path):
         return {}
+    return data
 
 
 def get_parameter_file(region, service, function, parameter_value):
-    file_name = "account-data/{}/{}/{}/{}".format(
+    """
+    Returns the collected data, which is cached and shared by every caller, so it is
+    read-only.
+    """
+    # Files of 4 bytes or fewer, such as {}, have no data
+    return get_account_file(
         region.account.name,
-        region.name,
-        "{}-{}".format(service, function),
-        urllib.parse.quote_plus(parameter_value),
+        "{}/{}-{}/{}".format(
+            region.name,
+            service,
+            function,
+            urllib.parse.quote_plus(parameter_value),
+        ),
+        min_size=5,
     )
-    if not os.path.isfile(file_name):
-        return None
-    if os.path.getsize(file_name) <= 4:
-        return None
 
-    # Load the json data from the file
-    return json.load(open(file_name))
+
+use_store(os.environ.get("CLOUDMAPPER_STORE") or None)
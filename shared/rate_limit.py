@@ -0,0 +1,198 @@
+import threading
+import time
+
+# Error codes AWS services use to signal that requests are being made too quickly.
+# LimitExceededException is not included, as it is a quota error for most services.
+THROTTLING_ERROR_CODES = set(
+    [
+        "Throttling",
+        "ThrottlingException",
+        "ThrottledException",
+        "RequestThrottledException",
+        "RequestThrottled",
+        "TooManyRequestsException",
+        "ProvisionedThroughputExceededException",
+        "RequestLimitExceeded",
+        "BandwidthLimitExceeded",
+        "EC2ThrottledException",
+        "SlowDown",
+        "PriorRequestNotComplete",
+    ]
+)
+
+
+def is_throttling_error(error_code):
+    return error_code in THROTTLING_ERROR_CODES
+
+
+class TokenBucket(object):
+    """
+    Token bucket whose rate adapts to throttling: it grows additively while requests
+    succeed and is halved when requests are throttled (AIMD).
+    """
+
+    # Seconds after a decrease during which further throttles are attributed to the same
+    # burst of requests, so concurrent failures only halve the rate once.
+    DECREASE_COOLDOWN = 1.0
+
+    def __init__(self, rate, min_rate=0.5, max_rate=None, increase=1.0):
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        # Requests/second added to the rate for each second of successful requests
+        self.increase = increase
+
+        self.requests = 0
+        self.throttles = 0
+        self.first_request = None
+        self.last_request = None
+
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._last_refill = time.time()
+        self._last_decrease = 0
+
+    def _refill(self, now):
+        # Allow a burst of up to one second's worth of requests
+        self._tokens = min(
+            max(self.rate, 1.0), self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+    def acquire(self):
+        """Block until a request can be made"""
+        while True:
+            with self._lock:
+                now = time.time()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.requests += 1
+                    if self.first_request is None:
+                        self.first_request = now
+                    self.last_request = now
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttles += 1
+            now = time.time()
+            if now - self._last_decrease < self.DECREASE_COOLDOWN:
+                return
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate / 2)
+            # Drop any saved up burst
+            self._tokens = min(self._tokens, 0)
+
+
+class RateLimiter(object):
+    """
+    Token buckets for each (service, region), shared by every thread making calls.
+    An account_rate additionally caps the requests per second across every service
+    and region, as a budget for the account.
+    """
+
+    def __init__(self, rate, account_rate=None):
+        self.rate = rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._account_bucket = None
+        if account_rate:
+            # A fixed budget, so it isn't adapted to throttling
+            self._account_bucket = TokenBucket(
+                account_rate, min_rate=account_rate, max_rate=account_rate
+            )
+
+    def bucket(self, service, region):
+        with self._lock:
+            key = (service, region)
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.rate)
+            return self._buckets[key]
+
+    def instrument_client(self, client, service, region):
+        """
+        Hook the botocore client so every HTTP request it sends, including pages and
+        botocore's own retries, waits for a token, and its responses adjust the rate.
+        """
+        bucket = self.bucket(service, region)
+
+        account_bucket = self._account_bucket
+
+        def before_send(**kwargs):
+            bucket.acquire()
+            if account_bucket is not None:
+                account_bucket.acquire()
+
+        def needs_retry(response=None, **kwargs):
+            if response is None:
+                # Connection errors and the like say nothing about throttling
+                return
+            http_response, parsed = response
+            error_code = parsed.get("Error", {}).get("Code", "")
+            if is_throttling_error(error_code):
+                bucket.on_throttle()
+            elif http_response.status_code < 400:
+                bucket.on_success()
+
+        client.meta.events.register("before-send", before_send)
+        client.meta.events.register("needs-retry", needs_retry)
+
+    def get_service_stats(self):
+        """Returns {service: {"requests", "throttles", "rate"}}, where rate is the effective requests per second"""
+        with self._lock:
+            buckets = list(self._buckets.items())
+
+        stats = {}
+        for (service, _), bucket in buckets:
+            if bucket.requests == 0:
+                continue
+            service_stats = stats.setdefault(
+                service,
+                {"requests": 0, "throttles": 0, "first": None, "last": None},
+            )
+            service_stats["requests"] += bucket.requests
+            service_stats["throttles"] += bucket.throttles
+            if (
+                service_stats["first"] is None
+                or bucket.first_request < service_stats["first"]
+            ):
+                service_stats["first"] = bucket.first_request
+            if (
+                service_stats["last"] is None
+                or bucket.last_request > service_stats["last"]
+            ):
+                service_stats["last"] = bucket.last_request
+
+        for service_stats in stats.values():
+            duration = service_stats.pop("last") - service_stats.pop("first")
+            # A single request has no duration, so just report the count
+            service_stats["rate"] = (
+                service_stats["requests"] / duration
+                if duration > 0
+                else float(service_stats["requests"])
+            )
+        return stats
+
+    def print_report(self):
+        stats = self.get_service_stats()
+        if len(stats) == 0:
+            return
+        print("Request rates:")
+        for service, service_stats in sorted(
+            stats.items(), key=lambda item: item[1]["requests"], reverse=True
+        ):
+            print(
+                "  {}: {} requests, {} throttled, {:.1f} requests/second".format(
+                    service,
+                    service_stats["requests"],
+                    service_stats["throttles"],
+                    service_stats["rate"],
+                )
+            )
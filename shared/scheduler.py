@@ -0,0 +1,184 @@
+import threading
+import collections
+import functools
+
+
+class CallScheduler(object):
+    """
+    Runs collect calls on a bounded pool of worker threads.
+
+    Calls start in the order they were submitted, except that a call is held back while
+    its region, or its service in that region, already has the maximum number of calls in flight.
+    With a single worker, calls are run immediately in the calling thread, which
+    matches the original serial behavior.
+    """
+
+    def __init__(self, workers=1, max_per_region=None, max_per_service=None):
+        self.workers = workers
+        self.max_per_region = max_per_region
+        self.max_per_service = max_per_service
+
+        self._condition = threading.Condition()
+        # (region, service) -> deque of (sequence number, function, args, callback)
+        self._queues = collections.OrderedDict()
+        self._in_flight_regions = collections.Counter()
+        self._in_flight_services = collections.Counter()
+        self._sequence = 0
+        self._outstanding = 0
+        self._errors = []
+        self._threads = []
+        self._shutdown = False
+
+    @property
+    def is_concurrent(self):
+        return self.workers > 1
+
+    def submit(self, region, service, function, *args, callback=None):
+        """Queue function(*args) to be run, and then callback() once it has finished"""
+        if not self.is_concurrent:
+            try:
+                function(*args)
+            finally:
+                if callback is not None:
+                    callback()
+            return
+
+        with self._condition:
+            self._sequence += 1
+            self._queues.setdefault((region, service), collections.deque()).append(
+                (self._sequence, function, args, callback)
+            )
+            self._outstanding += 1
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+
+    def wait(self):
+        """Block until every submitted call has finished, and raise the first error seen"""
+        with self._condition:
+            while self._outstanding > 0:
+                self._condition.wait()
+            if self._errors:
+                error = self._errors[0]
+                self._errors = []
+                raise error
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _is_allowed(self, key):
+        region, _ = key
+        if (
+            self.max_per_region
+            and self._in_flight_regions[region] >= self.max_per_region
+        ):
+            return False
+        if (
+            self.max_per_service
+            and self._in_flight_services[key] >= self.max_per_service
+        ):
+            return False
+        return True
+
+    def _next_call(self):
+        # Pick the oldest call among the (region, service) queues that are under their limits.
+        # This is linear in the number of queues, not the number of calls.
+        selected_key = None
+        for key, queue in self._queues.items():
+            if not queue or not self._is_allowed(key):
+                continue
+            if selected_key is None or queue[0][0] < self._queues[selected_key][0][0]:
+                selected_key = key
+        if selected_key is None:
+            return None, None
+
+        call = self._queues[selected_key].popleft()
+        if not self._queues[selected_key]:
+            del self._queues[selected_key]
+        return selected_key, call
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                key, call = self._next_call()
+                while call is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait()
+                    key, call = self._next_call()
+                self._in_flight_regions[key[0]] += 1
+                self._in_flight_services[key] += 1
+
+            _, function, args, callback = call
+            try:
+                try:
+                    function(*args)
+                finally:
+                    if callback is not None:
+                        callback()
+            except Exception as e:
+                with self._condition:
+                    self._errors.append(e)
+            finally:
+                with self._condition:
+                    self._in_flight_regions[key[0]] -= 1
+                    self._in_flight_services[key] -= 1
+                    self._outstanding -= 1
+                    self._condition.notify_all()
+
+
+class CallGroup(object):
+    """
+    Submits calls to a CallScheduler on behalf of one unit of work, and runs on_done once
+    the unit has been closed and every call submitted through it has finished.
+    Calls that start an asynchronous job can be given to a JobPoller with submit_job,
+    in which case the unit also waits for the job to finish.
+    """
+
+    def __init__(self, scheduler, on_done, poller=None):
+        self._scheduler = scheduler
+        self._on_done = on_done
+        self._poller = poller
+        self._lock = threading.Lock()
+        # Starts at one so the group can't finish while calls are still being submitted
+        self._pending = 1
+
+    def submit(self, region, service, function, *args):
+        with self._lock:
+            self._pending += 1
+        self._scheduler.submit(
+            region, service, function, *args, callback=self._finished
+        )
+
+    def submit_job(
+        self, region, service, function, *args, on_timeout=None, max_wait=None
+    ):
+        """Poll function(*args) until it returns True"""
+        with self._lock:
+            self._pending += 1
+        self._poller.add(
+            region,
+            service,
+            functools.partial(function, *args),
+            self._finished,
+            on_timeout,
+            max_wait,
+        )
+
+    def close(self):
+        """Signal that no more calls will be submitted"""
+        self._finished()
+
+    def _finished(self):
+        with self._lock:
+            self._pending -= 1
+            is_done = self._pending == 0
+        if is_done:
+            self._on_done()
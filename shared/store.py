@@ -0,0 +1,340 @@
+"""
+SQLite database of the files collected in account-data, built by the index command.
+
+The files table has one row per collected file, with its contents, and the resources
+table one row per resource found in those files, such as each of the Vpcs of
+ec2-describe-vpcs.json, with its ARN, id and name extracted so resources can be looked up
+across accounts.
+"""
+import json
+import os
+import sqlite3
+import threading
+import urllib.parse
+
+from shared import json_backend
+
+DEFAULT_PATH = os.path.join("account-data", "index.db")
+
+# Lists whose items hold the list of resources, such as the Instances of Reservations
+NESTED_LISTS = {"Reservations": "Instances"}
+
+# Files of account-data that weren't collected from AWS
+IGNORED_FILES = set(["manifest.json", "collect.log"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    account TEXT NOT NULL,
+    -- Relative to account-data/<account>/, such as us-east-1/ec2-describe-vpcs.json
+    path TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    region TEXT,
+    service TEXT,
+    action TEXT,
+    -- Resource the call was made for, such as the bucket of s3-get-bucket-policy
+    parameter TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account, path)
+);
+CREATE INDEX IF NOT EXISTS files_directory ON files (account, directory);
+CREATE INDEX IF NOT EXISTS files_action ON files (service, action);
+
+CREATE TABLE IF NOT EXISTS resources (
+    account TEXT NOT NULL,
+    path TEXT NOT NULL,
+    region TEXT,
+    service TEXT,
+    action TEXT,
+    -- List of the file the resource is in, such as Vpcs, or NULL for the whole file
+    list TEXT,
+    position INTEGER,
+    arn TEXT,
+    id TEXT,
+    name TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_file ON resources (account, path);
+CREATE INDEX IF NOT EXISTS resources_arn ON resources (arn);
+CREATE INDEX IF NOT EXISTS resources_id ON resources (id);
+CREATE INDEX IF NOT EXISTS resources_action ON resources (service, action);
+"""
+
+
+def parse_path(path):
+    """
+    Returns the region, service, action and parameter of a file from its path relative
+    to the account directory, such as us-east-1/s3-get-bucket-policy/my%2Bbucket
+    """
+    parts = path.split("/")
+    name = parts[1] if len(parts) > 1 else parts[0]
+    if name.endswith(".json"):
+        name = name[: -len(".json")]
+    if len(parts) == 1:
+        # Such as describe-regions.json, which isn't collected per region
+        return None, None, name, None
+
+    service, _, action = name.partition("-")
+    parameter = None
+    if len(parts) > 2:
+        parameter = "/".join(urllib.parse.unquote_plus(part) for part in parts[2:])
+    return parts[0], service, action, parameter
+
+
+def _find_value(item, names, suffixes, prefix=""):
+    for name in names:
+        value = item.get(name)
+        if isinstance(value, str) and value.startswith(prefix):
+            return value
+    for name in sorted(item):
+        if name.endswith(suffixes):
+            value = item[name]
+            if isinstance(value, str) and value.startswith(prefix):
+                return value
+    return None
+
+
+def get_resource_keys(item, list_name=""):
+    """Returns the ARN, id and name of a resource, such as an item of Vpcs"""
+    singular = list_name[:-1] if list_name.endswith("s") else list_name
+    arn = _find_value(
+        item, [singular + "Arn", "Arn", "ARN", "arn"], ("Arn", "ARN"), prefix="arn:"
+    )
+    resource_id = _find_value(item, [singular + "Id", "Id", "id"], ("Id",))
+    name = _find_value(item, [singular + "Name", "Name", "name"], ("Name",))
+    return arn, resource_id, name
+
+
+def get_resources(data, parameter):
+    """
+    Returns (list, position, arn, id, name, resource) for each resource of a file, which
+    are the items of its lists of objects. Files of calls made for a resource, without
+    such lists, are a resource themselves.
+    """
+    resources = []
+    if isinstance(data, dict):
+        for list_name, values in sorted(data.items()):
+            if not isinstance(values, list):
+                continue
+            nested_list_name = NESTED_LISTS.get(list_name)
+            if nested_list_name is not None:
+                values = [
+                    nested_item
+                    for item in values
+                    if isinstance(item, dict)
+                    for nested_item in item.get(nested_list_name, [])
+                ]
+                list_name = nested_list_name
+            for position, item in enumerate(values):
+                if isinstance(item, dict):
+                    resources.append(
+                        (list_name, position)
+                        + get_resource_keys(item, list_name)
+                        + (item,)
+                    )
+    if not resources and parameter is not None:
+        arn, resource_id, name = (None, None, None)
+        if isinstance(data, dict):
+            arn, resource_id, name = get_resource_keys(data)
+        if parameter.startswith("arn:"):
+            arn = parameter
+        resources.append((None, None, arn, resource_id or parameter, name, data))
+    return resources
+
+
+class Store(object):
+    """
+    Reads and writes the database. A connection is opened per process, as collections
+    of accounts are run in subprocesses, and shared by its threads.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            if self.read_only:
+                connection = sqlite3.connect(
+                    "file:{}?mode=ro".format(urllib.parse.quote(self.path)),
+                    uri=True,
+                    check_same_thread=False,
+                )
+            else:
+                connection = sqlite3.connect(self.path, check_same_thread=False)
+                connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def execute(self, sql, parameters=()):
+        """Returns the rows of a query"""
+        with self._lock:
+            return self._connect().execute(sql, parameters).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def get_file_details(self, account_name, path):
+        """Returns the (mtime_ns, size) of the file, or None if it wasn't indexed"""
+        rows = self.execute(
+            "SELECT mtime_ns, size FROM files WHERE account = ? AND path = ?",
+            (account_name, path),
+        )
+        return rows[0] if rows else None
+
+    def read_file(self, account_name, path):
+        rows = self.execute(
+            "SELECT data FROM files WHERE account = ? AND path = ?",
+            (account_name, path),
+        )
+        return rows[0][0] if rows else None
+
+    def list_files(self, account_name, directory):
+        """Returns the names of the files in the directory, sorted"""
+        rows = self.execute(
+            "SELECT path FROM files WHERE account = ? AND directory = ? ORDER BY path",
+            (account_name, directory),
+        )
+        return [row[0].rsplit("/", 1)[-1] for row in rows]
+
+    def find_resources(
+        self, accounts=None, arn=None, resource_id=None, service=None, action=None
+    ):
+        """
+        Returns the resources matching every criteria given, across accounts, as dicts
+        with their account, region, service, action, arn, id, name and data
+        """
+        conditions = []
+        parameters = []
+        for column, value in [
+            ("arn", arn),
+            ("id", resource_id),
+            ("service", service),
+            ("action", action),
+        ]:
+            if value is not None:
+                conditions.append("{} = ?".format(column))
+                parameters.append(value)
+        if accounts is not None:
+            conditions.append(
+                "account IN ({})".format(", ".join("?" for _ in accounts))
+            )
+            parameters.extend(accounts)
+
+        sql = "SELECT account, region, service, action, arn, id, name, data FROM resources"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY account, path, position"
+
+        columns = ["account", "region", "service", "action", "arn", "id", "name"]
+        resources = []
+        for row in self.execute(sql, parameters):
+            resource = dict(zip(columns, row))
+            resource["data"] = json_backend.loads(row[-1])
+            resources.append(resource)
+        return resources
+
+    def index_account(self, account_name, account_path):
+        """
+        Adds the files of the account directory that were added or changed since it was
+        last indexed, and removes those that no longer exist.
+        Returns counts of the files indexed, unchanged, removed and skipped, and of the
+        resources added.
+        """
+        counts = {
+            "indexed": 0,
+            "unchanged": 0,
+            "removed": 0,
+            "skipped": 0,
+            "resources": 0,
+        }
+        indexed = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.execute(
+                "SELECT path, mtime_ns, size FROM files WHERE account = ?",
+                (account_name,),
+            )
+        }
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                found = set()
+                for directory, directory_names, file_names in os.walk(account_path):
+                    # Skip temporary files
+                    directory_names[:] = [
+                        name for name in directory_names if not name.startswith(".")
+                    ]
+                    for file_name in file_names:
+                        if file_name.startswith(".") or file_name in IGNORED_FILES:
+                            continue
+                        file_path = os.path.join(directory, file_name)
+                        path = os.path.relpath(file_path, account_path).replace(
+                            os.sep, "/"
+                        )
+                        found.add(path)
+                        stat = os.stat(file_path)
+                        if indexed.get(path) == (stat.st_mtime_ns, stat.st_size):
+                            counts["unchanged"] += 1
+                            continue
+
+                        with open(file_path, "rb") as f:
+                            contents = f.read()
+                        try:
+                            text = contents.decode("utf-8")
+                            data = json_backend.loads(text)
+                        except ValueError:
+                            counts["skipped"] += 1
+                            continue
+
+                        region, service, action, parameter = parse_path(path)
+                        self._delete_file(connection, account_name, path)
+                        connection.execute(
+                            "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (
+                                account_name,
+                                path,
+                                path.rsplit("/", 1)[0] if "/" in path else "",
+                                region,
+                                service,
+                                action,
+                                parameter,
+                                stat.st_size,
+                                stat.st_mtime_ns,
+                                text,
+                            ),
+                        )
+                        resources = get_resources(data, parameter)
+                        connection.executemany(
+                            "INSERT INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            [
+                                (account_name, path, region, service, action)
+                                + resource[:5]
+                                + (json.dumps(resource[5], sort_keys=True),)
+                                for resource in resources
+                            ],
+                        )
+                        counts["indexed"] += 1
+                        counts["resources"] += len(resources)
+
+                for path in set(indexed) - found:
+                    self._delete_file(connection, account_name, path)
+                    counts["removed"] += 1
+        return counts
+
+    def _delete_file(self, connection, account_name, path):
+        connection.execute(
+            "DELETE FROM files WHERE account = ? AND path = ?", (account_name, path)
+        )
+        connection.execute(
+            "DELETE FROM resources WHERE account = ? AND path = ?",
+            (account_name, path),
+        )
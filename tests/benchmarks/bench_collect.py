@@ -0,0 +1,268 @@
+"""
+Benchmark for the collect command that runs entirely offline.
+
+AWS is replaced by a stub session whose clients replay the responses recorded in an
+existing account-data directory (the demo data by default), with a fixed delay per call
+to stand in for network latency. The same collection is run serially and with a pool of
+workers so the speedup can be compared.
+
+Usage:
+    python -m tests.benchmarks.bench_collect --workers 16 --latency 0.05
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.parse
+
+import yaml
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+
+from commands.collect import collect_runners, make_directory
+from shared.scheduler import CallScheduler
+from shared.rate_limit import RateLimiter
+from shared.client_pool import ClientPool
+from shared.manifest import Manifest
+from shared.circuit_breaker import CircuitBreakers
+
+ACCOUNT_NAME = "bench"
+DEFAULT_REGION = "us-east-1"
+REGION_NAMES = [
+    "us-east-1",
+    "us-east-2",
+    "us-west-1",
+    "us-west-2",
+    "eu-west-1",
+    "eu-west-2",
+    "eu-central-1",
+    "ap-southeast-1",
+    "ap-southeast-2",
+    "ap-northeast-1",
+    "sa-east-1",
+    "ca-central-1",
+]
+
+
+class StubServiceModel(object):
+    def __init__(self, service_name):
+        self.service_name = service_name
+
+
+class StubOperationModel(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class StubMeta(object):
+    def __init__(self, service_name):
+        self.service_model = StubServiceModel(service_name)
+        self.events = HierarchicalEmitter()
+
+
+class StubHttpResponse(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class StubClient(object):
+    """Replays recorded responses for a single service and region"""
+
+    def __init__(self, session, service, region_name):
+        self.meta = StubMeta(service)
+        self._session = session
+        self._service = service
+        self._region_name = region_name
+
+    def can_paginate(self, method_to_call):
+        return False
+
+    def __getattr__(self, method_to_call):
+        def function(**parameters):
+            # Emit the events botocore sends around each HTTP request
+            event_suffix = "{}.{}".format(self._service, method_to_call)
+            model = StubOperationModel(method_to_call)
+            self.meta.events.emit("before-parameter-build." + event_suffix, model=model)
+            self.meta.events.emit("before-send." + event_suffix, request=None)
+            try:
+                response = self._session.replay(
+                    self._service, self._region_name, method_to_call, parameters
+                )
+            except ClientError as e:
+                self.meta.events.emit(
+                    "needs-retry." + event_suffix,
+                    response=(StubHttpResponse(404), e.response),
+                )
+                self.meta.events.emit(
+                    "after-call." + event_suffix, model=model, parsed=e.response
+                )
+                raise
+            self.meta.events.emit(
+                "needs-retry." + event_suffix,
+                response=(StubHttpResponse(200), response),
+            )
+            self.meta.events.emit(
+                "after-call." + event_suffix, model=model, parsed=response
+            )
+            return response
+
+        return function
+
+
+class StubSession(object):
+    """Stands in for a boto3.Session"""
+
+    def __init__(self, recorded_dir, regions, latency):
+        self.recorded_dir = recorded_dir
+        self.regions = regions
+        self.latency = latency
+        self.calls = 0
+
+    def client(self, service, region_name=None, config=None):
+        return StubClient(self, service, region_name or DEFAULT_REGION)
+
+    def get_available_regions(self, service):
+        return self.regions
+
+    def replay(self, service, region_name, method_to_call, parameters):
+        self.calls += 1
+        time.sleep(self.latency)
+
+        # Regions without recorded data reuse the recordings of the default region
+        region_dir = os.path.join(self.recorded_dir, region_name)
+        if not os.path.isdir(region_dir):
+            region_dir = os.path.join(self.recorded_dir, DEFAULT_REGION)
+
+        action = "{}-{}".format(service, method_to_call.replace("_", "-"))
+        candidates = [os.path.join(region_dir, action + ".json")]
+        values = []
+        for value in parameters.values():
+            if isinstance(value, list) and len(value) > 0:
+                value = value[0]
+            if isinstance(value, str):
+                values.append(urllib.parse.quote_plus(value))
+                candidates.append(os.path.join(region_dir, action, values[-1]))
+        # Custom collections nest their files, ex. ecs-describe-tasks/<cluster>/<task>
+        if len(values) > 1:
+            candidates.append(os.path.join(region_dir, action, *values))
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                with open(candidate, "r") as f:
+                    return json.load(f)
+
+        raise ClientError(
+            {
+                "Error": {
+                    "Code": "ResourceNotFoundException",
+                    "Message": "No recorded response",
+                }
+            },
+            method_to_call,
+        )
+
+
+def run_collection(
+    collect_commands, recorded_dir, regions, latency, workers, rate_limit
+):
+    """Collects into a fresh temporary directory and returns (seconds, calls, clients, summary)"""
+    session = StubSession(recorded_dir, regions, latency)
+    region_list = {"Regions": [{"RegionName": r} for r in regions]}
+    summary = []
+
+    working_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(working_dir)
+        make_directory("account-data")
+        make_directory("account-data/{}".format(ACCOUNT_NAME))
+        with open(
+            "account-data/{}/describe-regions.json".format(ACCOUNT_NAME), "w"
+        ) as f:
+            json.dump(region_list, f)
+        for region in regions:
+            make_directory("account-data/{}/{}".format(ACCOUNT_NAME, region))
+
+        scheduler = CallScheduler(workers, 16, 4)
+        rate_limiter = RateLimiter(rate_limit) if rate_limit > 0 else None
+        clients = ClientPool(
+            session, rate_limiter=rate_limiter, circuit_breakers=CircuitBreakers(5)
+        )
+        manifest = Manifest("account-data/{}".format(ACCOUNT_NAME))
+        start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                collect_runners(
+                    clients,
+                    ACCOUNT_NAME,
+                    region_list,
+                    DEFAULT_REGION,
+                    collect_commands,
+                    scheduler,
+                    summary,
+                    manifest,
+                )
+            finally:
+                scheduler.shutdown()
+                manifest.save()
+        elapsed = time.time() - start
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(working_dir)
+
+    return elapsed, session.calls, clients.clients_created, summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--recorded",
+        help="account-data directory of the recorded responses to replay",
+        default="account-data/demo",
+    )
+    parser.add_argument("--regions", help="Number of regions", default=4, type=int)
+    parser.add_argument(
+        "--latency", help="Seconds to delay each call", default=0.02, type=float
+    )
+    parser.add_argument(
+        "--workers", help="Workers for the concurrent run", default=16, type=int
+    )
+    parser.add_argument(
+        "--rate-limit",
+        help="Starting requests per second per service and region (0 to disable)",
+        default=25,
+        type=float,
+    )
+    args = parser.parse_args()
+
+    with open("collect_commands.yaml", "r") as f:
+        collect_commands = yaml.safe_load(f)
+    recorded_dir = os.path.abspath(args.recorded)
+    regions = REGION_NAMES[: args.regions]
+
+    results = {}
+    for workers in [1, args.workers]:
+        elapsed, calls, clients_created, summary = run_collection(
+            collect_commands,
+            recorded_dir,
+            regions,
+            args.latency,
+            workers,
+            args.rate_limit,
+        )
+        failures = len([c for c in summary if "exception" in c])
+        results[workers] = elapsed
+        print(
+            "workers={:<3} {:8.2f}s  {} calls made, {} clients created, {} APIs summarized, {} errors".format(
+                workers, elapsed, calls, clients_created, len(summary), failures
+            )
+        )
+
+    print("Speedup: {:.1f}x".format(results[1] / results[args.workers]))
+
+
+if __name__ == "__main__":
+    main()
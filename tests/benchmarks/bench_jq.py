@@ -0,0 +1,110 @@
+"""
+Benchmark for the jq expressions run for each node when preparing the network diagram.
+
+Each expression is run over synthetic instances and security groups with pyjq, which
+compiles it for every call, and with shared.jq, checking that both return the same values.
+
+Usage:
+    python -m tests.benchmarks.bench_jq --instances 1000
+"""
+import argparse
+import time
+
+import pyjq
+
+from shared import jq
+from tests.benchmarks.bench_json import make_instance, make_security_group
+
+# (expression, variables, whether it is run on each instance or on the security groups)
+EXPRESSIONS = [
+    (".NetworkInterfaces[].PrivateIpAddresses[].PrivateIpAddress", None, "instance"),
+    (
+        ".NetworkInterfaces[].PrivateIpAddresses[].Association.PublicIp",
+        None,
+        "instance",
+    ),
+    (".SecurityGroups[].GroupId", None, "instance"),
+    (".Tags[]", None, "instance"),
+    (
+        '.Tags[]? | select(.Key == "aws:autoscaling:groupName") | .Value',
+        None,
+        "instance",
+    ),
+    (".Tags[]? | select(.Key == $key) | .Value", {"key": "env"}, "instance"),
+    (".IpPermissions[].IpRanges[].CidrIp", None, "security_group"),
+    (".IpPermissions[].UserIdGroupPairs[].GroupId", None, "security_group"),
+    (
+        ".SecurityGroups[]? | select(.VpcId == $vpc_id)",
+        {"vpc_id": "vpc-00000001"},
+        "security_groups",
+    ),
+    # Not evaluated in Python, so only the compiled program is cached
+    (".Tags | length", None, "instance"),
+]
+
+
+def best_of(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--instances", help="Number of instances", default=1000, type=int
+    )
+    parser.add_argument("--repeat", help="Runs of each measure", default=3, type=int)
+    args = parser.parse_args()
+
+    instances = [make_instance(index) for index in range(args.instances)]
+    security_groups = [make_security_group(index) for index in range(200)]
+    inputs = {
+        "instance": instances,
+        "security_group": security_groups,
+        # As get_sgs runs it once per VPC
+        "security_groups": [{"SecurityGroups": security_groups}] * 5,
+    }
+
+    total_pyjq = 0
+    total_jq = 0
+    for expression, variables, kind in EXPRESSIONS:
+        values = inputs[kind]
+        expected = [
+            pyjq.all(expression, value, vars=variables or {}) for value in values
+        ]
+        results = [jq.all(expression, value, variables=variables) for value in values]
+        if results != expected:
+            raise Exception("Different results for {}".format(expression))
+
+        pyjq_time = best_of(
+            lambda: [
+                pyjq.all(expression, value, vars=variables or {}) for value in values
+            ],
+            args.repeat,
+        )
+        jq_time = best_of(
+            lambda: [
+                jq.all(expression, value, variables=variables) for value in values
+            ],
+            args.repeat,
+        )
+        total_pyjq += pyjq_time
+        total_jq += jq_time
+        print(
+            "{:<70} pyjq {:6.3f}s  shared.jq {:6.3f}s  {:6.1f}x".format(
+                expression[:70], pyjq_time, jq_time, pyjq_time / jq_time
+            )
+        )
+    print(
+        "Total: pyjq {:.3f}s, shared.jq {:.3f}s, {:.1f}x".format(
+            total_pyjq, total_jq, total_pyjq / total_jq
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
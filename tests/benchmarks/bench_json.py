@@ -0,0 +1,238 @@
+"""
+Benchmark for the JSON backends over a synthetic account-data tree.
+
+The tree has, for each region, EC2 instances, security groups and network interfaces,
+along with an IAM authorization details file and a policy file per S3 bucket. Every file
+is parsed with each available backend, both as is and read-only as query_aws returns
+it.
+
+Usage:
+    python -m tests.benchmarks.bench_json --instances 2000 --regions 4
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from shared import json_backend
+from shared.query import load_read_only
+
+REGION_NAMES = [
+    "us-east-1",
+    "us-east-2",
+    "us-west-1",
+    "us-west-2",
+    "eu-west-1",
+    "eu-central-1",
+    "ap-southeast-1",
+    "ap-northeast-1",
+]
+
+
+def make_instance(index):
+    return {
+        "InstanceId": "i-{:017x}".format(index),
+        "ImageId": "ami-{:017x}".format(index * 7),
+        "InstanceType": "m5.large",
+        "LaunchTime": "2020-01-01T00:00:00+00:00",
+        "State": {"Code": 16, "Name": "running"},
+        "PrivateIpAddress": "10.{}.{}.{}".format(
+            index // 65536 % 256, index // 256 % 256, index % 256
+        ),
+        "SubnetId": "subnet-{:08x}".format(index % 50),
+        "VpcId": "vpc-{:08x}".format(index % 5),
+        "SecurityGroups": [
+            {"GroupId": "sg-{:08x}".format(index % 200), "GroupName": "web"}
+        ],
+        "NetworkInterfaces": [
+            {
+                "NetworkInterfaceId": "eni-{:017x}".format(index),
+                "PrivateIpAddresses": [
+                    {
+                        "Primary": True,
+                        "PrivateIpAddress": "10.{}.{}.{}".format(
+                            index // 65536 % 256, index // 256 % 256, index % 256
+                        ),
+                    }
+                ],
+                "Groups": [{"GroupId": "sg-{:08x}".format(index % 200)}],
+            }
+        ],
+        "Tags": [
+            {"Key": "Name", "Value": "host-{}".format(index)},
+            {"Key": "env", "Value": "prod"},
+        ],
+    }
+
+
+def make_security_group(index):
+    return {
+        "GroupId": "sg-{:08x}".format(index),
+        "GroupName": "sg-{}".format(index),
+        "VpcId": "vpc-{:08x}".format(index % 5),
+        "IpPermissions": [
+            {
+                "FromPort": port,
+                "ToPort": port,
+                "IpProtocol": "tcp",
+                "IpRanges": [{"CidrIp": "10.{}.0.0/16".format(port % 256)}],
+                "UserIdGroupPairs": [{"GroupId": "sg-{:08x}".format(index + 1)}],
+            }
+            for port in [22, 80, 443]
+        ],
+    }
+
+
+def make_policy(index):
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"AWS": "arn:aws:iam::123456789012:root"},
+                "Action": ["s3:GetObject", "s3:PutObject", "s3:ListBucket"],
+                "Resource": "arn:aws:s3:::bucket-{}/*".format(index),
+            }
+        ],
+    }
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(json.dumps(data, indent=4, sort_keys=True))
+
+
+def make_account_data(directory, instance_count, region_count, bucket_count):
+    for region in REGION_NAMES[:region_count]:
+        region_dir = os.path.join(directory, region)
+        write_json(
+            os.path.join(region_dir, "ec2-describe-instances.json"),
+            {
+                "Reservations": [
+                    {"Instances": [make_instance(index)], "OwnerId": "123456789012"}
+                    for index in range(instance_count)
+                ]
+            },
+        )
+        write_json(
+            os.path.join(region_dir, "ec2-describe-security-groups.json"),
+            {"SecurityGroups": [make_security_group(index) for index in range(200)]},
+        )
+        write_json(
+            os.path.join(region_dir, "ec2-describe-network-interfaces.json"),
+            {
+                "NetworkInterfaces": [
+                    make_instance(index)["NetworkInterfaces"][0]
+                    for index in range(instance_count)
+                ]
+            },
+        )
+
+    write_json(
+        os.path.join(
+            directory, "us-east-1", "iam-get-account-authorization-details.json"
+        ),
+        {
+            "Policies": [
+                {
+                    "Arn": "arn:aws:iam::aws:policy/policy-{}".format(index),
+                    "DefaultVersionId": "v1",
+                    "PolicyVersionList": [
+                        {"Document": make_policy(index), "VersionId": "v1"}
+                    ],
+                }
+                for index in range(instance_count)
+            ]
+        },
+    )
+    for index in range(bucket_count):
+        write_json(
+            os.path.join(
+                directory,
+                "us-east-1",
+                "s3-get-bucket-policy",
+                "bucket-{}".format(index),
+            ),
+            {"Policy": json.dumps(make_policy(index))},
+        )
+
+
+def time_backend(paths, backend, repeat):
+    json_backend.set_backend(backend)
+    contents = []
+    for path in paths:
+        with open(path, "rb") as f:
+            contents.append(f.read())
+
+    def best_of(function):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    parse = best_of(lambda: [json_backend.loads(content) for content in contents])
+
+    def load_all_read_only():
+        for path in paths:
+            with open(path, "rb") as f:
+                load_read_only(f)
+
+    read_only = best_of(load_all_read_only)
+    return parse, read_only
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--instances", help="Instances per region", default=2000, type=int
+    )
+    parser.add_argument("--regions", help="Number of regions", default=4, type=int)
+    parser.add_argument("--buckets", help="Number of S3 buckets", default=500, type=int)
+    parser.add_argument("--repeat", help="Runs of each measure", default=3, type=int)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    selected_backend = json_backend.get_backend()
+    try:
+        make_account_data(directory, args.instances, args.regions, args.buckets)
+        paths = [
+            path
+            for path in glob.glob(os.path.join(directory, "**"), recursive=True)
+            if os.path.isfile(path)
+        ]
+        size = sum(os.path.getsize(path) for path in paths)
+        print("{} files, {:.1f} MB".format(len(paths), size / 1024 / 1024))
+
+        results = {}
+        for backend in json_backend.get_available_backends():
+            results[backend] = time_backend(paths, backend, args.repeat)
+            print(
+                "{:<7} parse {:6.3f}s  read-only {:6.3f}s".format(
+                    backend, *results[backend]
+                )
+            )
+
+        if "orjson" in results:
+            print(
+                "orjson speedup: parse {:.1f}x, read-only {:.1f}x".format(
+                    *[
+                        json_time / orjson_time
+                        for json_time, orjson_time in zip(
+                            results["json"], results["orjson"]
+                        )
+                    ]
+                )
+            )
+    finally:
+        json_backend.set_backend(selected_backend)
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark for building the node tree of a synthetic account, as prepare does.
+
+The account has one region with 5 VPCs, each with 2 AZs of 5 subnets, and the instances
+spread across the subnets. The memory used by the nodes, without their data, is measured
+along with the time to build the tree, to get the leaves of every VPC and to check whether
+every node has leaves, both from the node attributes and by walking the tree as was done
+before they were kept.
+
+Usage:
+    python -m tests.benchmarks.bench_nodes --instances 50000
+"""
+import argparse
+import time
+import tracemalloc
+
+from commands.prepare import add_node_to_subnets, get_subnets_by_id
+from shared.nodes import Account, Region, Vpc, Az, Subnet, Ec2
+from tests.benchmarks.bench_json import make_instance
+
+
+def make_instances(instance_count):
+    instances = []
+    for index in range(instance_count):
+        instance = make_instance(index)
+        instance["NetworkInterfaces"][0]["SubnetId"] = instance["SubnetId"]
+        instances.append(instance)
+    return instances
+
+
+def build_account(instances_json):
+    account = Account(None, {"id": "123456789012", "name": "benchmark"})
+    region = Region(account, {"RegionName": "us-east-1"})
+    for vpc_index in range(5):
+        vpc = Vpc(
+            region,
+            {
+                "VpcId": "vpc-{:08x}".format(vpc_index),
+                "CidrBlock": "10.{}.0.0/16".format(vpc_index),
+            },
+        )
+        for az_index in range(2):
+            az = Az(vpc, {"ZoneName": "us-east-1{}".format("ab"[az_index])})
+            for subnet_index in range(5):
+                # Spread the 50 subnets of make_instance across the VPCs
+                subnet_id = "subnet-{:08x}".format(
+                    subnet_index * 10 + az_index * 5 + vpc_index
+                )
+                subnet = Subnet(
+                    vpc,
+                    {
+                        "SubnetId": subnet_id,
+                        "CidrBlock": "10.{}.{}.0/24".format(vpc_index, subnet_index),
+                    },
+                )
+                az.addChild(subnet)
+            vpc.addChild(az)
+        region.addChild(vpc)
+    account.addChild(region)
+
+    subnets_by_id = get_subnets_by_id(region)
+    nodes = {}
+    for instance_json in instances_json:
+        instance = Ec2(region, instance_json, collapse_asgs=False)
+        nodes[instance.arn] = instance
+        add_node_to_subnets(region, instance, nodes, subnets_by_id)
+    return account
+
+
+def walk_leaves(node):
+    if node.isLeaf:
+        return [node]
+    leaves = []
+    for child in node.children:
+        leaves.extend(walk_leaves(child))
+    return leaves
+
+
+def walk_has_leaves(node):
+    if node.isLeaf:
+        return True
+    for child in node.children:
+        if walk_has_leaves(child):
+            return True
+    return False
+
+
+def get_vpcs_leaves(account, get_leaves, repeat):
+    # get_connections gets the leaves of the VPC for each of its security groups
+    count = 0
+    for _ in range(repeat):
+        for region in account.children:
+            for vpc in region.children:
+                count += len(get_leaves(vpc))
+    return count
+
+
+def get_has_leaves(account, has_leaves):
+    # build_data_structure checks every node above the leaves
+    count = 0
+    for region in account.children:
+        count += has_leaves(region)
+        for vpc in region.children:
+            count += has_leaves(vpc)
+            for az in vpc.children:
+                count += has_leaves(az)
+                for subnet in az.children:
+                    count += has_leaves(subnet)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--instances", help="Number of instances", default=50000, type=int
+    )
+    parser.add_argument(
+        "--repeat", help="Times the leaves of each VPC are read", default=20, type=int
+    )
+    args = parser.parse_args()
+
+    # Made beforehand, as prepare loads the data before building the nodes, so only the
+    # memory of the nodes is measured
+    instances_json = make_instances(args.instances)
+    tracemalloc.start()
+    start = time.perf_counter()
+    account = build_account(instances_json)
+    build_time = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        "Built {} instances in {:.3f}s, using {:.1f} MB ({} bytes per instance)".format(
+            account.leaf_count,
+            build_time,
+            size / 1024 / 1024,
+            size // account.leaf_count,
+        )
+    )
+
+    for description, get_leaves, has_leaves in [
+        ("Kept", lambda node: node.leaves, lambda node: node.has_leaves),
+        ("Walked", walk_leaves, walk_has_leaves),
+    ]:
+        start = time.perf_counter()
+        count = get_vpcs_leaves(account, get_leaves, args.repeat)
+        leaves_time = time.perf_counter() - start
+        start = time.perf_counter()
+        get_has_leaves(account, has_leaves)
+        has_leaves_time = time.perf_counter() - start
+        print(
+            "{:<7} leaves of every VPC {} times ({} leaves) {:.3f}s, has_leaves of every node {:.4f}s".format(
+                description, args.repeat, count, leaves_time, has_leaves_time
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import random
+import unittest
+from nose.tools import assert_equal, assert_false, assert_true
+
+from netaddr import IPAddress, IPNetwork
+
+from shared.cidr import (
+    CidrTrie,
+    IpIndex,
+    classify_cidrs,
+    get_cidr_range,
+    is_cidr_nested,
+    is_private_cidr,
+    is_reserved_cidr,
+    PRIVATE_CIDRS,
+    RESERVED_CIDRS,
+)
+
+
+class TestCidr(unittest.TestCase):
+    def test_get_cidr_range(self):
+        assert_equal((4, 167772160, 167837695), get_cidr_range("10.0.0.5/16"))
+        assert_equal((6, 0, 2**128 - 1), get_cidr_range("::/0"))
+
+    def test_classify_cidrs(self):
+        random.seed(0)
+        cidrs = [
+            "{}.{}.{}.{}/{}".format(
+                random.choice([0, 10, 127, 169, 172, 192, 198, 203, 224, 250, 255]),
+                random.choice([0, 2, 16, 31, 51, 168, 254, 255]),
+                random.randint(0, 255),
+                random.randint(0, 255),
+                random.randint(0, 32),
+            )
+            for _ in range(2000)
+        ]
+        cidrs += ["10.0.0.1", "010.0.0.1", "8.8.8.8", "::/0", "fd00::1", "1.2.3"]
+        classification = classify_cidrs(cidrs)
+        for position, cidr in enumerate(cidrs):
+            network = IPNetwork(cidr)
+            assert_equal(
+                (network.version, network.first, network.last), get_cidr_range(cidr)
+            )
+            private = any(network in IPNetwork(other) for other in PRIVATE_CIDRS)
+            reserved = any(network in IPNetwork(other) for other in RESERVED_CIDRS)
+            assert_equal(private, is_private_cidr(cidr))
+            assert_equal(reserved, is_reserved_cidr(cidr))
+            assert_equal(private, classification["private"][position])
+            assert_equal(not private, classification["public"][position])
+            assert_equal(reserved, classification["unblockable"][position])
+
+    def test_is_cidr_nested(self):
+        assert_true(is_cidr_nested("10.0.0.0/16", "10.0.1.0/24"))
+        assert_true(is_cidr_nested("10.0.1.0/24", "10.0.0.0/16"))
+        assert_true(is_cidr_nested("10.0.0.0/16", "10.0.0.0/16"))
+        assert_false(is_cidr_nested("10.0.0.0/16", "10.1.0.0/16"))
+        assert_false(is_cidr_nested("0.0.0.0/0", "::/0"))
+
+    def test_find(self):
+        random.seed(0)
+        items = [
+            [
+                "10.0.{}.{}".format(random.randint(0, 3), random.randint(0, 255))
+                for _ in range(random.randint(0, 3))
+            ]
+            for _ in range(200)
+        ]
+        items.append(["fe80::1", "10.0.0.1"])
+        index = IpIndex(items, lambda ips: ips)
+        for cidr in [
+            "10.0.0.0/16",
+            "10.0.1.0/24",
+            "10.0.2.128/25",
+            "10.0.3.7/32",
+            "10.1.0.0/16",
+            "fe80::/10",
+        ]:
+            # As get_connections found them, for each IP
+            expected = [
+                ips for ips in items for ip in ips if IPAddress(ip) in IPNetwork(cidr)
+            ]
+            found = index.find(cidr)
+            assert_equal(len(expected), len(found))
+            assert_true(all(a is b for a, b in zip(expected, found)))
+
+    def test_cidr_trie(self):
+        random.seed(0)
+        named_cidrs = ["10.0.0.1/8", "10.0.0.0/8", "0.0.0.0/0", "fd00::/8"] + [
+            "10.{}.{}.0/{}".format(
+                random.randint(0, 3), random.randint(0, 255), random.randint(9, 24)
+            )
+            for _ in range(300)
+        ]
+        trie = CidrTrie(named_cidrs)
+        for cidr in ["10.0.0.0/8", "10.1.2.3/32", "10.2.0.0/15", "8.8.8.8/32"] + [
+            "10.{}.{}.{}/{}".format(
+                random.randint(0, 3),
+                random.randint(0, 255),
+                random.randint(0, 255),
+                random.randint(8, 32),
+            )
+            for _ in range(300)
+        ]:
+            # As build_data_structure found them, the first of the smallest matches
+            matches = [
+                named for named in named_cidrs if IPNetwork(cidr) in IPNetwork(named)
+            ]
+            expected = sorted(matches, key=lambda named: IPNetwork(named).size)[0]
+            assert_equal(expected, trie.find_smallest(cidr))
+        assert_equal("10.0.0.1/8", trie.find_smallest("10.0.0.0/8"))
+        assert_equal("fd00::/8", trie.find_smallest("fd00::1"))
+        assert_equal(None, trie.find_smallest("fe80::1"))
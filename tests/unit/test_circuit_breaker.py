@@ -0,0 +1,94 @@
+import unittest
+import boto3
+from botocore.exceptions import ClientError
+from nose.tools import assert_equal
+
+from shared.circuit_breaker import CircuitBreakers, CircuitOpenError
+
+
+class FakeHttpResponse(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class TestCircuitBreakers(unittest.TestCase):
+    def test_trips_after_consecutive_identical_denials(self):
+        breakers = CircuitBreakers(3)
+        key = ("kms", "get_key_policy", "us-east-1")
+
+        breakers.after_call(key, "AccessDeniedException")
+        breakers.after_call(key, "AccessDeniedException")
+        # A success, or a different error, starts the count again
+        breakers.after_call(key, "")
+        breakers.after_call(key, "AccessDeniedException")
+        breakers.after_call(key, "AccessDeniedException")
+        breakers.after_call(key, "AccessDenied")
+        breakers.after_call(key, "AccessDenied")
+        breakers.before_call(key)
+        assert_equal([], breakers.get_summaries())
+
+        breakers.after_call(key, "AccessDenied")
+        # Other actions and regions are unaffected
+        breakers.before_call(("kms", "get_key_policy", "us-west-2"))
+        breakers.before_call(("kms", "list_grants", "us-east-1"))
+        for _ in range(2):
+            with self.assertRaises(CircuitOpenError):
+                breakers.before_call(key)
+
+        summaries = breakers.get_summaries()
+        assert_equal(1, len(summaries))
+        assert_equal(
+            [
+                {
+                    "service": "kms",
+                    "action": "get_key_policy",
+                    "region": "us-east-1",
+                    "error_code": "AccessDenied",
+                    "skipped": 2,
+                }
+            ],
+            summaries,
+        )
+
+    def test_tolerated_denials(self):
+        # Such as KMS keys with restricted access, which collect expects
+        breakers = CircuitBreakers(2, [("kms", "get_key_policy")])
+        for _ in range(3):
+            breakers.after_call(
+                ("kms", "get_key_policy", "us-east-1"), "AccessDeniedException"
+            )
+        breakers.before_call(("kms", "get_key_policy", "us-east-1"))
+        assert_equal([], breakers.get_summaries())
+
+    def test_instrument_client(self):
+        breakers = CircuitBreakers(2)
+        client = boto3.client(
+            "kms",
+            region_name="us-east-1",
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+        )
+        breakers.instrument_client(client, "kms", "us-east-1")
+
+        calls = []
+
+        def deny(**kwargs):
+            # Respond in place of AWS
+            calls.append(kwargs["model"].name)
+            return (
+                FakeHttpResponse(400),
+                {"Error": {"Code": "AccessDeniedException", "Message": ""}},
+            )
+
+        client.meta.events.register("before-call.kms.GetKeyPolicy", deny)
+        for key_id in ["1", "2"]:
+            with self.assertRaises(ClientError):
+                client.get_key_policy(KeyId=key_id, PolicyName="default")
+
+        # The third call isn't made
+        with self.assertRaises(CircuitOpenError):
+            client.get_key_policy(KeyId="3", PolicyName="default")
+        assert_equal(["GetKeyPolicy", "GetKeyPolicy"], calls)
+
+        assert_equal("get_key_policy", breakers.get_summaries()[0]["action"])
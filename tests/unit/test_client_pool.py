@@ -0,0 +1,41 @@
+import unittest
+from nose.tools import assert_equal, assert_true
+
+from shared.client_pool import ClientPool
+
+
+class FakeSession(object):
+    def __init__(self):
+        self.clients_created = 0
+        self.region_lookups = 0
+
+    def client(self, service, region_name=None, config=None):
+        self.clients_created += 1
+        return object()
+
+    def get_available_regions(self, service):
+        self.region_lookups += 1
+        return ["us-east-1", "us-west-2"]
+
+
+class TestClientPool(unittest.TestCase):
+    def test_clients_are_reused(self):
+        session = FakeSession()
+        clients = ClientPool(session, {"retries": {"max_attempts": 4}})
+
+        ec2 = clients.client("ec2", "us-east-1")
+        assert_true(ec2 is clients.client("ec2", "us-east-1"))
+        clients.client("ec2", "us-west-2")
+        # A different config gets its own client
+        clients.client("ec2", "us-east-1", max_pool_connections=50)
+
+        assert_equal(3, session.clients_created)
+        assert_equal(3, clients.clients_created)
+        assert_equal(1, clients.clients_reused)
+
+    def test_available_regions_are_memoized(self):
+        session = FakeSession()
+        clients = ClientPool(session)
+        for _ in range(3):
+            assert_true("us-west-2" in clients.get_available_regions("ec2"))
+        assert_equal(1, session.region_lookups)
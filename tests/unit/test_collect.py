@@ -0,0 +1,228 @@
+import os
+import tempfile
+import unittest
+import yaml
+from botocore.exceptions import ClientError
+from nose.tools import assert_equal, assert_true, assert_false
+
+from shared.manifest import Manifest
+from commands.collect import (
+    build_collect_plan,
+    call_function,
+    get_batches,
+    split_batch_response,
+    get_runner_dependency_names,
+    get_runner_depths,
+    parse_ttl,
+)
+
+
+class TestCollect(unittest.TestCase):
+    def test_get_runner_dependency_names(self):
+        runner = {
+            "Service": "sqs",
+            "Request": "get-queue-attributes",
+            "Parameters": [
+                {"Name": "QueueUrl", "Value": "sqs-list-queues.json|.QueueUrls[]?"},
+                {"Name": "AttributeNames", "Value": ["All"]},
+            ],
+        }
+        assert_equal(["sqs-list-queues"], get_runner_dependency_names(runner))
+
+        runner = {
+            "Service": "iam",
+            "Request": "get-service-last-accessed-details",
+            "Parameters": [
+                {
+                    "Name": "JobId",
+                    "Value": "iam-generate-service-last-accessed-details/*|.JobId",
+                }
+            ],
+            "DependsOn": ["iam-get-account-authorization-details"],
+        }
+        assert_equal(
+            [
+                "iam-generate-service-last-accessed-details",
+                "iam-get-account-authorization-details",
+            ],
+            get_runner_dependency_names(runner),
+        )
+
+    def test_build_collect_plan(self):
+        collect_commands = [
+            {"Service": "ec2", "Request": "describe-vpcs"},
+            {"Service": "iam", "Request": "get-account-authorization-details"},
+            {
+                "Service": "iam",
+                "Request": "get-role",
+                "Parameters": [
+                    {
+                        "Name": "RoleName",
+                        "Value": "iam-get-account-authorization-details.json|.RoleDetailList[]?|.RoleName",
+                    }
+                ],
+            },
+            {
+                "Service": "route53",
+                "Request": "list-hosted-zones-by-vpc",
+                "DependsOn": ["ec2-describe-vpcs"],
+            },
+        ]
+        plan = build_collect_plan(collect_commands)
+        assert_equal([set(), set(), set([1]), set([0])], plan)
+        assert_equal([1, 1, 2, 2], get_runner_depths(plan))
+
+    def test_collect_commands_plan(self):
+        with open("collect_commands.yaml", "r") as f:
+            collect_commands = yaml.safe_load(f)
+        plan = build_collect_plan(collect_commands)
+
+        # Every dependency in the shipped file is listed before the runner that uses it
+        for index, dependencies in enumerate(plan):
+            for dependency in dependencies:
+                assert_true(dependency < index)
+
+    def test_parse_ttl(self):
+        assert_equal(3600, parse_ttl("1h"))
+        assert_equal(90, parse_ttl(90))
+        assert_equal(7 * 24 * 60 * 60, parse_ttl("7d"))
+        assert_equal(30, parse_ttl("30s"))
+        with self.assertRaises(Exception):
+            parse_ttl("soon")
+
+        # The shipped TTLs are valid
+        with open("collect_commands.yaml", "r") as f:
+            for runner in yaml.safe_load(f):
+                if "TTL" in runner:
+                    assert_true(parse_ttl(runner["TTL"]) > 0)
+
+    def test_get_batches(self):
+        assert_equal([[1, 2], [3, 4], [5]], get_batches([1, 2, 3, 4, 5], 2))
+        assert_equal([], get_batches([], 2))
+
+    def test_split_batch_response(self):
+        batch = {
+            "Parameter": "tasks",
+            "MaxSize": 100,
+            "ResponseKey": "tasks",
+            "ResponseIdentifier": "taskArn",
+        }
+        data = {
+            "tasks": [{"taskArn": "arn:1", "lastStatus": "RUNNING"}],
+            "failures": [{"arn": "arn:2", "reason": "MISSING"}],
+        }
+        responses = split_batch_response(data, batch, ["arn:1", "arn:2"])
+        assert_equal(
+            {
+                "arn:1": {
+                    "tasks": [{"taskArn": "arn:1", "lastStatus": "RUNNING"}],
+                    "failures": [],
+                },
+                "arn:2": {
+                    "tasks": [],
+                    "failures": [{"arn": "arn:2", "reason": "MISSING"}],
+                },
+            },
+            responses,
+        )
+
+
+class FakeServiceModel(object):
+    service_name = "iam"
+
+
+class FakeMeta(object):
+    service_model = FakeServiceModel()
+
+
+class FakeIamClient(object):
+    """Returns the given responses, or raises the given errors, in turn"""
+
+    meta = FakeMeta()
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def can_paginate(self, method):
+        return False
+
+    def _next(self, **kwargs):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    get_service_last_accessed_details = _next
+    get_credential_report = _next
+
+
+class TestCallFunctionPoll(unittest.TestCase):
+    def test_poll_pending_values(self):
+        poll = {"Name": "JobStatus", "PendingValues": ["IN_PROGRESS"]}
+        client = FakeIamClient(
+            [
+                {"JobStatus": "IN_PROGRESS"},
+                {"JobStatus": "COMPLETED", "ServicesLastAccessed": []},
+            ]
+        )
+        summary = []
+        with tempfile.TemporaryDirectory() as directory:
+            outputfile = os.path.join(directory, "job")
+            args = (
+                outputfile,
+                client,
+                "get_service_last_accessed_details",
+                {"JobId": "1"},
+                poll,
+                summary,
+            )
+            # Nothing is written while the job is running
+            assert_false(call_function(*args))
+            assert_false(os.path.isfile(outputfile))
+            assert_equal([], summary)
+
+            assert_true(call_function(*args))
+            assert_true(os.path.isfile(outputfile))
+            assert_equal(1, len(summary))
+
+    def test_poll_pending_errors(self):
+        poll = {"PendingErrors": ["ReportInProgress"]}
+        error = ClientError(
+            {"Error": {"Code": "ReportInProgress", "Message": ""}},
+            "GetCredentialReport",
+        )
+        client = FakeIamClient([error, {"Content": "csv"}])
+        summary = []
+        with tempfile.TemporaryDirectory() as directory:
+            outputfile = os.path.join(directory, "iam-get-credential-report.json")
+            args = (outputfile, client, "get_credential_report", {}, poll, summary)
+            assert_false(call_function(*args))
+            assert_true(call_function(*args))
+            assert_true(os.path.isfile(outputfile))
+            assert_equal([], [s for s in summary if "exception" in s])
+
+    def test_manifest(self):
+        summary = []
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = Manifest(directory)
+            outputfile = os.path.join(directory, "iam-get-credential-report.json")
+            error = ClientError(
+                {"Error": {"Code": "AccessDenied", "Message": ""}},
+                "GetCredentialReport",
+            )
+            client = FakeIamClient([error, {"Content": "csv"}])
+            args = (outputfile, client, "get_credential_report", {}, None, summary)
+
+            assert_true(call_function(*args, manifest=manifest))
+            assert_equal(
+                "failed", manifest.entries[os.path.basename(outputfile)]["status"]
+            )
+
+            assert_true(call_function(*args, manifest=manifest))
+            entry = manifest.entries[os.path.basename(outputfile)]
+            assert_equal("ok", entry["status"])
+            assert_equal(os.path.getsize(outputfile), entry["bytes"])
+
+            # The call isn't made again
+            assert_true(call_function(*args, manifest=manifest))
+            assert_equal(2, len(summary))
@@ -9,7 +9,9 @@ from shared.common import (
     get_account,
     get_collection_date,
     get_access_advisor_active_counts,
+    get_regions,
 )
+from shared.nodes import Account
 
 
 class TestCommon(unittest.TestCase):
@@ -37,6 +39,24 @@ class TestCommon(unittest.TestCase):
         stats = get_account_stats(account, True)
         assert_equal(stats["EC2 instances"]["us-east-1"], 3)
 
+    def test_get_regions(self):
+        account = Account(None, get_account("demo"))
+        assert_equal(
+            ["us-east-1"], [region["RegionName"] for region in get_regions(account)]
+        )
+        for regions, names in [
+            ('"us-east-1"', ["us-east-1"]),
+            ('"eu-west-1","us-east-1"', ["us-east-1"]),
+            ('"eu-west-1"', []),
+        ]:
+            assert_equal(
+                names,
+                [
+                    region["RegionName"]
+                    for region in get_regions(account, {"regions": regions})
+                ],
+            )
+
     def test_get_collection_date(self):
         account = get_account("demo")
         assert_equal("2019-05-07T15:40:22+00:00", get_collection_date(account))
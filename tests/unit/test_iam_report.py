@@ -0,0 +1,68 @@
+import argparse
+import unittest
+from mock import patch
+from nose.tools import assert_equal, assert_false, assert_true
+
+from commands.iam_report import get_access_advisor
+from shared.query import freeze
+
+
+class TestIamReport(unittest.TestCase):
+    def test_get_access_advisor(self):
+        # Loaded data is read-only, as it is cached and shared by every caller
+        files = {
+            "generate-service-last-accessed-details": freeze({"JobId": "job-1"}),
+            "get-service-last-accessed-details": freeze(
+                {
+                    "JobCompletionDate": "2020-01-31T00:00:00Z",
+                    "ServicesLastAccessed": [
+                        {"ServiceNamespace": "ec2"},
+                        {
+                            "ServiceNamespace": "s3",
+                            "LastAuthenticated": "2020-01-21T00:00:00Z",
+                        },
+                    ],
+                }
+            ),
+        }
+        auth_details = freeze(
+            {
+                "UserDetailList": [
+                    {"Arn": "arn:aws:iam::123456789012:user/alice", "UserName": "alice"}
+                ],
+                "RoleDetailList": [],
+            }
+        )
+
+        def get_parameter_file(region, service, function, parameter_value):
+            return files[function]
+
+        principal_stats = {}
+        with patch("commands.iam_report.get_parameter_file", get_parameter_file):
+            get_access_advisor(
+                None,
+                principal_stats,
+                auth_details,
+                argparse.Namespace(max_age=90),
+            )
+
+        stats = principal_stats["arn:aws:iam::123456789012:user/alice"]
+        assert_false(stats["is_inactive"])
+        assert_equal(
+            10, stats["last_access"]["ServicesLastAccessed"][1]["days_since_last_use"]
+        )
+        # The loaded data is unchanged
+        assert_true(
+            "days_since_last_use"
+            not in files["get-service-last-accessed-details"]["ServicesLastAccessed"][1]
+        )
+
+        # As an unused principal
+        principal_stats = {}
+        with patch("commands.iam_report.get_parameter_file", get_parameter_file):
+            get_access_advisor(
+                None, principal_stats, auth_details, argparse.Namespace(max_age=5)
+            )
+        assert_true(
+            principal_stats["arn:aws:iam::123456789012:user/alice"]["is_inactive"]
+        )
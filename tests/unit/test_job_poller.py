@@ -0,0 +1,76 @@
+import threading
+import unittest
+from nose.tools import assert_equal, assert_true
+
+from shared.job_poller import JobPoller
+from shared.scheduler import CallScheduler, CallGroup
+
+
+class FakeJob(object):
+    def __init__(self, polls_needed, log=None):
+        self.polls_needed = polls_needed
+        self.polls = 0
+        self.threads = set()
+        self.log = log
+
+    def poll(self):
+        self.polls += 1
+        self.threads.add(threading.current_thread())
+        if self.log is not None:
+            self.log.append(self)
+        return self.polls >= self.polls_needed
+
+
+class TestJobPoller(unittest.TestCase):
+    def run_jobs(self, workers, jobs, **poller_args):
+        scheduler = CallScheduler(workers, max_per_service=4)
+        poller = JobPoller(scheduler, base_delay=0.01, max_delay=0.05, **poller_args)
+        done = threading.Event()
+        timeouts = []
+        group = CallGroup(scheduler, done.set, poller)
+        try:
+            for job in jobs:
+                group.submit_job(
+                    "us-east-1",
+                    "iam",
+                    job.poll,
+                    on_timeout=lambda: timeouts.append(True),
+                )
+            group.close()
+            poller.wait()
+            scheduler.wait()
+            assert_true(done.is_set())
+        finally:
+            poller.shutdown()
+            scheduler.shutdown()
+        return poller, timeouts
+
+    def test_jobs_are_polled_until_done(self):
+        for workers in [1, 4]:
+            jobs = [FakeJob(n) for n in [1, 3, 5, 2]]
+            poller, timeouts = self.run_jobs(workers, jobs)
+            assert_equal([1, 3, 5, 2], [job.polls for job in jobs])
+            assert_equal(11, poller.polls)
+            assert_equal([], timeouts)
+
+    def test_single_worker_polls_inline(self):
+        log = []
+        jobs = [FakeJob(3, log), FakeJob(3, log)]
+        poller, _ = self.run_jobs(1, jobs)
+        assert_equal(None, poller._thread)
+        for job in jobs:
+            assert_equal({threading.current_thread()}, job.threads)
+        # Every job is started before any of them is polled again
+        assert_equal(jobs, log[:2])
+        assert_equal(6, len(log))
+
+    def test_jobs_time_out(self):
+        jobs = [FakeJob(1000), FakeJob(1)]
+        _, timeouts = self.run_jobs(4, jobs, max_wait=0.1)
+        assert_equal([True], timeouts)
+        assert_equal(1, jobs[1].polls)
+
+    def test_delay_backs_off(self):
+        poller = JobPoller(None, base_delay=1, max_delay=8)
+        for attempts, delay in [(1, 1), (2, 2), (3, 4), (4, 8), (10, 8)]:
+            assert_true(delay / 2 <= poller.get_delay(attempts) <= delay)
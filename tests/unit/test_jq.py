@@ -0,0 +1,79 @@
+import unittest
+from nose.tools import assert_equal, assert_is_none, assert_raises, assert_true
+
+import pyjq
+
+from shared import jq
+
+
+class TestJq(unittest.TestCase):
+    def setUp(self):
+        self.instance = {
+            "NetworkInterfaces": [
+                {
+                    "SubnetId": "subnet-1",
+                    "PrivateIpAddresses": [
+                        {
+                            "PrivateIpAddress": "10.0.0.1",
+                            "Association": {"PublicIp": "1.1.1.1"},
+                        },
+                        {"PrivateIpAddress": "10.0.0.2"},
+                    ],
+                }
+            ],
+            "Tags": [
+                {"Key": "aws:autoscaling:groupName", "Value": "web"},
+                {"Key": 'with "quotes"', "Value": "quoted"},
+                {"Key": "enabled", "Value": True},
+            ],
+            "SecurityGroups": [{"GroupId": "sg-1"}, {"GroupId": "sg-2"}],
+            "Empty": None,
+        }
+
+    def test_all(self):
+        for expression, variables in [
+            (".NetworkInterfaces[].PrivateIpAddresses[].PrivateIpAddress", None),
+            (".NetworkInterfaces[].PrivateIpAddresses[].Association.PublicIp", None),
+            (".SecurityGroups[].GroupId", None),
+            (".Tags[]", None),
+            (".Tags[]?.Value", None),
+            (".Missing[]?", None),
+            (".Empty", None),
+            (".", None),
+            (".[]", None),
+            ('.Tags[]? | select(.Key == "aws:autoscaling:groupName") | .Value', None),
+            (".Tags[]? | select(.Key == $key) | .Value", {"key": 'with "quotes"'}),
+            (".Tags[]? | select(.Value != true) | .Key", None),
+            (".Tags[] | select(.Value == 1)", None),
+            (
+                '.NetworkInterfaces[]|select(.PrivateIpAddresses[]?|.PrivateIpAddress=="10.0.0.2")|.SubnetId',
+                None,
+            ),
+            # Run by jq
+            (".Tags | length", None),
+            (".SecurityGroups[] | [.GroupId]", None),
+        ]:
+            assert_equal(
+                pyjq.all(expression, self.instance, vars=variables or {}),
+                jq.all(expression, self.instance, variables=variables),
+            )
+
+    def test_errors(self):
+        # Raised by jq, as in the expressions not evaluated in Python
+        with assert_raises(jq.ScriptRuntimeError):
+            jq.all(".Missing[]", self.instance)
+        with assert_raises(jq.ScriptRuntimeError):
+            jq.all(".Tags.Key", self.instance)
+        assert_equal([], jq.all(".Tags[].Key?[]?", self.instance))
+
+    def test_first_and_one(self):
+        assert_equal("sg-1", jq.first(".SecurityGroups[].GroupId", self.instance))
+        assert_is_none(jq.first(".Missing[]?", self.instance))
+        assert_equal({}, jq.first(".Missing[]?", self.instance, {}))
+        assert_equal("subnet-1", jq.one(".NetworkInterfaces[].SubnetId", self.instance))
+        with assert_raises(IndexError):
+            jq.one(".SecurityGroups[].GroupId", self.instance)
+
+    def test_compile(self):
+        assert_true(jq.compile(".a", {"b": 1}) is jq.compile(".a", {"b": 1}))
+        assert_equal([1], jq.compile("$b", {"b": 1}).all(None))
@@ -0,0 +1,61 @@
+import datetime
+import io
+import json
+import unittest
+from nose.tools import assert_equal, assert_raises
+
+from shared import json_backend
+from shared.common import custom_serializer
+from shared.query import ReadOnlyDict, ReadOnlyList, load_read_only
+
+
+class TestJsonBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = json_backend.get_backend()
+
+    def tearDown(self):
+        json_backend.set_backend(self.backend)
+
+    def test_dumps(self):
+        data = {
+            "Instances": [
+                {
+                    "InstanceId": "i-0e1234",
+                    "LaunchTime": datetime.datetime(
+                        2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc
+                    ),
+                    "Tags": [{"Key": "Name", "Value": "café \U0001f600"}],
+                    "CpuCredits": 0.00005,
+                    "Size": 2**70,
+                }
+            ],
+            "Empty": {},
+        }
+        expected = json.dumps(data, indent=4, sort_keys=True, default=custom_serializer)
+        for backend in json_backend.get_available_backends():
+            json_backend.set_backend(backend)
+            # The files collect writes are the same whichever backend is used
+            text = json_backend.dumps(data, default=custom_serializer)
+            assert_equal(expected, text)
+            assert_equal(
+                data["Instances"][0]["Size"],
+                json_backend.loads(text)["Instances"][0]["Size"],
+            )
+
+            with assert_raises(TypeError):
+                json_backend.dumps({"a": object()}, default=custom_serializer)
+
+    def test_set_backend(self):
+        with assert_raises(ValueError):
+            json_backend.set_backend("simdjson")
+        json_backend.set_backend("json")
+        assert_equal("json", json_backend.get_backend())
+
+    def test_load_read_only(self):
+        text = b'{"Vpcs": [{"VpcId": "vpc-1", "Tags": [[]]}], "Count": NaN}'
+        for backend in json_backend.get_available_backends():
+            json_backend.set_backend(backend)
+            data = load_read_only(io.BytesIO(text))
+            assert_equal(ReadOnlyDict, type(data["Vpcs"][0]))
+            assert_equal(ReadOnlyList, type(data["Vpcs"][0]["Tags"][0]))
+            assert_equal([], data["Vpcs"][0]["Tags"][0])
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import time
+import unittest
+from nose.tools import assert_equal, assert_true, assert_false
+
+from shared.manifest import Manifest
+from shared.page_writer import write_atomically
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.account_path = os.path.join(self.directory.name, "account-data", "demo")
+        os.makedirs(os.path.join(self.account_path, "us-east-1"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, filename):
+        return os.path.join(self.account_path, "us-east-1", filename)
+
+    def test_record_and_reload(self):
+        manifest = Manifest(self.account_path)
+        vpcs_file = self.get_path("ec2-describe-vpcs.json")
+        details = write_atomically(vpcs_file, '{"Vpcs": []}')
+        assert_equal(12, details["bytes"])
+
+        manifest.record(vpcs_file, "ec2", "describe_vpcs", {}, "ok", details=details)
+        manifest.record(
+            self.get_path("ec2-describe-subnets.json"),
+            "ec2",
+            "describe_subnets",
+            {},
+            "failed",
+        )
+        manifest.save()
+
+        manifest = Manifest(self.account_path)
+        entry = manifest.entries[os.path.join("us-east-1", "ec2-describe-vpcs.json")]
+        assert_equal("describe_vpcs", entry["action"])
+        assert_equal(details["sha256"], entry["sha256"])
+        assert_true(manifest.is_collected(vpcs_file))
+        assert_false(manifest.is_collected(self.get_path("ec2-describe-subnets.json")))
+
+    def test_files_without_entries(self):
+        manifest = Manifest(self.account_path)
+        legacy_file = self.get_path("ec2-describe-vpcs.json")
+        assert_false(manifest.is_collected(legacy_file))
+        write_atomically(legacy_file, "{}")
+        assert_true(manifest.is_collected(legacy_file))
+
+    def test_get_retries(self):
+        manifest = Manifest(self.account_path)
+        for filename, status, text in [
+            ("complete.json", "ok", "{}"),
+            ("failed.json", "failed", None),
+            ("truncated.json", "ok", '{"Vpcs": []}'),
+            ("deleted.json", "ok", "{}"),
+            # Calls that succeed without writing a file, such as buckets without policies
+            ("no-policy.json", "ok", None),
+        ]:
+            path = self.get_path(filename)
+            details = write_atomically(path, text) if text is not None else None
+            manifest.record(path, "ec2", "describe_vpcs", {}, status, details)
+
+        with open(self.get_path("truncated.json"), "w") as f:
+            f.write('{"Vpcs"')
+        os.remove(self.get_path("deleted.json"))
+
+        retries = manifest.get_retries()
+        assert_equal(
+            [
+                os.path.join("us-east-1", "deleted.json"),
+                os.path.join("us-east-1", "failed.json"),
+                os.path.join("us-east-1", "truncated.json"),
+            ],
+            retries,
+        )
+
+        manifest.invalidate(retries[0])
+        assert_false(manifest.is_collected(self.get_path("deleted.json")))
+
+    def test_ttls(self):
+        manifest = Manifest(self.account_path)
+        role_file = os.path.join(
+            self.account_path, "us-east-1", "iam-get-role", "admin"
+        )
+        os.makedirs(os.path.dirname(role_file))
+        vpcs_file = self.get_path("ec2-describe-vpcs.json")
+        legacy_file = self.get_path("route53domains-list-domains.json")
+        for path in [role_file, vpcs_file, legacy_file]:
+            details = write_atomically(path, "{}")
+        manifest.record(role_file, "iam", "get_role", {}, "ok", details)
+        manifest.record(vpcs_file, "ec2", "describe_vpcs", {}, "ok", details)
+        assert_equal(
+            "iam-get-role", manifest.get_runner_name(manifest.get_key(role_file))
+        )
+
+        manifest.ttls = {"iam-get-role": 3600, "route53domains-list-domains": 3600}
+        assert_true(manifest.is_collected(role_file))
+        assert_true(manifest.is_collected(legacy_file))
+        # Runners without a TTL are always collected again
+        assert_false(manifest.is_collected(vpcs_file))
+
+        # Files without an entry expire based on when they were written
+        an_hour_ago = time.time() - 3601
+        os.utime(legacy_file, (an_hour_ago, an_hour_ago))
+        assert_false(manifest.is_collected(legacy_file))
+
+        manifest.ttls = {"iam-get-role": 0}
+        assert_false(manifest.is_collected(role_file))
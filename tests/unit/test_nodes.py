@@ -23,10 +23,29 @@ USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 ---------------------------------------------------------------------------
 """
 
+import copy
+import json
+import os
+import tempfile
 import unittest
+from urllib.parse import quote_plus
+from mock import patch
 from nose.tools import assert_equal, assert_true, assert_false
 
-from shared.nodes import truncate, get_name, is_public_ip, Account
+from shared.nodes import (
+    truncate,
+    get_name,
+    is_public_ip,
+    Account,
+    Region,
+    Vpc,
+    Az,
+    Subnet,
+    Ec2,
+    Elb,
+    Elbv2,
+)
+from commands.collect import split_batch_response
 
 
 class TestNodes(unittest.TestCase):
@@ -44,7 +63,7 @@ class TestNodes(unittest.TestCase):
         assert_false(is_public_ip("10.0.0.0"))
 
     def test_Account(self):
-        json_blob = {u"id": 111111111111, u"name": u"prod"}
+        json_blob = {"id": 111111111111, "name": "prod"}
         account = Account(None, json_blob)
         assert_equal(111111111111, account.local_id)
         assert_equal("prod", account.name)
@@ -61,8 +80,157 @@ class TestNodes(unittest.TestCase):
                     "local_id": 111111111111,
                     "type": "account",
                     "id": "arn:aws:::111111111111:",
-                    "name": u"prod",
+                    "name": "prod",
                 }
             },
             account.cytoscape_data(),
         )
+
+    def test_RegionIndex(self):
+        # This actually uses the demo data files provided
+        account = Account(None, {"id": 111111111111, "name": "demo"})
+        region = Region(account, {"RegionName": "us-east-1"})
+        index = region.index
+        assert_true(index is region.index)
+
+        interface = index.get_network_interface("eni-00000001")
+        assert_equal("172.31.48.168", interface["PrivateIpAddress"])
+        assert_equal(None, index.get_network_interface("eni-missing"))
+
+        assert_equal(
+            ["subnet-00000001", "subnet-00000003"],
+            [
+                subnet["SubnetId"]
+                for subnet in index.get_zone_subnets("vpc-12345678", "us-east-1a")
+            ],
+        )
+        assert_equal(
+            ["subnet-00000002", "subnet-00000004"],
+            [
+                subnet["SubnetId"]
+                for subnet in index.get_subnets(
+                    ["subnet-00000004", "subnet-missing", "subnet-00000002"]
+                )
+            ],
+        )
+        assert_equal(
+            ["subnet-00000001", "subnet-00000002"],
+            sorted(
+                subnet["SubnetIdentifier"]
+                for subnet in index.get_redshift_subnet_group(
+                    "vpc-12345678", "default"
+                )["Subnets"]
+            ),
+        )
+
+        assert_equal(8, len(index.get_security_groups()))
+        assert_equal(
+            index.get_security_groups(), index.get_vpc_security_groups("vpc-12345678")
+        )
+        assert_equal([], index.get_vpc_security_groups("vpc-missing"))
+        assert_equal(
+            {
+                "ip_ranges": [("1.1.1.1/32", None), ("2.2.2.2/28", None)],
+                "ingress_groups": [],
+            },
+            index.get_security_group_rules("sg-00000002"),
+        )
+        assert_equal(
+            ["sg-00000003", "sg-00000002"],
+            index.get_security_group_rules("sg-00000004")["ingress_groups"],
+        )
+
+        vpc = Vpc(region, {"VpcId": "vpc-12345678", "CidrBlock": "10.0.0.0/16"})
+        region.addChild(vpc)
+        assert_true(region.get_child("vpc-12345678") is vpc)
+        assert_equal(None, region.get_child("vpc-missing"))
+
+    def test_resource_tags(self):
+        account = Account(None, {"id": 111111111111, "name": "demo"})
+        region = Region(account, {"RegionName": "us-east-1"})
+        vpc = Vpc(region, {"VpcId": "vpc-12345678", "CidrBlock": "10.0.0.0/16"})
+        elb = Elb(vpc, {"LoadBalancerName": "weblb"})
+        tags = {
+            "TagDescriptions": [
+                {"LoadBalancerName": "weblb", "Tags": [{"Key": "Env", "Value": "Prod"}]}
+            ]
+        }
+        with patch("shared.nodes.get_parameter_file", return_value=tags) as get_file:
+            assert_equal([{"Key": "Env", "Value": "Prod"}], elb.tags)
+            # Read once for the region, including by copies of the node
+            assert_equal([{"Key": "Env", "Value": "Prod"}], copy.copy(elb).tags)
+            get_file.assert_called_once_with(region, "elb", "describe-tags", "weblb")
+        with patch("shared.nodes.get_parameter_file", return_value=None):
+            assert_equal([], Elb(vpc, {"LoadBalancerName": "other"}).tags)
+
+    def test_elbv2_tags(self):
+        # As collect writes them, splitting describe-tags by ResourceArn
+        arns = [
+            "arn:aws:elasticloadbalancing:us-east-1:111111111111:loadbalancer/app/{}/1".format(
+                name
+            )
+            for name in ["web", "api"]
+        ]
+        response = {
+            "TagDescriptions": [
+                {"ResourceArn": arn, "Tags": [{"Key": "Name", "Value": arn[-5:]}]}
+                for arn in arns
+            ]
+        }
+        batch = {"ResponseKey": "TagDescriptions", "ResponseIdentifier": "ResourceArn"}
+
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as working_dir:
+            tags_dir = os.path.join(
+                working_dir, "account-data/demo/us-east-1/elbv2-describe-tags"
+            )
+            os.makedirs(tags_dir)
+            for arn, tags in split_batch_response(response, batch, arns).items():
+                with open(os.path.join(tags_dir, quote_plus(arn)), "w") as f:
+                    json.dump(tags, f)
+
+            os.chdir(working_dir)
+            try:
+                account = Account(None, {"id": 111111111111, "name": "demo"})
+                region = Region(account, {"RegionName": "us-east-1"})
+                vpc = Vpc(region, {"VpcId": "vpc-1", "CidrBlock": "10.0.0.0/16"})
+                elb = Elbv2(
+                    vpc, {"LoadBalancerName": "api", "LoadBalancerArn": arns[1]}
+                )
+                assert_equal([{"Key": "Name", "Value": "api/1"}], elb.tags)
+            finally:
+                os.chdir(cwd)
+
+    def test_leaves(self):
+        account = Account(None, {"id": 111111111111, "name": "demo"})
+        region = Region(account, {"RegionName": "us-east-1"})
+        vpc = Vpc(region, {"VpcId": "vpc-1", "CidrBlock": "10.0.0.0/16"})
+        az = Az(vpc, {"ZoneName": "us-east-1a"})
+        subnet = Subnet(vpc, {"SubnetId": "subnet-1", "CidrBlock": "10.0.0.0/24"})
+        az.addChild(subnet)
+        vpc.addChild(az)
+        region.addChild(vpc)
+        account.addChild(region)
+        assert_false(account.has_leaves)
+
+        instances = [
+            Ec2(region, {"InstanceId": "i-{}".format(index)}) for index in range(3)
+        ]
+        for instance in instances:
+            subnet.addChild(instance)
+        assert_equal(3, account.leaf_count)
+        assert_equal(instances, vpc.leaves)
+        assert_true(vpc.leaves is vpc.leaves)
+
+        # Replacing a child with the same id replaces its leaves
+        replacement = Ec2(region, {"InstanceId": "i-1"})
+        subnet.addChild(replacement)
+        assert_equal([instances[0], replacement, instances[2]], region.leaves)
+        assert_equal(3, region.leaf_count)
+
+        subnet.removeChild(instances[0])
+        assert_equal([replacement, instances[2]], account.leaves)
+        vpc.removeChild(az)
+        assert_false(region.has_leaves)
+        assert_equal([], region.leaves)
+        assert_true(az.has_leaves)
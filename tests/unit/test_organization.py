@@ -0,0 +1,111 @@
+import datetime
+import unittest
+from nose.tools import assert_equal, assert_true
+
+from shared.organization import get_account_session, get_organization_accounts
+
+MANAGEMENT_ACCOUNT_ID = "000000000000"
+
+
+class StandInOrganizations(object):
+    """Local stand-in for the Organizations API, paginating like AWS does"""
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.calls = 0
+
+    def list_accounts(self, MaxResults, NextToken=None):
+        self.calls += 1
+        start = int(NextToken or 0)
+        response = {"Accounts": self.accounts[start : start + MaxResults]}
+        if start + MaxResults < len(self.accounts):
+            response["NextToken"] = str(start + MaxResults)
+        return response
+
+
+class StandInSts(object):
+    """Local stand-in for the STS API"""
+
+    def __init__(self):
+        self.assumed_roles = []
+        self.durations = []
+        self.expiration = datetime.datetime.now(datetime.timezone.utc)
+
+    def get_caller_identity(self):
+        return {"Account": MANAGEMENT_ACCOUNT_ID}
+
+    def assume_role(self, RoleArn, RoleSessionName, DurationSeconds):
+        self.assumed_roles.append(RoleArn)
+        self.durations.append(DurationSeconds)
+        account_id = RoleArn.split(":")[4]
+        return {
+            "Credentials": {
+                "AccessKeyId": "ASIA{}".format(account_id),
+                "SecretAccessKey": "secret",
+                "SessionToken": "token{}".format(len(self.assumed_roles)),
+                "Expiration": self.expiration,
+            }
+        }
+
+
+class StandInSession(object):
+    def __init__(self, accounts, region_name="us-east-1"):
+        self.region_name = region_name
+        self.organizations = StandInOrganizations(accounts)
+        self.sts = StandInSts()
+
+    def client(self, service):
+        return getattr(self, service)
+
+
+class TestOrganization(unittest.TestCase):
+    def test_get_organization_accounts(self):
+        accounts = [
+            {
+                "Id": str(index).zfill(12),
+                "Name": "Account {}".format(index),
+                "Status": "SUSPENDED" if index == 7 else "ACTIVE",
+            }
+            for index in range(45)
+        ]
+        session = StandInSession(accounts)
+
+        discovered = get_organization_accounts(session, active_only=True)
+        assert_equal(3, session.organizations.calls)
+        assert_equal(44, len(discovered))
+        assert_equal({"name": "account-1", "id": "000000000001"}, discovered[1])
+        assert_true("000000000007" not in [account["id"] for account in discovered])
+
+        assert_equal(45, len(get_organization_accounts(session)))
+
+    def test_get_account_session(self):
+        session = StandInSession([], region_name="us-gov-west-1")
+
+        # The management account uses the session as is
+        assert_true(
+            get_account_session(session, MANAGEMENT_ACCOUNT_ID, "Auditor") is session
+        )
+        assert_equal([], session.sts.assumed_roles)
+
+        # The role is assumed when the credentials are first used
+        account_session = get_account_session(
+            session, "111111111111", "Auditor", duration_seconds=900
+        )
+        assert_equal([], session.sts.assumed_roles)
+        session.sts.expiration += datetime.timedelta(hours=1)
+        credentials = account_session.get_credentials()
+        assert_equal("ASIA111111111111", credentials.access_key)
+        assert_equal("token1", credentials.token)
+        assert_equal(
+            ["arn:aws-us-gov:iam::111111111111:role/Auditor"],
+            session.sts.assumed_roles,
+        )
+        assert_equal([900], session.sts.durations)
+        assert_equal("us-gov-west-1", account_session.region_name)
+
+        # And again once they are about to expire
+        credentials._expiry_time = datetime.datetime.now(
+            datetime.timezone.utc
+        ) + datetime.timedelta(seconds=60)
+        assert_equal("token2", credentials.get_frozen_credentials().token)
+        assert_equal(2, len(session.sts.assumed_roles))
@@ -0,0 +1,70 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from nose.tools import assert_equal, assert_false
+
+from shared import json_backend
+from shared.common import custom_serializer
+from shared.page_writer import PageWriter, get_temporary_path, write_atomically
+
+
+class TestPageWriter(unittest.TestCase):
+    def write_pages(self, pages):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ec2-describe-snapshots.json")
+            writer = PageWriter(path, default=custom_serializer)
+            for page in pages:
+                writer.add_page(page)
+            writer.pop("ResponseMetadata", None)
+            writer.commit()
+            assert_false(os.path.exists(get_temporary_path(path)))
+            with open(path) as f:
+                return f.read()
+
+    def test_matches_merged_pages(self):
+        pages = [
+            {
+                "Snapshots": [
+                    {
+                        "SnapshotId": "snap-1",
+                        "StartTime": datetime.datetime(2020, 1, 1),
+                        "Tags": [],
+                        "Description": "café",
+                    }
+                ],
+                "Empty": [],
+                "NextToken": "abc",
+                "Filters": {"Owner": ["self"], "Nested": {}},
+                "ResponseMetadata": {"RequestId": "1"},
+            },
+            {"Snapshots": [{"SnapshotId": "snap-2"}, {"SnapshotId": "snap-3"}]},
+            {"Snapshots": []},
+            {"Snapshots": [{"SnapshotId": "snap-4", "Tags": [{"Key": "a"}]}]},
+        ]
+
+        # What call_function wrote before streaming the pages
+        merged = json.loads(json.dumps(pages[0], default=custom_serializer))
+        merged.pop("ResponseMetadata")
+        for page in pages[1:]:
+            merged["Snapshots"].extend(page["Snapshots"])
+        selected_backend = json_backend.get_backend()
+        try:
+            for backend in json_backend.get_available_backends():
+                json_backend.set_backend(backend)
+                assert_equal(json_backend.dumps(merged), self.write_pages(pages))
+        finally:
+            json_backend.set_backend(selected_backend)
+
+    def test_empty_response(self):
+        assert_equal("{}", self.write_pages([{"ResponseMetadata": {}}]))
+        assert_equal(
+            json_backend.dumps({"Items": []}), self.write_pages([{"Items": []}])
+        )
+
+    def test_write_atomically(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "file.json")
+            write_atomically(path, "{}")
+            assert_equal([os.path.basename(path)], os.listdir(directory))
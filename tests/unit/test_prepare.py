@@ -28,8 +28,16 @@ from mock import patch
 from nose.tools import assert_equal, assert_true, assert_false
 import pyjq
 
-from commands.prepare import is_external_cidr, get_ec2s, get_vpcs, build_data_structure
-from shared.nodes import Account, Region, Subnet, Vpc
+from commands.prepare import (
+    is_external_cidr,
+    get_ec2s,
+    get_vpcs,
+    build_data_structure,
+    add_node_to_subnets,
+    get_subnets_by_id,
+    prune_region,
+)
+from shared.nodes import Account, Region, Az, Elb, Subnet, Vpc
 
 
 class TestPrepare(unittest.TestCase):
@@ -41,7 +49,7 @@ class TestPrepare(unittest.TestCase):
 
     def test_get_vpcs(self):
         # This actually uses the demo data files provided
-        json_blob = {u"id": 111111111111, u"name": u"demo"}
+        json_blob = {"id": 111111111111, "name": "demo"}
         account = Account(None, json_blob)
         region = Region(
             account,
@@ -69,9 +77,24 @@ class TestPrepare(unittest.TestCase):
             get_vpcs(region, {}),
         )
 
+    def test_get_vpcs_filters(self):
+        json_blob = {"id": 111111111111, "name": "demo"}
+        account = Account(None, json_blob)
+        region = Region(account, {"RegionName": "us-east-1"})
+        for outputfilter, vpc_ids in [
+            ({"vpc-ids": '"vpc-12345678"'}, ["vpc-12345678"]),
+            ({"vpc-ids": '"vpc-missing","vpc-1234"'}, ["vpc-12345678"]),
+            ({"vpc-ids": '"vpc-missing"'}, []),
+            ({"vpc-names": '"Prod"'}, ["vpc-12345678"]),
+            ({"vpc-ids": '"vpc-12345678"', "vpc-names": '"Dev"'}, []),
+        ]:
+            assert_equal(
+                vpc_ids, [vpc["VpcId"] for vpc in get_vpcs(region, outputfilter)]
+            )
+
     def test_get_ec2s(self):
         # This actually uses the demo data files provided
-        json_blob = {u"id": 111111111111, u"name": u"demo"}
+        json_blob = {"id": 111111111111, "name": "demo"}
         account = Account(None, json_blob)
         region = Region(
             account,
@@ -89,7 +112,7 @@ class TestPrepare(unittest.TestCase):
 
     def test_build_data_structure(self):
         # Build the entire demo data set
-        json_blob = {u"id": 111111111111, u"name": u"demo"}
+        json_blob = {"id": 111111111111, "name": "demo"}
 
         outputfilter = {}
         outputfilter["internal_edges"] = True
@@ -193,3 +216,98 @@ class TestPrepare(unittest.TestCase):
         assert_equal(
             3, len(pyjq.all('.[].data|select(.type == "ec2")|keys', cytoscape_json))
         )
+
+    def test_build_data_structure_workers(self):
+        # Finding the connections of the VPCs in other processes gives the same result
+        json_blob = {"id": 111111111111, "name": "demo"}
+        config = {
+            "accounts": [{"id": 123456789012, "name": "demo"}],
+            "cidrs": {
+                "1.1.1.1/32": {"name": "SF Office"},
+                "2.2.2.2/28": {"name": "NY Office"},
+            },
+        }
+        outputfilter = {"inter_rds_edges": False, "azs": False}
+
+        cytoscape_json = build_data_structure(json_blob, config, outputfilter)
+        outputfilter["workers"] = 2
+        assert_equal(
+            cytoscape_json, build_data_structure(json_blob, config, outputfilter)
+        )
+
+    def test_add_node_to_subnets(self):
+        json_blob = {"id": 111111111111, "name": "demo"}
+        account = Account(None, json_blob)
+        region = Region(account, {"RegionName": "us-east-1"})
+        vpc = Vpc(region, {"VpcId": "vpc-12345678", "CidrBlock": "10.0.0.0/16"})
+        subnets = []
+        for subnet_id, zone in [("subnet-1", "us-east-1a"), ("subnet-2", "us-east-1b")]:
+            az = Az(vpc, {"ZoneName": zone})
+            subnet = Subnet(az, {"SubnetId": subnet_id, "CidrBlock": "10.0.0.0/24"})
+            az.addChild(subnet)
+            vpc.addChild(az)
+            subnets.append(subnet)
+        region.addChild(vpc)
+
+        elb = Elb(
+            vpc,
+            {"LoadBalancerName": "weblb", "Subnets": ["subnet-2", "subnet-1", "x"]},
+        )
+        nodes = {elb.arn: elb}
+        add_node_to_subnets(region, elb, nodes, get_subnets_by_id(region))
+
+        # A placement in each subnet, in the order of the subnets, with the subnet in its arn
+        assert_equal(
+            [
+                "arn:aws:elasticloadbalancing:us-east-1:111111111111:instance/weblb/vpc-12345678.subnet-1",
+                "arn:aws:elasticloadbalancing:us-east-1:111111111111:instance/weblb/vpc-12345678.subnet-2",
+            ],
+            list(nodes),
+        )
+        for subnet, node in zip(subnets, nodes.values()):
+            assert_equal([node], list(subnet.leaves))
+            assert_true(node.subnet is subnet)
+            # Placements share the node rather than copying it
+            assert_true(node.node is elb)
+            assert_equal("weblb", node.name)
+            assert_equal(node.arn, node.cytoscape_data(subnet.arn)["data"]["id"])
+        assert_equal(
+            "arn:aws:elasticloadbalancing:us-east-1:111111111111:instance/weblb/vpc-12345678",
+            elb.arn,
+        )
+
+    def test_prune_region(self):
+        json_blob = {"id": 111111111111, "name": "demo"}
+        account = Account(None, json_blob)
+        region = Region(account, {"RegionName": "us-east-1"})
+        for vpc_id in ["vpc-1", "vpc-2"]:
+            vpc = Vpc(region, {"VpcId": vpc_id, "CidrBlock": "10.0.0.0/16"})
+            for zone in ["us-east-1a", "us-east-1b"]:
+                az = Az(vpc, {"ZoneName": zone})
+                for subnet_id in ["a", "b"]:
+                    subnet_id = "-".join(["subnet", vpc_id, zone, subnet_id])
+                    az.addChild(
+                        Subnet(vpc, {"SubnetId": subnet_id, "CidrBlock": "10.0.0.0/24"})
+                    )
+                vpc.addChild(az)
+            region.addChild(vpc)
+        vpc = region.get_child("vpc-1")
+        elb = Elb(
+            vpc, {"LoadBalancerName": "weblb", "Subnets": ["subnet-vpc-1-us-east-1b-a"]}
+        )
+        nodes = {elb.arn: elb}
+        add_node_to_subnets(region, elb, nodes, get_subnets_by_id(region))
+
+        cytoscape_json = prune_region(region, {"azs": True})
+        assert_equal(
+            ["region", "vpc", "az", "subnet", "elb"],
+            [node["data"]["type"] for node in cytoscape_json],
+        )
+        assert_equal(list(nodes), [cytoscape_json[-1]["data"]["id"]])
+        assert_equal([vpc], list(region.children))
+        assert_equal(["us-east-1b"], [az.local_id for az in vpc.children])
+        assert_equal(
+            ["subnet-vpc-1-us-east-1b-a"],
+            [subnet.local_id for subnet in vpc.get_child("us-east-1b").children],
+        )
+        assert_equal(1, region.leaf_count)
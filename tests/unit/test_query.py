@@ -0,0 +1,85 @@
+import copy
+import os
+import pickle
+import tempfile
+import unittest
+from nose.tools import assert_equal, assert_is, assert_is_none, assert_raises
+
+from shared.query import FileCache, ReadOnlyDict, ReadOnlyList, load_read_only
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, filename, text):
+        path = os.path.join(self.directory.name, filename)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def load(self, cache, path):
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            contents = f.read()
+        return cache.load(path, stat.st_mtime_ns, stat.st_size, lambda: contents)
+
+    def test_read_only(self):
+        path = self.write("vpcs.json", '{"Vpcs": [{"VpcId": "vpc-1", "Tags": [[]]}]}')
+        with open(path) as f:
+            data = load_read_only(f)
+
+        vpc = data["Vpcs"][0]
+        assert_equal(ReadOnlyList, type(vpc["Tags"][0]))
+        with assert_raises(TypeError):
+            data["Vpcs"] = []
+        with assert_raises(TypeError):
+            data["Vpcs"].append({})
+        with assert_raises(TypeError):
+            vpc.update({"VpcId": "vpc-2"})
+        with assert_raises(TypeError):
+            vpc["Tags"] += [{}]
+
+        # Copies can be modified
+        vpc_copy = copy.deepcopy(vpc)
+        vpc_copy["Tags"][0].append({"Key": "Name"})
+        assert_equal([], vpc["Tags"][0])
+        shallow_copy = copy.copy(vpc)
+        shallow_copy["VpcId"] = "vpc-2"
+        assert_equal("vpc-1", vpc["VpcId"])
+        assert_equal(dict, type(pickle.loads(pickle.dumps(data))))
+
+    def test_cache(self):
+        cache = FileCache(max_bytes=25)
+        first = self.write("first.json", '{"Vpcs": []}')
+        second = self.write("second.json", '{"Subnets": []}')
+
+        data = self.load(cache, first)
+        assert_is(data, self.load(cache, first))
+        assert_equal(
+            {"hits": 1, "misses": 1, "evictions": 0, "files": 1, "bytes": 12},
+            cache.get_stats(),
+        )
+
+        # Parsed again once the file changes
+        self.write("first.json", '{"Vpcs": [1]}')
+        assert_equal({"Vpcs": [1]}, self.load(cache, first))
+        assert_equal(2, cache.get_stats()["misses"])
+
+        # The least recently used file is evicted past max_bytes
+        assert_equal({"Subnets": []}, self.load(cache, second))
+        assert_equal(
+            {"hits": 1, "misses": 3, "evictions": 1, "files": 1, "bytes": 15},
+            cache.get_stats(),
+        )
+
+        cache.clear()
+        assert_equal(
+            {"hits": 0, "misses": 0, "evictions": 0, "files": 0, "bytes": 0},
+            cache.get_stats(),
+        )
+        assert_is_none(cache._entries.get(second))
+        assert_equal(ReadOnlyDict, type(self.load(cache, second)))
@@ -0,0 +1,79 @@
+import unittest
+from botocore.hooks import HierarchicalEmitter
+from nose.tools import assert_equal, assert_true, assert_false
+
+from shared.rate_limit import TokenBucket, RateLimiter, is_throttling_error
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_is_throttling_error(self):
+        assert_true(is_throttling_error("ThrottlingException"))
+        assert_true(is_throttling_error("RequestLimitExceeded"))
+        assert_true(is_throttling_error("PriorRequestNotComplete"))
+        assert_false(is_throttling_error("AccessDeniedException"))
+        assert_false(is_throttling_error("LimitExceededException"))
+
+    def test_token_bucket_aimd(self):
+        bucket = TokenBucket(10, max_rate=12)
+
+        # Throttles within the cooldown only halve the rate once
+        bucket.on_throttle()
+        bucket.on_throttle()
+        assert_equal(5, bucket.rate)
+        assert_equal(2, bucket.throttles)
+
+        # Successes increase the rate additively, up to the maximum
+        bucket.on_success()
+        assert_equal(5.2, bucket.rate)
+        for _ in range(1000):
+            bucket.on_success()
+        assert_equal(12, bucket.rate)
+
+    def test_service_stats(self):
+        limiter = RateLimiter(1000)
+        limiter.bucket("ec2", "us-east-1").acquire()
+        limiter.bucket("ec2", "us-west-2").acquire()
+        limiter.bucket("iam", "us-east-1")
+
+        stats = limiter.get_service_stats()
+        assert_equal(["ec2"], list(stats.keys()))
+        assert_equal(2, stats["ec2"]["requests"])
+
+    def test_account_rate(self):
+        limiter = RateLimiter(1000, account_rate=1000)
+        for service in ["ec2", "iam"]:
+            events = HierarchicalEmitter()
+            client = type("Client", (object,), {})()
+            client.meta = type("Meta", (object,), {"events": events})()
+            limiter.instrument_client(client, service, "us-east-1")
+            events.emit("before-send.{}.Call".format(service), request=None)
+
+        # Every request also takes from the account's budget
+        assert_equal(2, limiter._account_bucket.requests)
+        assert_equal(1, limiter.bucket("iam", "us-east-1").requests)
+
+    def test_throttling_slows_down(self):
+        limiter = RateLimiter(10)
+        events = HierarchicalEmitter()
+        client = type("Client", (object,), {})()
+        client.meta = type("Meta", (object,), {"events": events})()
+        limiter.instrument_client(client, "route53", "us-east-1")
+
+        # Route53 signals throttling with PriorRequestNotComplete
+        http_response = type("Response", (object,), {"status_code": 400})()
+        parsed = {"Error": {"Code": "PriorRequestNotComplete"}}
+        events.emit(
+            "needs-retry.route53.ChangeResourceRecordSets",
+            response=(http_response, parsed),
+        )
+        bucket = limiter.bucket("route53", "us-east-1")
+        assert_equal(5, bucket.rate)
+        assert_equal(1, bucket.throttles)
+
+        # A quota error is not throttling
+        parsed = {"Error": {"Code": "LimitExceededException"}}
+        events.emit(
+            "needs-retry.route53.ChangeResourceRecordSets",
+            response=(http_response, parsed),
+        )
+        assert_equal(1, bucket.throttles)
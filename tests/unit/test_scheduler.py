@@ -0,0 +1,57 @@
+import unittest
+import threading
+import time
+from nose.tools import assert_equal, assert_true
+
+from shared.scheduler import CallScheduler
+
+
+class TestCallScheduler(unittest.TestCase):
+    def test_serial_runs_inline(self):
+        scheduler = CallScheduler(1)
+        calls = []
+        scheduler.submit("us-east-1", "ec2", calls.append, 1)
+        # Nothing is queued, so the call has already been made
+        assert_equal([1], calls)
+        scheduler.wait()
+        scheduler.shutdown()
+
+    def test_concurrency_limits(self):
+        scheduler = CallScheduler(8, max_per_region=3, max_per_service=2)
+        lock = threading.Lock()
+        in_flight = {}
+        max_seen = {}
+        completed = []
+
+        def call(region, service):
+            with lock:
+                for key in [region, (region, service)]:
+                    in_flight[key] = in_flight.get(key, 0) + 1
+                    max_seen[key] = max(max_seen.get(key, 0), in_flight[key])
+            time.sleep(0.01)
+            with lock:
+                for key in [region, (region, service)]:
+                    in_flight[key] -= 1
+                completed.append((region, service))
+
+        for _ in range(5):
+            for region in ["us-east-1", "us-west-2"]:
+                for service in ["ec2", "iam"]:
+                    scheduler.submit(region, service, call, region, service)
+        scheduler.wait()
+        scheduler.shutdown()
+
+        assert_equal(20, len(completed))
+        assert_true(max_seen["us-east-1"] <= 3)
+        assert_true(max_seen[("us-east-1", "ec2")] <= 2)
+
+    def test_errors_are_raised_on_wait(self):
+        scheduler = CallScheduler(2)
+
+        def fail():
+            raise ValueError("failure")
+
+        scheduler.submit("us-east-1", "ec2", fail)
+        with self.assertRaises(ValueError):
+            scheduler.wait()
+        scheduler.shutdown()
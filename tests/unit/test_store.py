@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import unittest
+from nose.tools import assert_equal, assert_is_none, assert_true
+
+from shared import query
+from shared.nodes import Account, Region
+from shared.store import Store, parse_path
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.account_path = os.path.join(self.directory.name, "demo")
+        self.database = os.path.join(self.directory.name, "index.db")
+        self.write(
+            "us-east-1/ec2-describe-vpcs.json",
+            {"Vpcs": [{"VpcId": "vpc-1"}, {"VpcId": "vpc-2"}]},
+        )
+        self.write(
+            "us-east-1/ec2-describe-instances.json",
+            {"Reservations": [{"Instances": [{"InstanceId": "i-1"}]}]},
+        )
+        self.write(
+            "us-east-1/s3-get-bucket-policy/my%2Bbucket",
+            {"Policy": "{}"},
+        )
+        self.write("us-east-1/s3-get-bucket-policy/empty", {})
+        self.write(
+            "us-east-1/lambda-list-functions.json",
+            {
+                "Functions": [
+                    {
+                        "FunctionName": "f",
+                        "FunctionArn": "arn:aws:lambda:us-east-1:123456789012:function:f",
+                    }
+                ]
+            },
+        )
+        self.write("manifest.json", {})
+
+    def tearDown(self):
+        query.use_store(None)
+        self.directory.cleanup()
+
+    def write(self, path, data):
+        path = os.path.join(self.account_path, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(json.dumps(data, indent=4))
+
+    def test_parse_path(self):
+        assert_equal(
+            ("us-east-1", "s3", "get-bucket-policy", "my+bucket"),
+            parse_path("us-east-1/s3-get-bucket-policy/my%2Bbucket"),
+        )
+        assert_equal(
+            (None, None, "describe-regions", None), parse_path("describe-regions.json")
+        )
+
+    def test_index_account(self):
+        store = Store(self.database)
+        counts = store.index_account("demo", self.account_path)
+        assert_equal(5, counts["indexed"])
+        # 2 VPCs, the instance, the function and the bucket policies
+        assert_equal(6, counts["resources"])
+
+        resources = store.find_resources(
+            arn="arn:aws:lambda:us-east-1:123456789012:function:f"
+        )
+        assert_equal(1, len(resources))
+        assert_equal("f", resources[0]["name"])
+        assert_equal("lambda", resources[0]["service"])
+        assert_equal(
+            ["i-1"],
+            [
+                r["id"]
+                for r in store.find_resources(
+                    service="ec2", action="describe-instances"
+                )
+            ],
+        )
+        assert_equal(
+            {"Policy": "{}"}, store.find_resources(resource_id="my+bucket")[0]["data"]
+        )
+        assert_equal(
+            ["empty", "my%2Bbucket"],
+            store.list_files("demo", "us-east-1/s3-get-bucket-policy"),
+        )
+
+        os.remove(os.path.join(self.account_path, "us-east-1/ec2-describe-vpcs.json"))
+        counts = store.index_account("demo", self.account_path)
+        assert_equal(
+            {"indexed": 0, "unchanged": 4, "removed": 1, "skipped": 0, "resources": 0},
+            counts,
+        )
+        assert_equal([], store.find_resources(resource_id="vpc-1"))
+        store.close()
+
+    def test_query_from_store(self):
+        store = Store(self.database)
+        store.index_account("demo", self.account_path)
+        store.close()
+
+        query.use_store(self.database)
+        account = Account(None, {"name": "demo", "id": "123456789012"})
+        region = Region(account, {"RegionName": "us-east-1"})
+        assert_equal(
+            ["vpc-1", "vpc-2"],
+            [
+                vpc["VpcId"]
+                for vpc in query.query_aws(account, "ec2-describe-vpcs", region)["Vpcs"]
+            ],
+        )
+        assert_equal({}, query.query_aws(account, "ec2-describe-subnets", region))
+        assert_equal(
+            "{}",
+            query.get_parameter_file(region, "s3", "get-bucket-policy", "my+bucket")[
+                "Policy"
+            ],
+        )
+        assert_is_none(
+            query.get_parameter_file(region, "s3", "get-bucket-policy", "empty")
+        )
+        assert_true(
+            query.has_account_file("demo", "us-east-1/lambda-list-functions.json")
+        )